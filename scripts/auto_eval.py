@@ -11,6 +11,7 @@ from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.faiss import FaissVectorStore
 from llama_index.core.node_parser import SimpleNodeParser
+from llama_index.core.schema import MetadataMode
 from llama_index.core.llama_dataset.generator import RagDatasetGenerator
 from llama_index.core.evaluation import (
     FaithfulnessEvaluator,
@@ -19,6 +20,9 @@ from llama_index.core.evaluation import (
 )
 
 import faiss
+import numpy as np
+
+from src.embed_cache import cached_embed
 
 
 # --------------------------
@@ -89,13 +93,20 @@ def build_index(documents: List[Document]) -> VectorStoreIndex:
     Settings.llm = OpenAI(model=CHAT_MODEL)
     Settings.embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL)
 
+    # Split into nodes and embed through the shared cache; LlamaIndex skips nodes that already carry an embedding
+    nodes = SimpleNodeParser.from_defaults().get_nodes_from_documents(documents)
+    texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+    V = cached_embed(texts, f"hf:{EMBED_MODEL}",
+                     lambda missing: np.asarray(Settings.embed_model.get_text_embedding_batch(missing), dtype=np.float32))
+    for n, v in zip(nodes, V):
+        n.embedding = v.tolist()
+
     # FAISS store (flat IP; embeddings are normalized by HF model)
-    dim = Settings.embed_model.embed("test").shape[0]
-    index = faiss.IndexFlatIP(dim)
+    index = faiss.IndexFlatIP(V.shape[1])
     vs = FaissVectorStore(faiss_index=index)
 
     storage_context = StorageContext.from_defaults(vector_store=vs, persist_dir=INDEX_DIR)
-    idx = VectorStoreIndex.from_documents(documents, storage_context=storage_context, show_progress=True)
+    idx = VectorStoreIndex(nodes, storage_context=storage_context, show_progress=True)
     storage_context.persist(persist_dir=INDEX_DIR)
     return idx
 
@@ -1,15 +1,47 @@
 #!/usr/bin/env python3
 import argparse, os
-from src.io import load_transactions
-from src.faiss_index import build_faiss_index
+from itertools import chain
+from src.io import iter_transaction_chunks
+from src.faiss_index import build_faiss_index, index_report
+from src.faiss_shards import build_sharded_index
+from src.bm25_index import build_bm25_index
+from src.embed_async import stats, reset_stats
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--transactions", default="data/transactions.json")
     ap.add_argument("--embed-model", default=os.getenv("EMBED_MODEL","BAAI/bge-en-icl"))
     ap.add_argument("--name", default="tx_faiss")
+    ap.add_argument("--index-spec", default=None,
+                    help='flat | ivf_flat:nlist=1024,nprobe=16 | ivf_pq:nlist=1024,m=64,nbits=8 | hnsw:M=32,efSearch=64; '
+                         'storage=sq8|fp16, rescore=4 and pca=256|truncate=256 apply to any kind, '
+                         'e.g. flat:storage=sq8,rescore=4 or hnsw:pca=256 '
+                         '(default: keep the previous build\'s spec, flat for a new index)')
+    ap.add_argument("--no-bm25", action="store_true", help="skip the BM25 keyword index (built by default)")
+    ap.add_argument("--recall-queries", type=int, default=200,
+                    help="sampled queries for the recall@10 report against full precision (0 to skip)")
+    ap.add_argument("--sharded", action="store_true",
+                    help="write one index per (accountId, month) plus a <name>.shards.json manifest")
     args = ap.parse_args()
 
-    tx = load_transactions(args.transactions)
-    idx_path, meta_path = build_faiss_index(tx, embed_model=args.embed_model, name=args.name)
-    print(f"Built FAISS index -> {idx_path}\nMeta -> {meta_path}")
+    # stream the export; only one chunk of validated rows is in memory at a time
+    tx = chain.from_iterable(iter_transaction_chunks(args.transactions))
+    reset_stats()
+    if args.sharded:
+        manifest = build_sharded_index(tx, embed_model=args.embed_model, name=args.name, index_spec=args.index_spec)
+        print(f"Built sharded FAISS index -> {manifest}")
+    else:
+        idx_path, meta_path = build_faiss_index(tx, embed_model=args.embed_model, name=args.name, index_spec=args.index_spec)
+        print(f"Built FAISS index -> {idx_path}\nMeta -> {meta_path}")
+        if args.recall_queries:
+            r = index_report(args.name, n_queries=args.recall_queries)
+            print(f"Index {r['index_bytes'] / 2**20:.1f} MiB (float32 vectors: {r['f32_bytes'] / 2**20:.1f} MiB, "
+                  f"rescore side file: {r['side_bytes'] / 2**20:.1f} MiB); recall@10 vs full precision "
+                  f"{r['recall@10']:.4f} over {min(args.recall_queries, r['rows'])} queries")
+    if not args.no_bm25:
+        # second streaming pass; only added/changed rows are tokenized
+        print(f"BM25 keyword index -> {build_bm25_index(chain.from_iterable(iter_transaction_chunks(args.transactions)))}")
+    st = stats()
+    if st:
+        print(f"Embedded {st['rows']} rows in {st['seconds']:.1f}s ({st['rows_per_s']:.0f} rows/s, "
+              f"{st['batches']} batches, {st['retries']} retries)")
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+import argparse, time
+from src.snapshot import compile_snapshot, load_snapshot
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--transactions", default="data/transactions.json")
+    ap.add_argument("--out-dir", default=None, help="defaults to data/transactions.snapshot next to the source")
+    args = ap.parse_args()
+
+    t0 = time.time()
+    out = compile_snapshot(args.transactions, out_dir=args.out_dir)
+    t1 = time.time()
+    tbl = load_snapshot(out)
+    t2 = time.time()
+    print(f"Snapshot -> {out} ({len(tbl)} rows, compiled in {t1-t0:.2f}s, mmap load {1000*(t2-t1):.1f}ms)")
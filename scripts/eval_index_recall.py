@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Recall@k / latency of approximate index specs against exact flat search.
+
+    python scripts/eval_index_recall.py --name tx_faiss --spec ivf_flat:nlist=256 --spec hnsw:M=32 \
+        --nprobe 4,16,64 --ef-search 32,128
+
+Vectors come from the embedding cache for the texts stored in the index meta,
+so after a build this does not call the embedding endpoint again.
+"""
+import argparse, json
+
+from src.faiss_index import _load_index_and_meta, _embed_texts
+from src.index_spec import parse_spec, recall_at_k
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",")] if s else []
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--name", default="tx_faiss")
+    ap.add_argument("--spec", action="append", default=[], help="index spec to evaluate (repeatable)")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--nprobe", default="", help="comma-separated nprobe values to sweep for IVF specs")
+    ap.add_argument("--ef-search", default="", help="comma-separated efSearch values to sweep for HNSW specs")
+    args = ap.parse_args()
+
+    _, meta = _load_index_and_meta(args.name)
+    V = _embed_texts(list(meta["texts"]), meta["model"])
+    specs = args.spec or ["ivf_flat", "hnsw"]
+    print(f"{len(V)} vectors, dim={V.shape[1]}, k={args.k}")
+    for spec in specs:
+        kind = parse_spec(spec)["kind"]
+        sweep = ([{"nprobe": n} for n in _ints(args.nprobe)] if kind.startswith("ivf")
+                 else [{"efSearch": e} for e in _ints(args.ef_search)] if kind == "hnsw" else [])
+        for overrides in sweep or [None]:
+            r = recall_at_k(V, spec, k=args.k, n_queries=args.queries, overrides=overrides)
+            print(json.dumps({"spec": r["spec"], f"recall@{r['k']}": round(r[f"recall@{r['k']}"], 4),
+                              "ms_per_query": round(r["ms_per_query"], 3),
+                              "flat_ms_per_query": round(r["flat_ms_per_query"], 3), "build_s": round(r["build_s"], 2),
+                              "index_bytes": r["index_bytes"], "f32_bytes": r["f32_bytes"]}))
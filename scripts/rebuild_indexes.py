@@ -1,22 +1,23 @@
 # scripts/rebuild_indexes.py
-import json
+import json, os
 
 from src.faiss_index_tx_acct import build_tx_index, build_account_index
+from src.io import iter_transaction_rows
 
 TX_PATH = "data/transactions.json"
 ACCT_PATH = "data/account-summary.json"
+# e.g. INDEX_SPEC="hnsw:M=32,efSearch=64"; unset keeps each index's previous spec (flat for new ones)
+INDEX_SPEC = os.getenv("INDEX_SPEC") or None
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 if __name__ == "__main__":
-    tx_data = load_json(TX_PATH)
-    tx_rows = tx_data.get("transactions", tx_data)
-    build_tx_index(tx_rows, name="tx_faiss")
+    build_tx_index(iter_transaction_rows(TX_PATH), name="tx_faiss", index_spec=INDEX_SPEC)
 
     acct_data = load_json(ACCT_PATH)
     acct_rows = acct_data.get("accounts", acct_data)
-    build_account_index(acct_rows, name="acct_faiss")
+    build_account_index(acct_rows, name="acct_faiss", index_spec=INDEX_SPEC)
 
     print("Indexes rebuilt: tx_faiss, acct_faiss")
\ No newline at end of file
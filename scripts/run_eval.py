@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
-import json, argparse, math
+import json, argparse, math, time
 from pathlib import Path
 from src.engine import ask_tx
+from src.faiss_index import has_faiss_index, infer_search_filter, semantic_search_faiss_batch
 
 def is_number(s):
     try: float(s); return True
@@ -23,18 +24,22 @@ def main():
     total = 0; correct = 0
 
     with open(eval_path, "r") as f:
-        for line in f:
-            ex = json.loads(line)
-            q = ex["question"]; exp = ex["answer"]
-            res = ask_tx(q, transactions_path=args.transactions)
-            got = res.get("answer", "")
-            ok = score(exp, got)
-            total += 1; correct += 1 if ok else 0
-            print(f"Q: {q}
-  expected: {exp}
-  got: {got}
-  {'OK' if ok else 'MISS'}
-")
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    # embed + search all questions in one batch; ask_tx's retrieval then hits the query-embedding LRU
+    if has_faiss_index("tx_faiss") and examples:
+        qs = [ex["question"] for ex in examples]
+        t0 = time.time()
+        semantic_search_faiss_batch(qs, top_k=12, name="tx_faiss", filters=[infer_search_filter(q, "tx_faiss") for q in qs])
+        print(f"Batch retrieval: {len(qs)} queries in {time.time() - t0:.2f}s")
+
+    for ex in examples:
+        q = ex["question"]; exp = ex["answer"]
+        res = ask_tx(q, transactions_path=args.transactions)
+        got = res.get("answer", "")
+        ok = score(exp, got)
+        total += 1; correct += 1 if ok else 0
+        print(f"Q: {q}\n  expected: {exp}\n  got: {got}\n  {'OK' if ok else 'MISS'}\n")
 
     print(f"Accuracy: {correct}/{total} = {correct/total:.1%}")
 
@@ -11,6 +11,7 @@ from typing import List, Dict, Any
 # -------- project imports (adjust paths if needed) --------
 from src.io import load_transactions, load_account_summaries
 from src.engine_llmfirst_acct import ask_llm_first_accounts
+from src.faiss_index import has_faiss_index, infer_search_filter, semantic_search_faiss_batch
 
 DATA_DIR = os.getenv("DATA_DIR", "data")
 TX_PATH = os.path.join(DATA_DIR, "transactions.json")
@@ -66,6 +67,16 @@ def main():
     accts = load_account_summaries(ACCT_PATH)
     print(f"Loaded: {len(tx)} transactions, {len(accts)} account summaries")
 
+    # Batched retrieval: one embedding request + one multi-row FAISS search for every question.
+    # It also fills the query-embedding LRU, so the per-question runs below do not re-embed.
+    if has_faiss_index("tx_faiss"):
+        b0 = time.time()
+        hits = semantic_search_faiss_batch(QUESTIONS, top_k=120, name="tx_faiss",
+                                           filters=[infer_search_filter(q, "tx_faiss") for q in QUESTIONS])
+        dt = time.time() - b0
+        print(f"Batch retrieval: {len(QUESTIONS)} queries in {dt:.2f}s ({len(QUESTIONS) / max(dt, 1e-9):.1f} q/s), "
+              f"{sum(map(len, hits))} hits")
+
     # Run
     results: List[Dict[str, Any]] = []
     t0 = time.time()
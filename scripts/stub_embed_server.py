@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Local OpenAI-compatible /v1/embeddings stub for exercising index builds offline.
+
+    python scripts/stub_embed_server.py --port 8765 --fail-rate 0.1 --latency-ms 50
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=x python scripts/build_faiss_index.py
+
+Vectors are a deterministic function of the text, so repeated builds are comparable.
+"""
+import argparse, hashlib, json, random, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def _vec(text: str, dim: int) -> list:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype("float32").tolist()
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code: int, body: dict, headers: dict = None):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/embeddings"):
+                return self._send(404, {"error": "not found"})
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = req["input"] if isinstance(req["input"], list) else [req["input"]]
+            time.sleep(args.latency_ms / 1000.0)
+            r = random.random()
+            if r < args.fail_rate / 2:
+                return self._send(429, {"error": "rate limited"}, {"Retry-After": "0.05"})
+            if r < args.fail_rate:
+                return self._send(503, {"error": "unavailable"})
+            if args.max_batch and len(texts) > args.max_batch:
+                return self._send(413, {"error": "batch too large"})
+            data = [{"object": "embedding", "index": i, "embedding": _vec(t, args.dim)} for i, t in enumerate(texts)]
+            random.shuffle(data)   # clients must reassemble by index
+            self._send(200, {"object": "list", "model": req.get("model"), "data": data})
+
+    return Handler
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    ap.add_argument("--max-batch", type=int, default=0, help="answer 413 above this many inputs (0 = unlimited)")
+    args = ap.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    print(f"stub embeddings on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
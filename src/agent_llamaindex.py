@@ -1,53 +1,78 @@
 import os, json
 from typing import Dict, Any
-from .io import load_transactions
+from .datasets import get_transactions, get_table, get_account_summaries
 from .retrieval import retrieve_transactions_context
-from .nlp_utils import parse_month, month_key, parse_last_n_months
+from .nlp_utils import parse_month, parse_last_n_months
 
 def tool_sum_interest_month(transactions_path: str, month_text: str):
-    tx = load_transactions(transactions_path)
+    from .engine import _sum_interest
     yr, mo = parse_month(month_text); ym = f"{yr:04d}-{mo:02d}" if (yr and mo) else None
-    total = 0.0; ids = []
-    for t in tx:
-        if (t.transaction_type or '').upper() == 'INTEREST' and (ym is None or month_key(t.transaction_date_time) == ym):
-            total += (t.amount or 0.0); ids.append(t.id)
-    return {"total": round(total,2), "sources": ids[:25], "month": ym or "ALL"}
+    total, ids = _sum_interest(get_table(transactions_path), ym)
+    return {"total": total, "sources": ids[:25], "month": ym or "ALL"}
 
 def tool_count_purchases_over(transactions_path: str, threshold: float, month_text: str | None = None):
-    tx = load_transactions(transactions_path)
+    from .engine import _count_purchases_over
     ym = None
     if month_text:
         yr, mo = parse_month(month_text); 
         if yr and mo: ym = f"{yr:04d}-{mo:02d}"
-    count = 0; ids = []
-    for t in tx:
-        if (t.transaction_type or '').upper() != 'PURCHASE': continue
-        if abs(t.amount or 0.0) <= threshold: continue
-        if ym and month_key(t.transaction_date_time) != ym: continue
-        ids.append(t.id); count += 1
+    count, ids = _count_purchases_over(get_table(transactions_path), threshold, ym)
     return {"count": count, "sources": ids[:25], "month": ym or "ALL", "threshold": threshold}
 
 def tool_rag_search(transactions_path: str, query: str, top_k: int = 12):
-    tx = load_transactions(transactions_path)
+    tx = get_transactions(transactions_path)
     docs = retrieve_transactions_context(query, tx, top_k=top_k)
     return {"results": [{"id": d.get("id"), "text": d.get("text"), "score": float(d.get("score", 0.0))} for d in docs]}
 
 def tool_interest_last_n_months(transactions_path: str, text: str):
     from .engine import _sum_interest_last_n_months
-    tx = load_transactions(transactions_path)
+    tx = get_table(transactions_path)
     n = parse_last_n_months(text) or 6
     total, per_acct, ids = _sum_interest_last_n_months(tx, n)
     return {"total": total, "per_account": per_acct, "months": n, "sources": ids[:25]}
 
 def tool_statement_last_n_months(transactions_path: str, text: str):
     from .engine import _statement_summary_last_n_months
-    tx = load_transactions(transactions_path)
+    tx = get_table(transactions_path)
     n = parse_last_n_months(text) or 6
     stmt, ids = _statement_summary_last_n_months(tx, n)
     return {"months": n, "statement": stmt, "sources": ids[:25]}
 
-def tool_get_account_balance(account_id: str):
-    return {"accountId": account_id, "balance": 1234.56, "currency": "USD", "source": "stub"}
+def tool_get_account_balance(transactions_path: str, account_id: str, month_text: str | None = None):
+    from .tools import account_balance
+    ym = None
+    if month_text:
+        yr, mo = parse_month(month_text)
+        if yr and mo: ym = f"{yr:04d}-{mo:02d}"
+    bals = account_balance(get_table(transactions_path), account_id, month=ym, accounts=get_account_summaries())
+    if not bals:
+        return {"accountId": account_id, "balance": None, "month": ym or "LATEST", "sources": []}
+    b = bals[0]
+    return {"accountId": b["accountId"], "balance": b["balance"], "currency": b["currency"], "asOf": b["asOf"],
+            "anchored": b["anchored"], "month": ym or "LATEST", "sources": [b["sourceId"]]}
+
+def tool_top_transactions(transactions_path: str, k: int = 5, side: str = "out", month_text: str | None = None):
+    from .tools import top_transactions
+    ym = None
+    if month_text:
+        yr, mo = parse_month(month_text)
+        if yr and mo: ym = f"{yr:04d}-{mo:02d}"
+    rows = top_transactions(get_table(transactions_path), k, side, month=ym)
+    return {"transactions": rows, "side": side, "month": ym or "ALL", "sources": [r["transactionId"] for r in rows]}
+
+def tool_latest_transactions(transactions_path: str, k: int = 5):
+    from .tools import latest_transactions
+    rows = latest_transactions(get_table(transactions_path), k)
+    return {"transactions": rows, "sources": [r["transactionId"] for r in rows]}
+
+def tool_merchant_ranking(transactions_path: str, by: str = "spend", k: int = 5, month_text: str | None = None, min_count: int = 1):
+    from .tools import merchant_ranking
+    ym = None
+    if month_text:
+        yr, mo = parse_month(month_text)
+        if yr and mo: ym = f"{yr:04d}-{mo:02d}"
+    return {"merchants": merchant_ranking(get_table(transactions_path), by, k, month=ym, min_count=min_count),
+            "by": by, "month": ym or "ALL"}
 
 def tool_pay_bill(payee: str, amount: float, date: str | None = None, account_id: str | None = None):
     return {"status": "scheduled", "payee": payee, "amount": amount, "date": date or "next_business_day", "accountId": account_id or "default", "source": "stub"}
@@ -68,7 +93,10 @@ def build_agent(transactions_path: str = "data/transactions.json"):
         FunctionTool.from_defaults(fn=lambda thr, month=None: tool_count_purchases_over(transactions_path, thr, month), name="count_purchases_over"),
         FunctionTool.from_defaults(fn=lambda text: tool_interest_last_n_months(transactions_path, text), name="interest_last_n_months"),
         FunctionTool.from_defaults(fn=lambda text: tool_statement_last_n_months(transactions_path, text), name="statement_last_n_months"),
-        FunctionTool.from_defaults(fn=tool_get_account_balance, name="get_account_balance"),
+        FunctionTool.from_defaults(fn=lambda account_id, month=None: tool_get_account_balance(transactions_path, account_id, month), name="get_account_balance"),
+        FunctionTool.from_defaults(fn=lambda k=5, side="out", month=None: tool_top_transactions(transactions_path, k, side, month), name="top_transactions"),
+        FunctionTool.from_defaults(fn=lambda k=5: tool_latest_transactions(transactions_path, k), name="latest_transactions"),
+        FunctionTool.from_defaults(fn=lambda by="spend", k=5, month=None, min_count=1: tool_merchant_ranking(transactions_path, by, k, month, min_count), name="merchant_ranking"),
         FunctionTool.from_defaults(fn=tool_pay_bill, name="pay_bill"),
     ]
     system_prompt = ("You are a banking copilot focused on TRANSACTIONS. Use tools when helpful. "
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import os
+import re
+import shutil
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .faiss_index import INDEX_DIR
+from .index_delta import content_hash, dedupe_last
+from .index_registry import resident
+from .meta_store import HEADER, has_meta, read_meta, write_meta
+from .vector_filter import FilterColumns, row_meta
+
+# BM25 keyword index over the short categorical fields of a transaction
+# (merchant, type, status, currency, account), stored as <name>.bm25/ next to
+# the FAISS files in the binary meta format (see meta_store.py):
+#
+#   per doc   ids, hashes, doc_len, live, accounts/types/statuses/months (filters)
+#   per term  terms (sorted), term_df (live docs), term_offsets -> postings (post_docs, post_tf, post_w), CSR
+#
+# post_w is the BM25 term-frequency part, tf*(k1+1) / (tf + k1*(1-b+b*dl/avgdl)),
+# precomputed at write time, so a query only multiplies each of its terms'
+# posting slices by the term's idf and accumulates. term_maxw bounds post_w per
+# term: terms are applied best-bound first and, once the bound of the remaining
+# (common, low-idf) terms cannot lift a new doc into the top k, those only
+# rescore the current candidates instead of scanning their whole lists. Updates tokenize
+# only added/changed rows: replaced docs are tombstoned (live=0) and new ones
+# appended; postings are merged as arrays. Once a quarter of the docs are dead
+# the index is compacted.
+
+K1 = float(os.getenv("BM25_K1", "1.2"))
+B = float(os.getenv("BM25_B", "0.75"))
+COMPACT_DEAD = 0.25
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_COLUMNS = {"ids": "str", "hashes": "str", "doc_len": "int32", "live": "uint8", "accounts": "cat", "types": "cat",
+            "statuses": "cat", "months": "int32", "terms": "str", "term_df": "int32", "term_maxw": "float32", "term_offsets": "int64", "post_docs": "int32",
+            "post_tf": "uint16", "post_w": "float32"}
+_ROW_COLS = ("ids", "hashes", "doc_len", "live", "accounts", "types", "statuses", "months")
+
+
+def bm25_path(name: str = "tx") -> str:
+    return os.path.join(INDEX_DIR, f"{name}.bm25")
+
+
+def has_bm25_index(name: str = "tx") -> bool:
+    return has_meta(bm25_path(name))
+
+
+def _stem(tok: str) -> str:
+    return tok[:-1] if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss") else tok
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric runs, plural 's' dropped; "acct-1" / "7-Eleven" also yield the joined "acct1" / "7eleven"."""
+    out: List[str] = []
+    for word in (text or "").lower().split():
+        parts = _TOKEN_RE.findall(word)
+        out.extend(_stem(p) for p in parts)
+        if len(parts) > 1:
+            out.append("".join(parts))
+    return out
+
+
+def doc_text(t: Any) -> str:
+    return " ".join(str(v) for v in (t.merchant_name, t.transaction_type, t.transaction_status,
+                                      t.currency_code, t.account_id) if v)
+
+
+def _load(name: str) -> Optional[Dict[str, Any]]:
+    """Current index as plain arrays/lists (for rewriting), or None."""
+    if not has_bm25_index(name):
+        return None
+    m = read_meta(bm25_path(name))
+    out = {k: list(m[k]) if _COLUMNS[k] in ("str", "cat") else np.asarray(m[k]) for k in _COLUMNS}
+    out["terms"] = list(m["terms"])
+    return out
+
+
+def _update(name: str, transactions: Iterable[Any], delete_missing: bool) -> str:
+    rows = list(transactions)
+    keep = dedupe_last([t.id for t in rows])
+    rows = [rows[i] for i in keep]
+    texts = [doc_text(t) for t in rows]
+    hashes = [content_hash(x) for x in texts]
+
+    old = _load(name)
+    if old is None:
+        old = {k: ([] if _COLUMNS[k] in ("str", "cat") else np.zeros(0, dtype=_COLUMNS[k])) for k in _COLUMNS}
+        old["term_offsets"] = np.zeros(1, dtype=np.int64)
+    live = old["live"].astype(bool)
+    current = {rid: i for i, rid in enumerate(old["ids"]) if live[i] and rid}
+    incoming = {t.id for t in rows}
+
+    # tombstone replaced / removed docs, tokenize only added / changed rows
+    # (docs without an id cannot be matched: they are always added, and replaced wholesale on a rebuild)
+    add = []
+    for j, t in enumerate(rows):
+        i = current.get(t.id) if t.id else None
+        if i is not None and old["hashes"][i] == hashes[j]:
+            continue
+        if i is not None:
+            live[i] = False
+        add.append(j)
+    if delete_missing:
+        for i, rid in enumerate(old["ids"]):
+            if live[i] and (not rid or rid not in incoming):
+                live[i] = False
+
+    n_old = len(old["ids"])
+    counts = [Counter(tokenize(texts[j])) for j in add]
+    new_terms = sorted({tok for c in counts for tok in c})
+    vocab = sorted(set(old["terms"]) | set(new_terms))
+    tid = {tok: i for i, tok in enumerate(vocab)}
+    old_t = np.repeat(np.asarray([tid[tok] for tok in old["terms"]], dtype=np.int64), np.diff(old["term_offsets"]))
+    new_t = np.fromiter((tid[tok] for c in counts for tok in c), dtype=np.int64)
+    new_d = np.repeat(np.arange(n_old, n_old + len(add), dtype=np.int64), [len(c) for c in counts])
+    new_tf = np.fromiter((min(v, 65535) for c in counts for v in c.values()), dtype=np.uint16)
+
+    cols: Dict[str, Any] = {"ids": old["ids"] + [rows[j].id for j in add],
+                            "hashes": old["hashes"] + [hashes[j] for j in add],
+                            "doc_len": np.concatenate([old["doc_len"], np.asarray([sum(c.values()) for c in counts], dtype=np.int32)]),
+                            "live": np.concatenate([live, np.ones(len(add), dtype=bool)])}
+    metas = [row_meta(rows[j]) for j in add]
+    for c in ("accounts", "types", "statuses"):
+        cols[c] = old[c] + [m[c] for m in metas]
+    cols["months"] = np.concatenate([old["months"], np.asarray([m["months"] for m in metas], dtype=np.int32)])
+    t_all = np.concatenate([old_t, new_t])
+    d_all = np.concatenate([old["post_docs"].astype(np.int64), new_d])
+    tf_all = np.concatenate([old["post_tf"], new_tf])
+
+    alive = cols["live"]
+    if len(alive) and (~alive).sum() > COMPACT_DEAD * len(alive):
+        # drop dead docs and their postings; renumber the survivors
+        remap = np.cumsum(alive) - 1
+        p = alive[d_all]
+        t_all, d_all, tf_all = t_all[p], remap[d_all[p]], tf_all[p]
+        idx = np.flatnonzero(alive)
+        for c in _ROW_COLS:
+            cols[c] = [cols[c][i] for i in idx] if isinstance(cols[c], list) else cols[c][idx]
+        used = np.bincount(t_all, minlength=len(vocab)) > 0
+        vocab = [tok for tok, u in zip(vocab, used) if u]
+        t_all = (np.cumsum(used) - 1)[t_all]
+
+    order = np.lexsort((d_all, t_all))
+    t_all, d_all, tf_all = t_all[order], d_all[order], tf_all[order]
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(t_all, minlength=len(vocab)), out=offsets[1:])
+    live_len = cols["doc_len"][cols["live"].astype(bool)]
+    avgdl = float(live_len.mean()) if len(live_len) else 1.0
+    tf = tf_all.astype(np.float32)
+    w = tf * (K1 + 1) / (tf + K1 * (1 - B + B * cols["doc_len"][d_all] / avgdl))
+    df = np.bincount(t_all[cols["live"].astype(bool)[d_all]], minlength=len(vocab))   # tombstones do not count
+    maxw = np.maximum.reduceat(w, offsets[:-1]) if len(w) else np.zeros(len(vocab), dtype=np.float32)
+    cols.update({"terms": vocab, "term_df": df, "term_maxw": maxw, "term_offsets": offsets, "post_docs": d_all, "post_tf": tf_all, "post_w": w})
+    meta = {**cols, "name": name, "k1": K1, "b": B, "n_live": int(len(live_len)), "avgdl": avgdl}
+    return write_meta(bm25_path(name), meta, _COLUMNS)
+
+
+def build_bm25_index(transactions: Iterable[Any], name: str = "tx", incremental: bool = True) -> str:
+    """Index exactly `transactions` (ids not in it are deleted). With `incremental`, unchanged rows keep
+    their postings and only added/changed rows are tokenized."""
+    if not incremental:
+        shutil.rmtree(bm25_path(name), ignore_errors=True)
+    return _update(name, transactions, delete_missing=True)
+
+
+def add_to_bm25_index(transactions: Iterable[Any], name: str = "tx") -> str:
+    """Upsert `transactions` into the index (new ids appended, changed ones replaced)."""
+    return _update(name, transactions, delete_missing=False)
+
+
+def _resident(name: str):
+    path = bm25_path(name)
+    def _load_view():
+        meta = read_meta(path)
+        fcols = FilterColumns(meta, np.arange(len(meta["ids"]), dtype=np.int64))
+        return meta, fcols
+    return resident(("bm25_index", name), (os.path.join(path, HEADER),), _load_view)
+
+
+def search_bm25(query: str, top_k: int = 60, name: str = "tx", filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Top-k live docs by BM25 for `query`, optionally restricted by a vector_filter filter.
+    Returns [{"id", "score"}] best first; docs matching no query term are not returned."""
+    meta, fcols = _resident(name)
+    terms, offsets = meta["terms"], meta["term_offsets"]
+    n = max(meta["n_live"], 1)
+    plan = []
+    for tok in dict.fromkeys(tokenize(query)):
+        j = bisect_left(terms, tok)
+        if j == len(terms) or terms[j] != tok:
+            continue
+        df = int(meta["term_df"][j])
+        idf = np.float32(np.log1p((n - df + 0.5) / (df + 0.5)))
+        plan.append((float(idf * meta["term_maxw"][j]), idf, int(offsets[j]), int(offsets[j + 1])))
+    if not plan:
+        return []
+    plan.sort(key=lambda p: -p[0])
+    d = np.zeros(0, dtype=np.int64)
+    s = np.zeros(0, dtype=np.float32)
+    bound = sum(p[0] for p in plan)   # best score a doc not yet seen could still reach
+    for ub, idf, lo, hi in plan:
+        pd = meta["post_docs"][lo:hi]
+        pw = meta["post_w"][lo:hi]
+        theta = np.partition(s, len(s) - top_k)[len(s) - top_k] if len(s) >= top_k else -1.0
+        if bound < theta:
+            # no new doc can make the top k: only add this term to the current candidates
+            pos = np.minimum(np.searchsorted(pd, d), len(pd) - 1)
+            hit = pd[pos] == d
+            s[hit] += pw[pos[hit]] * idf
+        else:
+            d, s = _merge(d, s, np.asarray(pd, dtype=np.int64), pw * idf, len(meta["live"]))
+            ok = meta["live"][d].astype(bool)
+            if filters:
+                ok &= fcols.mask(filters, rows=d)
+            d, s = d[ok], s[ok]
+        bound -= ub
+    if len(d) > top_k:
+        # everything above the k-th best score, then ties at that score by doc order
+        kth = np.partition(s, len(s) - top_k)[len(s) - top_k]
+        above, tied = np.flatnonzero(s > kth), np.flatnonzero(s == kth)
+        pick = np.concatenate([above, tied[:top_k - len(above)]])
+        d, s = d[pick], s[pick]
+    order = np.lexsort((d, -s))
+    ids = meta["ids"]
+    return [{"id": ids[int(i)], "score": float(sc)} for i, sc in zip(d[order], s[order])]
+
+
+def _merge(d: np.ndarray, s: np.ndarray, d2: np.ndarray, s2: np.ndarray, n_docs: int):
+    """Union of two sparse score vectors (sorted unique docs -> summed scores)."""
+    if not len(d):
+        return d2, np.asarray(s2, dtype=np.float32)
+    if (len(d) + len(d2)) * 16 > n_docs:
+        # large lists: one dense pass beats sorting the concatenation
+        acc = np.zeros(n_docs, dtype=np.float32)
+        acc[d] = s
+        acc[d2] += s2
+        hit = np.zeros(n_docs, dtype=bool)
+        hit[d] = True
+        hit[d2] = True
+        d = np.flatnonzero(hit)
+        return d, acc[d]
+    d, inv = np.unique(np.concatenate([d, d2]), return_inverse=True)
+    return d, np.bincount(inv, weights=np.concatenate([s, s2]), minlength=len(d)).astype(np.float32)
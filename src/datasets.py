@@ -0,0 +1,112 @@
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from .io import load_transactions, load_account_summaries, iter_transaction_chunks, resolve_path, file_version, delta_path
+from .models import Transaction, AccountSummary
+from .snapshot import load_current
+from .tx_table import TransactionTable
+
+# Process-wide dataset registry. Each file is parsed/validated once and kept
+# until its (mtime, size) changes; derived artifacts (tables, aggregates, ...)
+# are cached against the same version token so they are rebuilt together.
+# Rows appended through ingest.append_transactions are folded into cached
+# values in place by the registered appenders instead of forcing a reload.
+
+_lock = threading.Lock()
+_path_locks: Dict[str, threading.RLock] = {}
+_entries: Dict[Tuple[str, str], Tuple[str, Any]] = {}   # (kind, path) -> (version, value)
+_appenders: Dict[str, Callable[[Any, List[Transaction]], Any]] = {}
+
+
+def _version(p: str) -> str:
+    return f"{file_version(p)}+{file_version(delta_path(p))}"
+
+
+def dataset_version(path: str = "transactions.json") -> str:
+    """Version token for a dataset (base file + delta log); changes on rewrite or append."""
+    return _version(resolve_path(path))
+
+
+def _path_lock(path: str) -> threading.RLock:
+    with _lock:
+        return _path_locks.setdefault(path, threading.RLock())
+
+
+def cached(path: str, kind: str, build: Callable[[str], Any]) -> Any:
+    """Return build(path) for the current version of `path`, rebuilding only when the file changed."""
+    p = resolve_path(path)
+    version = _version(p)
+    hit = _entries.get((kind, p))
+    if hit and hit[0] == version:
+        return hit[1]
+    with _path_lock(p):
+        hit = _entries.get((kind, p))
+        if hit and hit[0] == version:
+            return hit[1]
+        value = build(p)
+        _entries[(kind, p)] = (version, value)
+        return value
+
+
+def get_transactions(path: str = "transactions.json") -> List[Transaction]:
+    return cached(path, "transactions", load_transactions)
+
+
+def _build_table(p: str) -> TransactionTable:
+    # a snapshot compiled from this exact file version mmaps in O(1);
+    # otherwise stream straight into columns, never holding the full row list
+    tbl = load_current(p)
+    if tbl is not None:
+        return tbl
+    return TransactionTable.from_chunks(iter_transaction_chunks(p))
+
+
+def get_table(path: str = "transactions.json") -> TransactionTable:
+    return cached(path, "table", _build_table)
+
+
+def get_account_summaries(path: str = "account-summary.json") -> List[AccountSummary]:
+    return cached(path, "accounts", load_account_summaries)
+
+
+def locked(path: str) -> threading.RLock:
+    """The registry lock for `path`; hold it to read a value and the files it came from consistently."""
+    return _path_lock(resolve_path(path))
+
+
+def register_appender(kind: str, fn: Callable[[Any, List[Transaction]], Any]) -> None:
+    """fn(cached_value, new_rows) -> updated value; kinds are updated in registration order."""
+    _appenders[kind] = fn
+
+
+def append_rows(path: str, rows: List[Transaction], write: Callable[[str], None]) -> str:
+    """Run write(path) (which appends `rows` to disk) and fold `rows` into every cached value
+    that was current before the write; values without an appender are dropped and rebuilt lazily."""
+    p = resolve_path(path)
+    with _path_lock(p):
+        before = _version(p)
+        write(p)
+        after = _version(p)
+        current = {kind for (kind, ep), (ver, _) in _entries.items() if ep == p and ver == before}
+        for kind in [k for k in _appenders if k in current] + [k for k in current if k not in _appenders]:
+            fn = _appenders.get(kind)
+            if fn is None:
+                _entries.pop((kind, p), None)
+                continue
+            _entries[(kind, p)] = (after, fn(_entries[(kind, p)][1], rows))
+        return after
+
+
+def _extend_list(value: List[Transaction], rows: List[Transaction]) -> List[Transaction]:
+    value.extend(rows)
+    return value
+
+
+register_appender("transactions", _extend_list)
+register_appender("table", lambda tbl, rows: tbl.extend(rows))
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
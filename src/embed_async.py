@@ -0,0 +1,158 @@
+from __future__ import annotations
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Concurrent embedding for index builds. Texts are cut into contiguous batches
+# bounded by row count and an estimated token budget, up to EMBED_CONCURRENCY
+# requests are in flight against the OpenAI-compatible /embeddings endpoint,
+# 429/5xx/transport errors are retried with exponential backoff (honouring
+# Retry-After), and results are written back by position so output order
+# always matches input order. Point OPENAI_BASE_URL at scripts/stub_embed_server.py
+# to exercise it offline.
+
+CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+BATCH_ROWS = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8000"))
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S", "60"))
+_BACKOFF_BASE_S = 0.5
+_BACKOFF_MAX_S = 30.0
+
+_stats_lock = threading.Lock()
+_totals: Dict[str, float] = {}
+
+
+class EmbeddingError(RuntimeError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars/token for English; only used to keep request payloads under budget
+    return len(text) // 4 + 1
+
+
+def plan_batches(texts: List[str], max_rows: int = BATCH_ROWS, max_tokens: int = BATCH_TOKENS) -> List[Tuple[int, int]]:
+    """Contiguous [start, end) slices with at most max_rows rows and ~max_tokens tokens each."""
+    out, start, tokens = [], 0, 0
+    for i, t in enumerate(texts):
+        n = estimate_tokens(t)
+        if i > start and (i - start >= max_rows or tokens + n > max_tokens):
+            out.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        out.append((start, len(texts)))
+    return out
+
+
+def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), _BACKOFF_MAX_S)
+    except ValueError:
+        pass
+    return min(_BACKOFF_BASE_S * 2 ** attempt, _BACKOFF_MAX_S) * (0.5 + random.random() / 2)
+
+
+async def _embed_batch(client, url: str, model: str, batch: List[str], stats: Dict[str, float]) -> List[List[float]]:
+    import httpx
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            resp = await client.post(url, json={"model": model, "input": batch})
+        except httpx.TransportError as e:
+            err = e
+        else:
+            if resp.status_code == 200:
+                data = sorted(resp.json()["data"], key=lambda d: d.get("index", 0))
+                if len(data) != len(batch):
+                    raise EmbeddingError(f"expected {len(batch)} embeddings, got {len(data)}")
+                return [d["embedding"] for d in data]
+            if resp.status_code == 413 and len(batch) > 1:
+                # payload too large for this server: split instead of retrying the same request
+                mid = len(batch) // 2
+                stats["splits"] += 1
+                left = await _embed_batch(client, url, model, batch[:mid], stats)
+                return left + await _embed_batch(client, url, model, batch[mid:], stats)
+            if resp.status_code != 429 and resp.status_code < 500:
+                raise EmbeddingError(f"embeddings request failed: HTTP {resp.status_code}: {resp.text[:200]}")
+            err = EmbeddingError(f"HTTP {resp.status_code}")
+            retry_after = resp.headers.get("retry-after")
+        if attempt == MAX_RETRIES:
+            raise EmbeddingError(f"embeddings request failed after {MAX_RETRIES} retries") from err
+        stats["retries"] += 1
+        await asyncio.sleep(_backoff(attempt, retry_after))
+
+
+async def embed_texts_async(texts: List[str], model: str, *, concurrency: int = CONCURRENCY,
+                            batch_rows: int = BATCH_ROWS, batch_tokens: int = BATCH_TOKENS,
+                            base_url: Optional[str] = None, api_key: Optional[str] = None) -> np.ndarray:
+    """L2-normalized float32 embeddings for `texts`, in input order."""
+    import httpx
+    base_url = (base_url or os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1").rstrip("/")
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    batches = plan_batches(texts, batch_rows, batch_tokens)
+    stats = {"rows": len(texts), "batches": len(batches), "retries": 0, "splits": 0}
+    out: List[Optional[np.ndarray]] = [None] * len(batches)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(headers=headers, timeout=TIMEOUT_S, limits=limits) as client:
+        async def run(k: int, start: int, end: int):
+            async with sem:
+                out[k] = np.asarray(await _embed_batch(client, f"{base_url}/embeddings", model, texts[start:end], stats),
+                                    dtype=np.float32)
+        await asyncio.gather(*(run(k, s, e) for k, (s, e) in enumerate(batches)))
+    elapsed = time.perf_counter() - t0
+
+    stats["seconds"] = elapsed
+    with _stats_lock:
+        for k, v in stats.items():
+            _totals[k] = _totals.get(k, 0) + v
+    if not out:
+        return np.zeros((0, 0), dtype=np.float32)
+    V = np.vstack(out)
+    return V / (np.linalg.norm(V, axis=1, keepdims=True) + 1e-8)
+
+
+def embed_texts_concurrent(texts: List[str], model: str, **kw) -> np.ndarray:
+    """Blocking wrapper; runs on a helper thread when the caller already has an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(embed_texts_async(texts, model, **kw))
+    result: Dict[str, object] = {}
+
+    def _run():
+        try:
+            result["v"] = asyncio.run(embed_texts_async(texts, model, **kw))
+        except BaseException as e:
+            result["e"] = e
+    t = threading.Thread(target=_run)
+    t.start()
+    t.join()
+    if "e" in result:
+        raise result["e"]
+    return result["v"]
+
+
+def stats() -> Dict[str, float]:
+    """rows, batches, retries, splits, seconds and rows_per_s summed over runs since reset_stats()."""
+    with _stats_lock:
+        out = dict(_totals)
+    if out:
+        out["rows_per_s"] = out["rows"] / out["seconds"] if out["seconds"] > 0 else 0.0
+    return out
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _totals.clear()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+# Persistent embedding cache shared by every index builder, keyed by
+# (model, hash of text). One SQLite file, vectors stored as raw float32 blobs,
+# least-recently-used rows evicted once the live data exceeds the size cap.
+# Model keys are namespaced by provider ("openai:...", "st:...", "hf:...")
+# because the same model name can embed differently through different stacks.
+
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "embed_cache", "embeddings.sqlite"))
+MAX_BYTES = int(float(os.getenv("EMBED_CACHE_MAX_MB", "2048")) * (1 << 20))
+ENABLED = os.getenv("EMBED_CACHE", "true").lower() == "true"
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_conn_pid: int | None = None
+_SQL_BATCH = 500
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("CREATE TABLE IF NOT EXISTS emb (model TEXT NOT NULL, h BLOB NOT NULL, vec BLOB NOT NULL, "
+                      "last_used INTEGER NOT NULL, PRIMARY KEY (model, h)) WITHOUT ROWID")
+        _conn.execute("CREATE INDEX IF NOT EXISTS emb_lru ON emb(last_used)")
+        _conn_pid = os.getpid()
+    return _conn
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def get_many(model: str, texts: Sequence[str]) -> List[np.ndarray | None]:
+    keys = [_key(t) for t in texts]
+    found = {}
+    now = int(time.time())
+    with _lock:
+        db = _connect()
+        uniq = list(dict.fromkeys(keys))
+        for i in range(0, len(uniq), _SQL_BATCH):
+            part = uniq[i:i + _SQL_BATCH]
+            q = f"SELECT h, vec FROM emb WHERE model=? AND h IN ({','.join('?' * len(part))})"
+            found.update(db.execute(q, (model, *part)).fetchall())
+        if found:
+            db.executemany("UPDATE emb SET last_used=? WHERE model=? AND h=?", [(now, model, h) for h in found])
+            db.commit()
+    return [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+
+
+def put_many(model: str, texts: Sequence[str], vecs: np.ndarray) -> None:
+    now = int(time.time())
+    rows = [(model, _key(t), np.asarray(v, dtype=np.float32).tobytes(), now) for t, v in zip(texts, vecs)]
+    with _lock:
+        db = _connect()
+        db.executemany("INSERT OR REPLACE INTO emb (model, h, vec, last_used) VALUES (?,?,?,?)", rows)
+        db.commit()
+        _evict(db)
+
+
+def _live_bytes(db: sqlite3.Connection) -> int:
+    pages = db.execute("PRAGMA page_count").fetchone()[0] - db.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * db.execute("PRAGMA page_size").fetchone()[0]
+
+
+def _evict(db: sqlite3.Connection) -> None:
+    # drop the oldest ~10% at a time until under the cap; freed pages are reused, not returned to the OS
+    while _live_bytes(db) > MAX_BYTES:
+        n = max(1, db.execute("SELECT COUNT(*) FROM emb").fetchone()[0] // 10)
+        db.execute("DELETE FROM emb WHERE (model, h) IN (SELECT model, h FROM emb ORDER BY last_used LIMIT ?)", (n,))
+        db.commit()
+        if n == 1 and not db.execute("SELECT 1 FROM emb LIMIT 1").fetchone():
+            break
+
+
+def cached_embed(texts: Sequence[str], model: str, embed: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """Vectors for `texts`, calling embed(missing_texts) only for texts not cached under `model`."""
+    texts = list(texts)
+    if not texts:
+        return embed(texts)
+    if not ENABLED:
+        return np.asarray(embed(texts), dtype=np.float32)
+    hits = get_many(model, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, hits) if v is None))
+    fresh = {}
+    if missing:
+        V = np.asarray(embed(missing), dtype=np.float32)
+        put_many(model, missing, V)
+        fresh = dict(zip(missing, V))
+    return np.vstack([v if v is not None else fresh[t] for t, v in zip(texts, hits)]).astype(np.float32, copy=False)
+
+
+def clear() -> None:
+    with _lock:
+        db = _connect()
+        db.execute("DELETE FROM emb")
+        db.commit()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# One pooled OpenAI-compatible client per process (keep-alive connections are
+# reused across calls instead of a new client + TLS handshake per query), and a
+# bounded LRU with TTL for query embeddings keyed by (model, normalized query).
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL_S = float(os.getenv("QUERY_EMBED_CACHE_TTL_S", "3600"))
+_BATCH = 64
+
+_client_lock = threading.Lock()
+_clients: Dict[Tuple[str | None, str | None], object] = {}
+
+
+def get_client():
+    """Shared client for the current OPENAI_API_KEY / base URL."""
+    key = (os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"))
+    client = _clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(key)
+            if client is None:
+                import httpx
+                from openai import OpenAI
+                http = httpx.Client(limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60))
+                client = _clients[key] = OpenAI(api_key=key[0], base_url=key[1], http_client=http)
+    return client
+
+
+def _normalize(V: np.ndarray) -> np.ndarray:
+    return V / (np.linalg.norm(V, axis=-1, keepdims=True) + 1e-8)
+
+
+def embed_texts(texts: List[str], model: str) -> np.ndarray:
+    """L2-normalized float32 embeddings from the remote endpoint, requested in batches of 64."""
+    client = get_client()
+    vecs = []
+    for i in range(0, len(texts), _BATCH):
+        resp = client.embeddings.create(model=model, input=texts[i:i + _BATCH])
+        vecs.extend(d.embedding for d in resp.data)
+    return _normalize(np.array(vecs, dtype="float32"))
+
+
+class _QueryCache:
+    def __init__(self, size: int, ttl_s: float):
+        self.size, self.ttl_s = size, ttl_s
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> np.ndarray | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] < self.ttl_s:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        vec.setflags(write=False)   # shared between callers
+        with self._lock:
+            self._items[key] = (time.monotonic(), vec)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items),
+                    "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+_queries = _QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_S)
+
+
+def normalize_query(query: str) -> str:
+    # whitespace only: case and punctuation can change the embedding
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def cached_query(query: str, model: str, embed: Callable[[str], np.ndarray]) -> np.ndarray:
+    """embed(normalized query) through the LRU; `model` should include the provider (e.g. "openai:...")."""
+    q = normalize_query(query)
+    key = (model, q)
+    vec = _queries.get(key)
+    if vec is None:
+        vec = np.asarray(embed(q), dtype=np.float32).reshape(-1)
+        _queries.put(key, vec)
+    return vec
+
+
+def embed_query(query: str, model: str) -> np.ndarray:
+    """Normalized embedding of one query via the pooled client, served from the LRU when possible."""
+    return cached_query(query, f"openai:{model}", lambda q: embed_texts([q], model)[0])
+
+
+def cached_queries(queries: List[str], model: str, embed_many: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """cached_query for many queries: LRU misses (deduplicated) are embedded in one embed_many call.
+    Returns a [len(queries), dim] float32 matrix in input order."""
+    keys = [(model, normalize_query(q)) for q in queries]
+    vecs = [_queries.get(k) for k in keys]
+    missing = list(dict.fromkeys(k[1] for k, v in zip(keys, vecs) if v is None))
+    if missing:
+        fresh = dict(zip(missing, np.asarray(embed_many(missing), dtype=np.float32)))
+        for q, v in fresh.items():
+            _queries.put((model, q), v)
+        vecs = [v if v is not None else fresh[k[1]] for k, v in zip(keys, vecs)]
+    return np.stack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+
+
+def embed_queries(queries: List[str], model: str) -> np.ndarray:
+    """embed_query for a batch: one request per 64 rows for whatever the LRU does not hold."""
+    return cached_queries(queries, f"openai:{model}", lambda qs: embed_texts(qs, model))
+
+
+def query_cache_stats() -> Dict[str, float]:
+    return _queries.stats()
+
+
+def clear_query_cache() -> None:
+    _queries.clear()
@@ -1,17 +1,21 @@
-import datetime
+from datetime import datetime, timezone
 import os, json
 import re
 from typing import Any, Dict, List, Tuple
-from .io import load_transactions
+from .datasets import get_transactions, get_table, get_account_summaries
 from .retrieval import retrieve_transactions_context
 from .prompts import SYSTEM_PROMPT, render_user_prompt
 from . import tools as tx_tools
-from .nlp_utils import parse_month, month_key, parse_last_n_months
+from .nlp_utils import parse_month, parse_last_n_months
+from .tx_table import as_table, month_bounds, month_index, month_label, parse_ts, NAT
+from .tx_cube import month_range
+import numpy as np
 
 USE_LLM_TOOLS = os.getenv('USE_LLM_TOOLS', 'true').lower() == 'true'
 
 MONTH_RE = re.compile(r"\b(20\d{2})-(0[1-9]|1[0-2])\b")
 YEAR_RE  = re.compile(r"\b(20\d{2})\b")
+DATE_RANGE_RE = re.compile(r"between\s+(\d{4}-\d{2}-\d{2})\s+and\s+(\d{4}-\d{2}-\d{2})")
 
 def _fmt_month(dt: datetime) -> str: return f"{dt.year:04d}-{dt.month:02d}"
 def _last_month(dt: datetime) -> str:
@@ -35,7 +39,7 @@ def infer_timeframe(query: str, now_dt: datetime) -> dict:
 
 def _normalize_time_args(args: dict, query: str) -> dict:
     a = dict(args or {})
-    inferred = infer_timeframe(query, datetime.now(datetime.timezone.utc))
+    inferred = infer_timeframe(query, datetime.now(timezone.utc))
     # prefer month if present
     if inferred.get("month"):
         a["month"] = inferred["month"]; a.pop("year", None)
@@ -73,6 +77,38 @@ def _tool_schema():
             "month": {"type": "string"}, "year": {"type": "string"}
         }}
     }},
+    {"type": "function", "function": {
+        "name": "account_balance",
+        "description": "Balance per account reconstructed from POSTED transactions, at the end of month='YYYY-MM' / year='YYYY' or now. Use when endingBalance is missing.",
+        "parameters": {"type": "object", "properties": {
+            "account_id": {"type": "string"}, "month": {"type": "string"}, "year": {"type": "string"}
+        }}
+    }},
+    {"type": "function", "function": {
+        "name": "top_transactions",
+        "description": "Largest k transactions by amount over the full history. side='out' = biggest spends (default), 'in' = biggest credits, 'any' = largest absolute. Optional type/status/account and month='YYYY-MM' / year='YYYY'.",
+        "parameters": {"type": "object", "properties": {
+            "k": {"type": "integer"}, "side": {"type": "string", "enum": ["out", "in", "any"]},
+            "transaction_type": {"type": "string"}, "status": {"type": "string"}, "account_id": {"type": "string"},
+            "month": {"type": "string"}, "year": {"type": "string"}
+        }}
+    }},
+    {"type": "function", "function": {
+        "name": "latest_transactions",
+        "description": "Newest k transactions, newest first. Optional type/status/account and month='YYYY-MM' / year='YYYY'.",
+        "parameters": {"type": "object", "properties": {
+            "k": {"type": "integer"}, "transaction_type": {"type": "string"}, "status": {"type": "string"},
+            "account_id": {"type": "string"}, "month": {"type": "string"}, "year": {"type": "string"}
+        }}
+    }},
+    {"type": "function", "function": {
+        "name": "merchant_ranking",
+        "description": "Merchants ranked by='spend' (sum of outflows) or 'count' (visits), POSTED only unless include_pending. min_count keeps merchants with at least that many visits (\"more than 5 times\" = 6). Accepts month/year.",
+        "parameters": {"type": "object", "properties": {
+            "by": {"type": "string", "enum": ["spend", "count"]}, "k": {"type": "integer"}, "min_count": {"type": "integer"},
+            "include_pending": {"type": "boolean"}, "month": {"type": "string"}, "year": {"type": "string"}
+        }}
+    }},
     ]
 
 def _call_tool(name: str, args: Dict[str, Any], state: Dict[str, Any]):
@@ -89,79 +125,102 @@ def _call_tool(name: str, args: Dict[str, Any], state: Dict[str, Any]):
         return tx_tools.sum_debits(tx, month=a.get("month"), year=a.get("year"))
     if name == "sum_payments":
         return tx_tools.sum_payments(tx, month=a.get("month"), year=a.get("year"))
+    if name == "account_balance":
+        return tx_tools.account_balance(tx, a.get("account_id"), month=a.get("month"), year=a.get("year"),
+                                        accounts=state.get("accounts"))
+    if name == "top_transactions":
+        return tx_tools.top_transactions(tx, a.get("k") or 5, a.get("side") or "out", a.get("transaction_type"), a.get("status"),
+                                         a.get("account_id"), month=a.get("month"), year=a.get("year"))
+    if name == "latest_transactions":
+        return tx_tools.latest_transactions(tx, a.get("k") or 5, a.get("transaction_type"), a.get("status"), a.get("account_id"),
+                                            month=a.get("month"), year=a.get("year"))
+    if name == "merchant_ranking":
+        return tx_tools.merchant_ranking(tx, a.get("by") or "spend", a.get("k") or 5, month=a.get("month"), year=a.get("year"),
+                                         min_count=a.get("min_count") or 1, include_pending=bool(a.get("include_pending")))
     raise ValueError(f"Unknown tool: {name}")
 
 # Deterministic helpers
 def _sum_interest(transactions, ym: str | None) -> Tuple[float, List[str]]:
-    total, ids = 0.0, []
-    for t in transactions:
-        if (t.transaction_type or '').upper() == 'INTEREST' and (ym is None or month_key(t.transaction_date_time) == ym):
-            total += (t.amount or 0.0); ids.append(t.id)
-    return round(total,2), ids
+    tbl = as_table(transactions)
+    cube = tbl.cube()
+    lo, hi = month_range(ym)
+    total = cube.total(cube.cells(lo, hi, txn_type="INTEREST"))
+    sub = tbl.period(ym)
+    return round(total,2), sub.ids(sub.eq("transaction_type", "INTEREST"))
 
 def _count_purchases_over(transactions, threshold: float, ym: str | None) -> Tuple[int, List[str]]:
-    ids = []
-    for t in transactions:
-        if (t.transaction_type or '').upper() != 'PURCHASE': continue
-        if abs(t.amount or 0.0) <= threshold: continue
-        if ym and month_key(t.transaction_date_time) != ym: continue
-        ids.append(t.id)
+    tbl = as_table(transactions).period(ym)
+    m = tbl.eq("transaction_type", "PURCHASE") & (np.abs(tbl.amount) > threshold)
+    ids = tbl.ids(m)
     return len(ids), ids
 
+def _latest_month_index(tbl) -> int | None:
+    ts = tbl.latest_ts()
+    return None if ts is None else int(np.datetime64(ts, "s").astype("datetime64[M]").astype(np.int64))
+
 def _most_recent_month(transactions) -> str | None:
-    months = sorted({month_key(t.transaction_date_time) for t in transactions})
-    return months[-1] if months else None
+    latest = _latest_month_index(as_table(transactions))
+    return None if latest is None else month_label(latest)
 
 def _months_in_range(transactions, last_n: int):
-    latest = None
-    from datetime import datetime
-    for t in transactions:
-        try:
-            d = datetime.fromisoformat((t.transaction_date_time or '').replace('Z','+00:00'))
-            if latest is None or d > latest: latest = d
-        except Exception: continue
+    latest = _latest_month_index(as_table(transactions))
     if latest is None:
-        from datetime import datetime as _dt
-        latest = _dt.utcnow()
-    months = []
-    y = latest.year; m = latest.month
-    for _ in range(last_n):
-        months.append(f"{y:04d}-{m:02d}")
-        m -= 1
-        if m == 0: m = 12; y -= 1
-    return set(months)
+        now = datetime.now(timezone.utc); latest = (now.year - 1970) * 12 + now.month - 1
+    return {month_label(latest - k) for k in range(last_n)}
+
+def _last_n_range(tbl, last_n: int) -> Tuple[int, int]:
+    months = sorted(month_index(mk) for mk in _months_in_range(tbl, last_n))
+    return months[0], months[-1]
+
+def _rows_in_months(tbl, lo: int, hi: int) -> np.ndarray:
+    return tbl.rows_between(month_bounds(month_label(lo))[0], month_bounds(month_label(hi))[1])
 
 def _sum_interest_last_n_months(transactions, last_n: int):
-    months = _months_in_range(transactions, last_n)
-    total = 0.0; ids = []; per_account = {}
-    for t in transactions:
-        if (t.transaction_type or '').upper() == 'INTEREST' and month_key(t.transaction_date_time) in months:
-            total += (t.amount or 0.0); ids.append(t.id)
-            acct = t.account_id or 'unknown'
-            per_account.setdefault(acct, 0.0); per_account[acct] += (t.amount or 0.0)
-    per_account = {k: round(v, 2) for k,v in per_account.items()}
-    return round(total,2), per_account, ids
+    tbl = as_table(transactions)
+    cube = tbl.cube()
+    lo, hi = _last_n_range(tbl, last_n)
+    cells = cube.cells(lo, hi, txn_type="INTEREST")
+    codes, sums, _, _ = cube.by(cells, "account_id")
+    per_account = {}
+    for c, total in zip(codes.tolist(), sums.tolist()):
+        name = "unknown" if c < 0 else tbl.vocab["account_id"][c]
+        per_account[name] = round(per_account.get(name, 0.0) + total, 2)
+    sub = tbl.take(_rows_in_months(tbl, lo, hi))
+    return round(cube.total(cells),2), per_account, sub.ids(sub.eq("transaction_type", "INTEREST"))
 
 def _statement_summary_last_n_months(transactions, last_n: int):
-    months = _months_in_range(transactions, last_n)
-    summary = {}; ids = []
-    for t in transactions:
-        mk = month_key(t.transaction_date_time)
-        if mk not in months: continue
-        ids.append(t.id)
-        d = summary.setdefault(mk, {"inflow":0.0,"outflow":0.0,"net":0.0,"count":0})
-        amt = t.amount or 0.0
-        if amt >= 0: d["inflow"] += amt
-        else: d["outflow"] += -amt
-        d["net"] += amt
-        d["count"] += 1
-    for mk, d in summary.items():
-        d["inflow"] = round(d["inflow"],2); d["outflow"] = round(d["outflow"],2); d["net"] = round(d["net"],2)
-    ordered = dict(sorted(summary.items(), key=lambda kv: kv[0], reverse=True))
-    return ordered, ids
-
-def _maybe_handle_deterministic(query: str, transactions):
+    tbl = as_table(transactions)
+    cube = tbl.cube()
+    lo, hi = _last_n_range(tbl, last_n)
+    keys, net, inflow, count = cube.by(cube.cells(lo, hi), "month")
+    summary = {}
+    for j in range(len(keys) - 1, -1, -1):
+        outflow = inflow[j] - net[j]
+        summary[month_label(keys[j])] = {"inflow": round(float(inflow[j]),2), "outflow": round(float(outflow),2),
+                                         "net": round(float(net[j]),2), "count": int(count[j])}
+    return summary, tbl.ids_col[_rows_in_months(tbl, lo, hi)].tolist()
+
+def _transactions_between(transactions, start: str, end: str):
+    """(records oldest first, total) for start..end inclusive ('YYYY-MM-DD'); None if a date does not parse."""
+    tbl = as_table(transactions)
+    lo, hi = parse_ts(start + "T00:00:00"), parse_ts(end + "T00:00:00")
+    if NAT in (lo, hi):
+        return None
+    rows = tbl.rows_between(lo, hi + 86400)
+    return [tbl.record(i) for i in rows], round(float(tbl.amount[rows].sum()), 2)
+
+def _maybe_handle_deterministic(query: str, transactions, accounts=None):
     q = query.lower()
+    # balance: answered here only when every account involved is anchored to its summary's currentBalance
+    if 'balance' in q and 'reward' not in q and accounts:
+        yr, mo = parse_month(q); ym = f"{yr:04d}-{mo:02d}" if (yr and mo) else None
+        tbl = as_table(transactions)
+        named = [a for a in tbl.vocab["account_id"] if a and a.lower() in q]
+        bals = [b for a in (named or [None]) for b in tx_tools.account_balance(tbl, a, month=ym, accounts=accounts)]
+        if bals and all(b["anchored"] for b in bals):
+            answer = f"{bals[0]['balance']}" if len(bals) == 1 else json.dumps({b["accountId"]: b["balance"] for b in bals})
+            return {"answer": answer, "reasoning": "Running balance of POSTED transactions" + (f" through {ym}" if ym else "")
+                    + ", anchored to the account summary currentBalance", "sources": [b["sourceId"] for b in bals]}
     # interest month total
     if 'interest' in q and ('total' in q or 'sum' in q or 'amount' in q):
         yr, mo = parse_month(q); ym = f"{yr:04d}-{mo:02d}" if (yr and mo) else None
@@ -177,6 +236,13 @@ def _maybe_handle_deterministic(query: str, transactions):
         count, ids = _count_purchases_over(transactions, threshold, ym)
         when_txt = f" in {ym}" if ym else " across all months"
         return {"answer": f"{count}", "reasoning": f"Counted PURCHASE where |amount| > {threshold}{when_txt}.", "sources": ids[:25]}
+    # explicit date range: "between 2025-07-01 and 2025-07-31"
+    m = DATE_RANGE_RE.search(q)
+    hit = _transactions_between(transactions, m.group(1), m.group(2)) if m else None
+    if hit is not None:
+        rows, total = hit
+        return {"answer": json.dumps({"count": len(rows), "total": total, "transactions": rows[:50]}),
+                "reasoning": f"Selected transactions dated {m.group(1)} to {m.group(2)} inclusive", "sources": [r["transactionId"] for r in rows[:25]]}
     # last n months: interest & statement
     n = parse_last_n_months(q)
     if n and 'interest' in q:
@@ -188,11 +254,13 @@ def _maybe_handle_deterministic(query: str, transactions):
     return None
 
 def ask_tx(query: str, use_llm: bool = True, transactions_path: str = "transactions.json", chat_history: list | None = None):
-    transactions = load_transactions(transactions_path)
-    det = _maybe_handle_deterministic(query, transactions)
+    transactions = get_transactions(transactions_path)
+    table = get_table(transactions_path)
+    accounts = get_account_summaries()
+    det = _maybe_handle_deterministic(query, table, accounts)
     if det is not None: return det
 
-    ctx = retrieve_transactions_context(query, transactions, top_k=12)
+    ctx = retrieve_transactions_context(query, transactions, top_k=12, accounts=accounts)
     if not use_llm:
         return {"answer":"LLM disabled","reasoning":"", "sources":[d["id"] for d in ctx]}
 
@@ -224,11 +292,11 @@ def ask_tx(query: str, use_llm: bool = True, transactions_path: str = "transacti
     msg = resp.choices[0].message
     if getattr(msg, "tool_calls", None):
         messages.append({"role":"assistant","content": msg.content or "", "tool_calls": msg.tool_calls})
-        state = {"transactions": transactions}
+        state = {"transactions": table}
         for tc in msg.tool_calls[:4]:
             name = tc.function.name
             args = json.loads(tc.function.arguments or "{}")
-            result = _call_tool(name, args, {'transactions': transactions,  "query": query })
+            result = _call_tool(name, args, {'transactions': table,  "query": query, "accounts": accounts})
             messages.append({"role":"tool","tool_call_id": tc.id, "content": json.dumps(result)})
         resp = client.chat.completions.create(**kwargs | {"messages": messages})
         msg = resp.choices[0].message
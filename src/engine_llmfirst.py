@@ -1,27 +1,86 @@
 from __future__ import annotations
-import os, json
+import os, json, logging
 from typing import List, Dict, Any
+from datetime import datetime, timezone
+import numpy as np
 from .retrieval_llmfirst import retrieve_candidates, pack_jsonl
-from .prompts_llmfirst import SYSTEM_LLM_FIRST, render_llm_first_user
+from .prompts_llmfirst import (SYSTEM_LLM_FIRST, render_llm_first_user, SYSTEM_PLAN, render_plan_user,
+                               SYSTEM_PLAN_ANSWER, render_plan_answer_user)
 from .models import Transaction
+from .hybrid_retriever import positions, row_index
+from .query_plan import PlanError, execute
 
 from openai import OpenAI
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+log = logging.getLogger(__name__)
 
 def verify_sum_from_ids(selected_ids: List[str], all_txns: List[Transaction]) -> float:
-    id2t = {t.id: t for t in all_txns}
-    total = 0.0
-    for i in selected_ids:
-        t = id2t.get(i)
-        if not t:
-            continue
-        try:
-            total += float(getattr(t, "amount", 0.0))
-        except Exception:
-            pass
-    return round(total, 2)
+    tbl = row_index(all_txns)
+    rows = positions(tbl, [str(i) for i in selected_ids])
+    return round(float(tbl.amount[rows].sum()), 2)
+
+def _chat_json(messages: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    resp = client.chat.completions.create(
+        model=os.getenv("CHAT_MODEL", "meta-llama/Llama-3.3-70B-Instruct"),
+        messages=messages,
+        response_format={"type": "json_object"},
+        temperature=0.1,
+    )
+    try:
+        js = json.loads(resp.choices[0].message.content)
+    except Exception:
+        return None
+    return js if isinstance(js, dict) else None
+
+def data_profile(tbl, accounts: List[Any] | None = None) -> str:
+    # fixed-size summary of what the data contains; independent of the number of rows
+    latest = tbl.latest_ts()
+    profile = {
+        "today": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        "newest_transaction_month": None if latest is None else str(np.datetime64(latest, "s").astype("datetime64[M]")),
+        "transaction_types": tbl.vocab["transaction_type"][:30],
+        "transaction_statuses": tbl.vocab["transaction_status"][:10],
+        "account_ids": tbl.vocab["account_id"][:20],
+        "transaction_rows": len(tbl),
+    }
+    if accounts is not None:
+        profile["account_summaries"] = len(accounts)
+    return json.dumps(profile)
+
+def answer_with_plan(query: str, transactions: List[Transaction], accounts: List[Any] | None = None,
+                     chat_history: List[Dict[str,str]] | None = None) -> Dict[str, Any] | None:
+    """LLM writes a query plan, the executor runs it over the full data, the LLM phrases the exact result.
+    None when the model declines to plan or the plan does not run (callers fall back to candidate rows)."""
+    tbl = row_index(transactions)
+    messages = [{"role": "system", "content": SYSTEM_PLAN}]
+    if chat_history:
+        messages.extend([m for m in chat_history if m.get("role") in ("user","assistant")][-6:])
+    messages.append({"role": "user", "content": render_plan_user(query, data_profile(tbl, accounts))})
+    js = _chat_json(messages)
+    plan = (js or {}).get("plan")
+    if not isinstance(plan, dict):
+        return None
+    try:
+        result = execute(plan, tbl, accounts)
+    except PlanError as e:
+        # a malformed plan falls back to candidate rows instead of failing the question
+        log.warning("query plan rejected (%s): %s", e, json.dumps(plan)[:500])
+        return None
+    shown = {k: v for k, v in result.items() if k != "sources"}
+    final = _chat_json([{"role": "system", "content": SYSTEM_PLAN_ANSWER},
+                        {"role": "user", "content": render_plan_answer_user(query, json.dumps(plan), json.dumps(shown))}]) or {}
+    return {
+        "answer": final.get("answer") or json.dumps(result["rows"]),
+        "reasoning": final.get("reasoning") or (js.get("reasoning") or "Executed query plan over the full dataset."),
+        "sources": result["sources"],
+    }
 
 def ask_llm_first(query: str, transactions: List[Transaction], chat_history: List[Dict[str,str]]|None=None) -> Dict[str,Any]:
+    # 0) preferred: a query plan executed over every row; candidate rows only if no plan runs
+    planned = answer_with_plan(query, transactions, chat_history=chat_history)
+    if planned is not None:
+        return planned
+
     # 1) retrieve candidates (LLM will decide which ones to use)
     cands = retrieve_candidates(query, transactions, top_k=120)
     jsonl_rows = pack_jsonl(cands)
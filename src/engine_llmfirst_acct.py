@@ -8,6 +8,7 @@ from .models import Transaction, AccountSummary
 from .retrieval_llmfirst import retrieve_candidates, pack_jsonl
 from .retrieval_accounts import retrieve_accounts, pack_accounts_jsonl, looks_like_account_query
 from .prompts_llmfirst import SYSTEM_LLM_FIRST_ACCOUNTS, render_llm_first_user_accounts
+from .engine_llmfirst import answer_with_plan
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
@@ -16,7 +17,12 @@ def ask_llm_first_accounts(query: str,
                            accounts: List[AccountSummary],
                            chat_history: List[Dict[str,str]] | None = None) -> Dict[str,Any]:
 
-    # Retrieve candidates
+    # Preferred: a query plan over all transactions / account summaries
+    planned = answer_with_plan(query, transactions, accounts, chat_history)
+    if planned is not None:
+        return planned
+
+    # Fallback: retrieve candidates
     tx_cands = retrieve_candidates(query, transactions, top_k=120)
     acct_cands = retrieve_accounts(query, accounts, top_k=12) if looks_like_account_query(query) else accounts[:12]
 
@@ -1,12 +1,24 @@
 import os, json, numpy as np
-from typing import List, Dict
+from typing import List, Dict, Iterable
 from .models import Transaction
+from .io import chunked
+from .embed_cache import cached_embed
+from .embed_client import embed_query, embed_queries
+from .embed_async import embed_texts_concurrent
+from .index_registry import resident
+from .index_spec import parse_spec, resolve, supports_remove, has_labels, new_index, search as spec_search, search_filtered, read_for_search, rescore_factor
+from .vector_filter import FilterColumns, infer_filter, row_meta
+from .index_delta import row_key, row_label, row_labels, row_keys, content_hash, dedupe_last, plan_update
+from .meta_store import HEADER, has_meta, label_lookup, materialize, read_meta, write_meta
+from .vector_store import VectorFile, read_vectors, remove_vectors, rescore, vectors_path
 
 try:
     import faiss  # faiss-cpu or faiss-gpu
 except Exception as e:
     raise RuntimeError("faiss is required. Install with `pip install faiss-cpu`.") from e
 
+_FILTER_COLS = ("accounts", "types", "statuses", "months")
+
 INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "index_faiss")
 os.makedirs(INDEX_DIR, exist_ok=True)
 
@@ -19,78 +31,290 @@ def _pack_text(t: Transaction) -> str:
     return "TRANSACTION " + " | ".join([p for p in parts if p and not p.endswith('=None') and not p.endswith('=')])
 
 def _embed_texts(texts: List[str], embed_model: str) -> np.ndarray:
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"))
-    vecs = []
-    chunk = 64
-    for i in range(0, len(texts), chunk):
-        batch = texts[i:i+chunk]
-        resp = client.embeddings.create(model=embed_model, input=batch)
-        for d in resp.data:
-            vecs.append(d.embedding)
-    V = np.array(vecs, dtype="float32")
-    V /= (np.linalg.norm(V, axis=1, keepdims=True) + 1e-8)  # L2 normalize
-    return V
-
-def build_faiss_index(transactions: List[Transaction], embed_model: str | None = None, name: str = "tx_faiss"):
+    # shared on-disk cache: only texts never embedded with this model hit the endpoint
+    return cached_embed(texts, f"openai:{embed_model}", lambda missing: embed_texts_concurrent(missing, embed_model))
+
+def _add_rows(index, rows: List[int], texts: List[str], labels: np.ndarray, embed_model: str, spec: dict,
+              side: VectorFile | None = None):
+    """Embed texts[rows] chunk by chunk and add them under labels[rows] (and to the float32 side file, if
+    any). Creates the index on first use, training IVF/SQ8 specs on the first chunk; returns (index, effective spec)."""
+    for batch in chunked(rows):
+        V = _embed_texts([texts[i] for i in batch], embed_model)
+        if index is None:
+            index, spec = new_index(spec, V)
+        index.add_with_ids(V, labels[batch])
+        if side is not None:
+            side.put(batch, V)
+    return index, spec
+
+def _write_side(side: VectorFile | None, name: str, ids, texts, old_ids, embed_model: str) -> None:
+    """Finish (rescore on) or drop (rescore off) the float32 side file used to re-rank quantized hits."""
+    if side is None:
+        remove_vectors(vectors_path(_paths(name)[0]))
+    else:
+        side.complete(ids, texts, old_ids, lambda xs: _embed_texts(xs, embed_model))
+
+def build_faiss_index(transactions: Iterable[Transaction], embed_model: str | None = None, name: str = "tx_faiss",
+                      incremental: bool = True, index_spec=None):
+    """`transactions` may be a list or a stream (e.g. io.iter_transaction_chunks flattened).
+    With `incremental`, rows whose packed text is unchanged since the previous build keep their
+    vectors; only added/changed rows are embedded and deleted ones are removed. Duplicate ids keep the last row.
+    `index_spec` picks the index type (see index_spec.py); None keeps the previous build's spec, else flat."""
     embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
-    texts = [_pack_text(t) for t in transactions]
-    ids = [t.id for t in transactions]
-    merchants = [t.merchant_name or "" for t in transactions]
-    categories = [getattr(t, "merchant_category_name", None) or "" for t in transactions]
+    ids, texts, merchants, categories = [], [], [], []
+    filt = {c: [] for c in _FILTER_COLS}   # per-row filter metadata (see vector_filter.py)
+    for t in transactions:
+        ids.append(t.id)
+        texts.append(_pack_text(t))
+        merchants.append(t.merchant_name or "")
+        categories.append(getattr(t, "merchant_category_name", None) or "")
+        for c, v in row_meta(t).items():
+            filt[c].append(v)
+    keep = dedupe_last(ids)
+    if len(keep) != len(ids):
+        ids, texts, merchants, categories = ([col[i] for i in keep] for col in (ids, texts, merchants, categories))
+        filt = {c: [col[i] for i in keep] for c, col in filt.items()}
+    if not ids:
+        raise ValueError("No transactions to index.")
+    hashes = [content_hash(x) for x in texts]
+    keys = row_keys(ids)
+    labels = row_labels(keys)
 
-    V = _embed_texts(texts, embed_model)
-    dim = V.shape[1]
+    index, old = None, None
+    if incremental and has_faiss_index(name):
+        index, old = _load_index_and_meta(name)
+    requested, spec = resolve(old, index_spec)
+    if old is not None and (spec is None or old.get("model") != embed_model or "hashes" not in old
+                            or not has_labels(index, old.get("index"))):
+        index, old = None, None   # different model, index type or pre-ID-map build: start over
+    side = VectorFile(vectors_path(_paths(name)[0]), len(ids)) if rescore_factor(requested) else None
+    if index is not None:
+        remove, embed = plan_update(row_keys(old["ids"]), old["hashes"], keys, hashes)
+        if remove and not supports_remove(spec):
+            index = None   # cannot delete from HNSW; re-add everything (unchanged rows come from the embedding cache)
+        else:
+            if remove:
+                index.remove_ids(row_labels(remove))
+            index, spec = _add_rows(index, embed, texts, labels, embed_model, spec, side)
+    if index is None:
+        index, spec = _add_rows(None, list(range(len(ids))), texts, labels, embed_model, requested, side)
+    _write_side(side, name, keys, texts, row_keys(old["ids"]) if old is not None else None, embed_model)
 
-    # Exact cosine via inner product on normalized vectors
-    index = faiss.IndexFlatIP(dim)
-    index.add(V)
+    meta = {"ids": ids, "texts": texts, "merchants": merchants, "categories": categories, "hashes": hashes,
+            "labels": labels.tolist(), "model": embed_model, "dim": index.d, "index": spec, "index_request": requested, **filt}
+    return _save_index_and_meta(index, meta, name)
 
-    idx_path = os.path.join(INDEX_DIR, f"{name}.index")
-    faiss.write_index(index, idx_path)
+_META_COLUMNS = {"ids": "str", "texts": "str", "merchants": "cat", "categories": "cat", "hashes": "str",
+                 "labels": "int64", "accounts": "cat", "types": "cat", "statuses": "cat", "months": "int32"}
 
-    meta = {"ids": ids, "texts": texts, "merchants": merchants, "categories": categories, "model": embed_model, "dim": dim}
-    meta_path = os.path.join(INDEX_DIR, f"{name}.meta.json")
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta, f)
+def _paths(name: str):
+    return (os.path.join(INDEX_DIR, f"{name}.index"), os.path.join(INDEX_DIR, f"{name}.meta"),
+            os.path.join(INDEX_DIR, f"{name}.meta.json"))   # last: pre-binary JSON meta
 
-    return idx_path, meta_path
+def _save_index_and_meta(index, meta: dict, name: str):
+    # write-then-rename so concurrent readers never see a half-written file
+    idx_path, meta_dir, legacy = _paths(name)
+    faiss.write_index(index, idx_path + ".tmp")
+    os.replace(idx_path + ".tmp", idx_path)
+    write_meta(meta_dir, meta, {k: v for k, v in _META_COLUMNS.items() if k in meta})
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    return idx_path, meta_dir
+
+def add_to_faiss_index(transactions: List[Transaction], embed_model: str | None = None, name: str = "tx_faiss"):
+    """Upsert only `transactions` into an existing index (full build if there is none or it predates ID mapping)."""
+    if not has_faiss_index(name):
+        return build_faiss_index(transactions, embed_model=embed_model, name=name)
+    index, meta = _load_index_and_meta(name)
+    if "hashes" not in meta or not has_labels(index, meta.get("index")):
+        return build_faiss_index(transactions, embed_model=embed_model, name=name, incremental=False)
+    old_keys = row_keys(meta["ids"])
+    meta = materialize(meta)   # rows are appended/replaced in place below
+    pos = {rid: i for i, rid in enumerate(meta["ids"]) if rid}   # rows without an id are only ever added
+    n_before = len(meta["ids"])
+    cols = ("ids", "texts", "merchants", "categories", "hashes")
+    if FilterColumns.supported(meta):
+        cols += _FILTER_COLS
+    changed = []
+    for t in transactions:
+        text = _pack_text(t)
+        row = (t.id, text, t.merchant_name or "", getattr(t, "merchant_category_name", None) or "", content_hash(text))
+        if len(cols) > 5:
+            row += tuple(row_meta(t)[c] for c in _FILTER_COLS)
+        i = pos.get(t.id) if t.id else None
+        if i is None:
+            i = len(meta["ids"])
+            if t.id:
+                pos[t.id] = i
+            for key, v in zip(cols, row):
+                meta[key].append(v)
+            meta["labels"].append(row_label(row_key(t.id, i)))
+        elif meta["hashes"][i] != row[4]:
+            for key, v in zip(cols, row):
+                meta[key][i] = v
+        else:
+            continue
+        changed.append(i)
+    changed = list(dict.fromkeys(changed))
+    if changed:
+        labels = np.asarray(meta["labels"], dtype=np.int64)
+        model = meta.get("model") or embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
+        spec = parse_spec(meta.get("index"))
+        side = VectorFile(vectors_path(_paths(name)[0]), len(meta["ids"])) if rescore_factor(spec) else None
+        replaced = [i for i in changed if i < n_before]
+        if replaced and not supports_remove(spec):
+            # HNSW cannot delete: rebuild from the stored texts (unchanged rows come from the embedding cache)
+            index, meta["index"] = _add_rows(None, list(range(len(meta["ids"]))), meta["texts"], labels, model, spec, side)
+        else:
+            if replaced:
+                index.remove_ids(labels[replaced])
+            index, _ = _add_rows(index, changed, meta["texts"], labels, model, spec, side)
+        _write_side(side, name, row_keys(meta["ids"]), meta["texts"], old_keys, model)
+    return _save_index_and_meta(index, meta, name)
 
 def has_faiss_index(name: str = "tx_faiss") -> bool:
-    return os.path.exists(os.path.join(INDEX_DIR, f"{name}.index")) and os.path.exists(os.path.join(INDEX_DIR, f"{name}.meta.json"))
+    idx_path, meta_dir, legacy = _paths(name)
+    return os.path.exists(idx_path) and (has_meta(meta_dir) or os.path.exists(legacy))
+
+def _load_meta(name: str):
+    _, meta_dir, legacy = _paths(name)
+    if has_meta(meta_dir):
+        return read_meta(meta_dir)
+    with open(legacy, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-def _load_index_and_meta(name: str = "tx_faiss"):
-    idx_path = os.path.join(INDEX_DIR, f"{name}.index")
-    meta_path = os.path.join(INDEX_DIR, f"{name}.meta.json")
-    if not (os.path.exists(idx_path) and os.path.exists(meta_path)):
+def _load_index_and_meta(name: str = "tx_faiss", for_search: bool = False):
+    """(index, meta). meta is a read-only mmapped MetaView (a dict for indexes saved before the binary
+    format); `for_search` opens the index read-only with mmapped vectors."""
+    if not has_faiss_index(name):
         raise FileNotFoundError("FAISS index or metadata not found")
-    index = faiss.read_index(idx_path)
-    with open(meta_path, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    return index, meta
+    idx_path = _paths(name)[0]
+    index = read_for_search(idx_path) if for_search else faiss.read_index(idx_path)
+    return index, _load_meta(name)
+
+def unindexed(transactions: Iterable[Transaction], name: str = "tx_faiss") -> List[Transaction]:
+    """The rows of `transactions` that index `name` lacks or holds with different text (reads only the
+    metadata). Everything if there is no index or it predates content hashes."""
+    rows = list(transactions)
+    if not has_faiss_index(name):
+        return rows
+    meta = _load_meta(name)
+    if "hashes" not in meta:
+        return rows
+    have = dict(zip(meta["ids"], meta["hashes"]))
+    anonymous = {h for rid, h in zip(meta["ids"], meta["hashes"]) if not rid}   # id-less rows match on text
+    out = []
+    for t in rows:
+        h = content_hash(_pack_text(t))
+        if (have.get(t.id) != h) if t.id else (h not in anonymous):
+            out.append(t)
+    return out
+
+def _resident_index(name: str = "tx_faiss"):
+    """(index, meta, labels -> positions, filter columns, float32 side vectors or None) kept in memory until
+    the files are rebuilt. Read-only: builders mutate what they load, so they use _load_index_and_meta instead."""
+    idx_path, meta_dir, legacy = _paths(name)
+    def _load():
+        index, meta = _load_index_and_meta(name, for_search=True)
+        # ID-mapped indexes return labels; older flat builds return row positions
+        lookup = label_lookup(meta)
+        fcols = FilterColumns(meta, np.asarray(meta["labels"], dtype=np.int64)) \
+            if lookup is not None and FilterColumns.supported(meta) else None
+        vecs = read_vectors(vectors_path(idx_path))
+        if vecs is not None and len(vecs) != len(meta["ids"]):
+            vecs = None   # stale side file (swapped mid-read or written by a different build)
+        return index, meta, lookup, fcols, vecs
+    return resident(("faiss_index", name),
+                    (idx_path, os.path.join(meta_dir, HEADER), legacy, vectors_path(idx_path)), _load)
 
-def semantic_search_faiss(query: str, top_k: int = 12, embed_model: str | None = None, name: str = "tx_faiss") -> List[Dict[str, str]]:
+def infer_search_filter(query: str, name: str = "tx_faiss") -> dict:
+    """Account / month range / type / status filter implied by `query`, matched against what index `name` holds."""
+    return infer_filter(query, _resident_index(name)[3])
+
+def semantic_search_faiss(query: str, top_k: int = 12, embed_model: str | None = None, name: str = "tx_faiss",
+                          search_params: dict | None = None, filters: dict | None = None) -> List[Dict[str, str]]:
+    """`search_params` overrides the runtime knobs stored with the index (nprobe for IVF, efSearch for HNSW).
+    `filters` (see vector_filter.py) restricts the search to matching rows and returns up to top_k of them;
+    indexes built before filter metadata existed ignore it."""
     embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
-    index, meta = _load_index_and_meta(name)
+    q = embed_query(query, embed_model)   # pooled client + LRU of recent queries
+    return search_vector(q, top_k, name, search_params=search_params, filters=filters)
+
+def semantic_search_faiss_batch(queries: List[str], top_k: int = 12, embed_model: str | None = None,
+                                name: str = "tx_faiss", search_params: dict | None = None,
+                                filters: dict | List[dict | None] | None = None) -> List[List[Dict[str, str]]]:
+    """semantic_search_faiss for many queries: LRU misses are embedded in batched requests and queries
+    sharing a filter go through one multi-row index.search (FAISS parallelizes across rows).
+    `filters` is one filter for every query or a list aligned with `queries`. Returns hits per query."""
+    if not queries:
+        return []
+    embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
+    Q = embed_queries(list(queries), embed_model)
+    flts = filters if isinstance(filters, list) else [filters] * len(queries)
+    groups: Dict[str, List[int]] = {}
+    for i, f in enumerate(flts):
+        groups.setdefault(json.dumps(f or None, sort_keys=True), []).append(i)
+    out: List[List[Dict[str, str]]] = [[] for _ in queries]
+    for rows in groups.values():
+        for i, docs in zip(rows, search_vectors(Q[rows], top_k, name, search_params, flts[rows[0]])):
+            out[i] = docs
+    return out
+
+def search_vector(q: np.ndarray, top_k: int = 12, name: str = "tx_faiss",
+                  search_params: dict | None = None, filters: dict | None = None) -> List[Dict[str, str]]:
+    """semantic_search_faiss for an already-embedded (normalized) query vector."""
+    return search_vectors(q.reshape(1, -1), top_k, name, search_params, filters)[0]
+
+def search_vectors(Q: np.ndarray, top_k: int = 12, name: str = "tx_faiss", search_params: dict | None = None,
+                   filters: dict | None = None) -> List[List[Dict[str, str]]]:
+    """search_vector for a [n, dim] matrix of query vectors in one index.search call; `filters` applies to every row."""
+    index, meta, lookup, fcols, vecs = _resident_index(name)
+    Q = np.ascontiguousarray(Q, dtype=np.float32)
+    # quantized indexes with rescore=R: fetch R*k candidates, re-rank them on the float32 side file
+    r = rescore_factor(meta.get("index"), search_params) if vecs is not None else 0
+    k = top_k * r if r else top_k
+    if filters and fcols is not None:
+        sel, n_allowed = fcols.selector(filters)
+        sims, idxs = search_filtered(index, Q, k, sel, n_allowed, meta.get("index"), search_params)
+    else:
+        sims, idxs = spec_search(index, Q, k, meta.get("index"), search_params)
+    if lookup is not None:
+        idxs = np.where(idxs >= 0, lookup(idxs.ravel()).reshape(idxs.shape), -1)
+    if r:
+        sims, idxs = rescore(Q, idxs, vecs, top_k)
+
+    out = []
+    for row_sims, row_idxs in zip(sims, idxs):
+        docs = []
+        for score, i in zip(row_sims, row_idxs):
+            if i < 0: continue
+            docs.append({
+                "id": meta["ids"][i],
+                "text": meta["texts"][i],
+                "merchant": meta["merchants"][i],
+                "category": meta["categories"][i],
+                "score": float(score)
+            })
+        out.append(docs)
+    return out
+
+def index_report(name: str = "tx_faiss", k: int = 10, n_queries: int = 200, seed: int = 0) -> Dict[str, float]:
+    """Size on disk and recall@k of the built index (as searched, incl. rescoring) against exact float32
+    search. Queries are a sample of the indexed vectors, read from the side file or the embedding cache."""
+    index, meta, _, _, vecs = _resident_index(name)
+    idx_path = _paths(name)[0]
+    V = vecs if vecs is not None else _embed_texts(list(meta["texts"]), meta["model"])
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(V), size=min(n_queries, len(V)), replace=False)
+    k = min(k, len(V))
+    ids = meta["ids"]
+    Q = np.asarray(V[np.sort(rows)], dtype=np.float32)
+    hits = 0
+    for q, got in zip(Q, search_vectors(Q, k, name)):
+        truth = {ids[int(i)] for i in np.argsort(-(np.asarray(V, dtype=np.float32) @ q))[:k]}
+        hits += len(truth & {d["id"] for d in got})
+    side = vectors_path(idx_path)
+    return {"rows": len(V), "dim": int(V.shape[1]), "index_bytes": os.path.getsize(idx_path),
+            "side_bytes": os.path.getsize(side) if os.path.exists(side) else 0,
+            "f32_bytes": int(len(V) * V.shape[1] * 4), f"recall@{k}": hits / (k * len(rows)) if len(rows) else 1.0}
 
-    # Embed query
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"))
-    qv = client.embeddings.create(model=embed_model, input=query).data[0].embedding
-    import numpy as np
-    q = np.array(qv, dtype="float32"); q = q/(np.linalg.norm(q)+1e-8)
-
-    sims, idxs = index.search(q.reshape(1,-1), top_k)
-    sims = sims[0]; idxs = idxs[0]
-
-    docs = []
-    for score, i in zip(sims, idxs):
-        if i < 0: continue
-        docs.append({
-            "id": meta["ids"][i],
-            "text": meta["texts"][i],
-            "merchant": meta["merchants"][i],
-            "category": meta["categories"][i],
-            "score": float(score)
-        })
-    return docs
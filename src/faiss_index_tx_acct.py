@@ -4,13 +4,22 @@ import os
 import json
 import faiss
 import numpy as np
-from typing import List, Dict, Any, Iterable, Tuple, Optional
+from typing import List, Dict, Any, Iterable, Mapping, Tuple, Optional
 
 # Embeddings: you can route via LiteLLM/OpenAI or local model.
 # Here we default to sentence-transformers BGE via sentence_transformers.
 # Install once: pip install sentence-transformers faiss-cpu
 from sentence_transformers import SentenceTransformer
 
+from .io import chunked
+from .embed_cache import cached_embed
+from .embed_client import cached_queries
+from .index_registry import resident
+from .index_spec import resolve, supports_remove, has_labels, new_index, read_for_search, rescore_factor, search as spec_search
+from .index_delta import row_labels, row_keys, content_hash, dedupe_last, plan_update
+from .meta_store import HEADER, has_meta, label_lookup, read_meta, write_meta
+from .vector_store import VectorFile, read_vectors, remove_vectors, rescore, vectors_path
+
 _DEFAULT_EMBEDDING_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-small-en-v1.5")
 _INDEX_DIR = os.getenv("FAISS_DIR", "indexes")
 
@@ -76,48 +85,130 @@ def pack_acct_text(d: Dict[str, Any]) -> str:
 
 # --------------- core FAISS I/O ---------------
 
+_META_COLUMNS = {"ids": "str", "hashes": "str", "labels": "int64"}
+
+def _paths(name: str):
+    return (os.path.join(_INDEX_DIR, f"{name}.faiss"), os.path.join(_INDEX_DIR, f"{name}.meta"),
+            os.path.join(_INDEX_DIR, f"{name}.meta.json"))   # last: pre-binary JSON meta
+
 def _save_faiss(index: faiss.Index, meta: Dict[str, Any], name: str):
     _ensure_dir(_INDEX_DIR)
-    faiss_path = os.path.join(_INDEX_DIR, f"{name}.faiss")
-    meta_path  = os.path.join(_INDEX_DIR, f"{name}.meta.json")
-    faiss.write_index(index, faiss_path)
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta, f)
-
-def _load_faiss(name: str) -> Tuple[faiss.Index, Dict[str, Any]]:
-    faiss_path = os.path.join(_INDEX_DIR, f"{name}.faiss")
-    meta_path  = os.path.join(_INDEX_DIR, f"{name}.meta.json")
-    if not (os.path.exists(faiss_path) and os.path.exists(meta_path)):
+    faiss_path, meta_dir, legacy = _paths(name)
+    # write-then-rename so concurrent readers never see a half-written file
+    faiss.write_index(index, faiss_path + ".tmp")
+    os.replace(faiss_path + ".tmp", faiss_path)
+    write_meta(meta_dir, meta, {k: v for k, v in _META_COLUMNS.items() if k in meta})
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+def _load_faiss(name: str, for_search: bool = False) -> Tuple[faiss.Index, Mapping[str, Any]]:
+    """(index, meta); meta is an mmapped MetaView, or a dict for indexes saved before the binary format."""
+    faiss_path, meta_dir, legacy = _paths(name)
+    if not has_faiss_index(name):
         raise FileNotFoundError(f"FAISS index '{name}' not found in {_INDEX_DIR}")
-    index = faiss.read_index(faiss_path)
-    with open(meta_path, "r", encoding="utf-8") as f:
+    index = read_for_search(faiss_path) if for_search else faiss.read_index(faiss_path)
+    if has_meta(meta_dir):
+        return index, read_meta(meta_dir)
+    with open(legacy, "r", encoding="utf-8") as f:
         meta = json.load(f)
     return index, meta
 
+def _resident_faiss(name: str):
+    """(index, meta, labels -> positions, float32 side vectors or None) kept in memory until a file is
+    rebuilt; treat as read-only."""
+    faiss_path, meta_dir, legacy = _paths(name)
+    def _load():
+        index, meta = _load_faiss(name, for_search=True)
+        vecs = read_vectors(vectors_path(faiss_path))
+        if vecs is not None and len(vecs) != len(meta["ids"]):
+            vecs = None
+        # ID-mapped indexes return labels; older flat builds return row positions
+        return index, meta, label_lookup(meta), vecs
+    return resident(("faiss_index_tx_acct", name),
+                    (faiss_path, os.path.join(meta_dir, HEADER), legacy, vectors_path(faiss_path)), _load)
+
 def has_faiss_index(name: str) -> bool:
-    return os.path.exists(os.path.join(_INDEX_DIR, f"{name}.faiss")) and \
-           os.path.exists(os.path.join(_INDEX_DIR, f"{name}.meta.json"))
+    faiss_path, meta_dir, legacy = _paths(name)
+    return os.path.exists(faiss_path) and (has_meta(meta_dir) or os.path.exists(legacy))
 
 # --------------- build helpers ---------------
 
 def _embed_texts(texts: List[str], model_name: str | None = None) -> np.ndarray:
-    model = _load_model(model_name or _DEFAULT_EMBEDDING_MODEL)
-    vecs = model.encode(texts, show_progress_bar=True, normalize_embeddings=True)
-    return np.asarray(vecs, dtype=np.float32)
+    name = model_name or _DEFAULT_EMBEDDING_MODEL
+
+    def _encode(missing: List[str]) -> np.ndarray:
+        vecs = _load_model(name).encode(missing, show_progress_bar=True, normalize_embeddings=True)
+        return np.asarray(vecs, dtype=np.float32)
+    return cached_embed(texts, f"st:{name}", _encode)
 
-def _build_flat_index(vectors: np.ndarray) -> faiss.Index:
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatIP(dim)          # cosine if vectors are normalized
-    index.add(vectors)
-    return index
+def _build_incremental(ids: List[str], texts: List[str], *, name: str, kind: str, fields,
+                       model_name: str | None, incremental: bool, index_spec=None) -> None:
+    """Embed only rows whose packed text changed since the previous build of `name`; drop deleted ids.
+    `index_spec` picks the index type (see index_spec.py); None keeps the previous build's spec, else flat."""
+    model = model_name or _DEFAULT_EMBEDDING_MODEL
+    keep = dedupe_last(ids)
+    if len(keep) != len(ids):
+        ids, texts = [ids[i] for i in keep], [texts[i] for i in keep]
+    hashes = [content_hash(t) for t in texts]
+    keys = row_keys(ids)
+    labels = row_labels(keys)
+
+    index: Optional[faiss.Index] = None
+    embed = list(range(len(ids)))
+    old = None
+    if incremental and has_faiss_index(name):
+        index, old = _load_faiss(name)
+    requested, spec = resolve(old, index_spec)
+    side_path = vectors_path(_paths(name)[0])
+    side = VectorFile(side_path, len(ids)) if rescore_factor(requested) else None
+    if old is not None:
+        if spec is None or old.get("model") != model or "hashes" not in old or not has_labels(index, old.get("index")):
+            index = None   # different model, index type or pre-ID-map build: start over
+        else:
+            remove, embed = plan_update(row_keys(old["ids"]), old["hashes"], keys, hashes)
+            if remove and not supports_remove(spec):
+                # cannot delete from HNSW; re-add everything (unchanged rows come from the embedding cache)
+                index, embed = None, list(range(len(ids)))
+            elif remove:
+                index.remove_ids(row_labels(remove))
+    if index is None:
+        spec = requested
+    for batch in chunked(embed):
+        vecs = _embed_texts([texts[i] for i in batch], model_name=model)
+        if index is None:
+            index, spec = new_index(spec, vecs)
+        index.add_with_ids(vecs, labels[batch])
+        if side is not None:
+            side.put(batch, vecs)
+    # float32 copy of every row for re-ranking quantized hits (see vector_store.py)
+    if side is not None:
+        old_keys = row_keys(old["ids"]) if old is not None and "ids" in old else None   # rebuilt-from-scratch rows are all put()
+        side.complete(keys, texts, old_keys, lambda xs: _embed_texts(xs, model_name=model))
+    else:
+        remove_vectors(side_path)
+
+    meta = {
+        "name": name,
+        "type": kind,
+        "model": model,
+        "ids": ids,
+        "hashes": hashes,
+        "labels": labels.tolist(),
+        "fields": fields,
+        "index": spec,
+        "index_request": requested,
+    }
+    _save_faiss(index, meta, name)
 
 # --------------- PUBLIC: build indexes ---------------
 
-def build_tx_index(rows: List[Dict[str, Any]], *, name: str = "tx_faiss",
-                   model_name: str | None = None) -> None:
+def build_tx_index(rows: Iterable[Dict[str, Any]], *, name: str = "tx_faiss",
+                   model_name: str | None = None, incremental: bool = True, index_spec=None) -> None:
     """
-    rows: list of dicts with at least keys:
+    rows: iterable of dicts (list or stream, e.g. io.iter_transaction_rows) with at least keys:
           transactionId, transactionType, transactionStatus, transactionDateTime, amount, ...
+    incremental: reuse vectors of rows whose packed text is unchanged since the last build
+    index_spec: "flat" | "ivf_flat:nlist=.." | "ivf_pq:nlist=..,m=.." | "hnsw:M=.." (None keeps the previous spec)
     """
     ids: List[str] = []
     texts: List[str] = []
@@ -132,20 +223,11 @@ def build_tx_index(rows: List[Dict[str, Any]], *, name: str = "tx_faiss",
     if not ids:
         raise ValueError("No transaction rows with IDs to index.")
 
-    vecs = _embed_texts(texts, model_name=model_name)
-    index = _build_flat_index(vecs)
-
-    meta = {
-        "name": name,
-        "type": "transactions",
-        "model": model_name or _DEFAULT_EMBEDDING_MODEL,
-        "ids": ids,
-        "fields": _TX_FIELDS,
-    }
-    _save_faiss(index, meta, name)
+    _build_incremental(ids, texts, name=name, kind="transactions", fields=_TX_FIELDS,
+                       model_name=model_name, incremental=incremental, index_spec=index_spec)
 
 def build_account_index(rows: List[Dict[str, Any]], *, name: str = "acct_faiss",
-                        model_name: str | None = None) -> None:
+                        model_name: str | None = None, incremental: bool = True, index_spec=None) -> None:
     """
     rows: list of dicts with at least keys:
           accountId and account summary fields
@@ -162,36 +244,47 @@ def build_account_index(rows: List[Dict[str, Any]], *, name: str = "acct_faiss",
     if not ids:
         raise ValueError("No account rows with IDs to index.")
 
-    vecs = _embed_texts(texts, model_name=model_name)
-    index = _build_flat_index(vecs)
-
-    meta = {
-        "name": name,
-        "type": "accounts",
-        "model": model_name or _DEFAULT_EMBEDDING_MODEL,
-        "ids": ids,
-        "fields": _ACCT_FIELDS,
-    }
-    _save_faiss(index, meta, name)
+    _build_incremental(ids, texts, name=name, kind="accounts", fields=_ACCT_FIELDS,
+                       model_name=model_name, incremental=incremental, index_spec=index_spec)
 
 # --------------- PUBLIC: search ---------------
 
-def semantic_search_faiss(query: str, *, top_k: int = 20, name: str) -> List[Dict[str, Any]]:
+def semantic_search_faiss(query: str, *, top_k: int = 20, name: str,
+                          search_params: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """
     Returns list of {id: str, score: float, rank: int}
+    search_params overrides the runtime knobs stored with the index (nprobe / efSearch)
     """
-    index, meta = _load_faiss(name)
-    model = _load_model(meta["model"])
-    qv = model.encode([query], normalize_embeddings=True)
-    qv = np.asarray(qv, dtype=np.float32)
-    scores, idxs = index.search(qv, k=min(top_k, index.ntotal))
-    scores = scores[0].tolist()
-    idxs = idxs[0].tolist()
+    return semantic_search_faiss_batch([query], top_k=top_k, name=name, search_params=search_params)[0]
+
+def semantic_search_faiss_batch(queries: List[str], *, top_k: int = 20, name: str,
+                                search_params: Optional[Dict[str, int]] = None) -> List[List[Dict[str, Any]]]:
+    """
+    semantic_search_faiss for many queries: uncached queries are encoded in one model call and all of
+    them are searched with one multi-row index.search. Returns one result list per query.
+    """
+    if not queries:
+        return []
+    index, meta, lookup, vecs = _resident_faiss(name)
+    model = meta["model"]
+    qv = cached_queries(list(queries), f"st:{model}",
+                        lambda qs: _load_model(model).encode(qs, normalize_embeddings=True))
+    r = rescore_factor(meta.get("index"), search_params) if vecs is not None else 0
+    k = min(top_k * (r or 1), index.ntotal)
+    scores, idxs = spec_search(index, qv, k, meta.get("index"), search_params)
+    if lookup is not None:
+        idxs = np.where(idxs >= 0, lookup(idxs.ravel()).reshape(idxs.shape), -1)
+    if r:
+        # quantized hits re-ranked by exact inner product on the float32 side file
+        scores, idxs = rescore(qv, idxs, vecs, min(top_k, index.ntotal))
 
     ids = meta["ids"]
-    out = []
-    for rank, (i, s) in enumerate(zip(idxs, scores), start=1):
-        if i < 0:
-            continue
-        out.append({"id": ids[i], "score": float(s), "rank": rank})
-    return out
\ No newline at end of file
+    results = []
+    for row_idxs, row_scores in zip(idxs.tolist(), scores.tolist()):
+        out = []
+        for rank, (i, s) in enumerate(zip(row_idxs, row_scores), start=1):
+            if i < 0:
+                continue
+            out.append({"id": ids[i], "score": float(s), "rank": rank})
+        results.append(out)
+    return results
@@ -0,0 +1,181 @@
+from __future__ import annotations
+import hashlib
+import heapq
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .embed_client import embed_query
+from .faiss_index import INDEX_DIR, build_faiss_index, has_faiss_index, search_vector, _pack_text
+from .index_delta import content_hash, dedupe_last
+from .index_registry import resident
+from .tx_table import month_label, month_index
+from .vector_filter import infer_filter, row_meta
+
+# Transaction index split into one FAISS index per (accountId, calendar month),
+# each a normal faiss_index build named "<name>__<account>__<YYYY-MM>". A
+# manifest (<name>.shards.json) lists every shard with its account, month, row
+# count and a digest of its (id, text hash) pairs; rebuilds skip shards whose
+# digest is unchanged, so a new posting only re-touches its own shard. Search
+# picks the shards a filter can reach from the manifest alone, loads only those
+# (through the resident registry) and fans out on a thread pool; FAISS releases
+# the GIL during search, so shards are scored in parallel and merged by score.
+
+SHARD_WORKERS = int(os.getenv("FAISS_SHARD_WORKERS", str(min(8, os.cpu_count() or 4))))
+_pool: Optional[ThreadPoolExecutor] = None
+_UNKNOWN = "unknown"
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="faiss-shard")
+    return _pool
+
+
+def manifest_path(name: str = "tx_faiss") -> str:
+    return os.path.join(INDEX_DIR, f"{name}.shards.json")
+
+
+def has_sharded_index(name: str = "tx_faiss") -> bool:
+    return os.path.exists(manifest_path(name))
+
+
+def shard_name(name: str, account: str, month: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", account or "_")
+    if safe != account:
+        safe += "-" + hashlib.blake2b(account.encode("utf-8"), digest_size=4).hexdigest()   # keep distinct ids distinct
+    return f"{name}__{safe}__{month}"
+
+
+def _digest(ids: List[str], texts: List[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for rid, text in sorted(zip(ids, (content_hash(t) for t in texts))):
+        h.update(f"{rid}\0{text}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def read_manifest(name: str = "tx_faiss") -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_manifest(name: str, manifest: Dict[str, Any]) -> str:
+    p = manifest_path(name)
+    with open(p + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(p + ".tmp", p)
+    return p
+
+
+def build_sharded_index(transactions: Iterable[Any], embed_model: str | None = None, name: str = "tx_faiss",
+                        index_spec=None, incremental: bool = True) -> str:
+    """Partition `transactions` by (accountId, month) and build/refresh one index per shard.
+    Unchanged shards are skipped, removed ones deleted; returns the manifest path."""
+    embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
+    groups: Dict[tuple, list] = {}
+    types, statuses = set(), set()
+    for t in transactions:
+        m = row_meta(t)
+        key = (m["accounts"], month_label(m["months"]) if m["months"] >= 0 else _UNKNOWN)
+        groups.setdefault(key, []).append(t)
+        types.add(m["types"]); statuses.add(m["statuses"])
+    if not groups:
+        raise ValueError("No transactions to index.")
+
+    old = (read_manifest(name) or {}) if incremental else {}
+    old_shards = old.get("shards", {}) if old.get("model") == embed_model else {}
+    shards: Dict[str, Dict[str, Any]] = {}
+    for (account, month), rows in sorted(groups.items()):
+        sname = shard_name(name, account, month)
+        # last row wins for duplicate ids, same as a monolithic build
+        rows = [rows[i] for i in dedupe_last([t.id for t in rows])]
+        digest = _digest([t.id for t in rows], [_pack_text(t) for t in rows])
+        prev = old_shards.get(sname)
+        if not (prev and prev["digest"] == digest and prev.get("index_request") == index_spec and has_faiss_index(sname)):
+            build_faiss_index(rows, embed_model=embed_model, name=sname, index_spec=index_spec, incremental=incremental)
+        shards[sname] = {"account": account, "month": month, "rows": len(rows), "digest": digest,
+                         "index_request": index_spec}
+
+    manifest = {"name": name, "model": embed_model, "shards": shards,
+                "values": {"accounts": sorted({s["account"] for s in shards.values()}),
+                           "types": sorted(types - {""}), "statuses": sorted(statuses - {""})}}
+    path = _write_manifest(name, manifest)
+    for sname in set(old.get("shards", {})) - set(shards):
+        for ext in (".index", ".index.f32.npy", ".meta.json"):
+            try:
+                os.remove(os.path.join(INDEX_DIR, sname + ext))
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(os.path.join(INDEX_DIR, sname + ".meta"), ignore_errors=True)
+    return path
+
+
+class _ManifestValues:
+    """What infer_filter needs (known values + months) without loading any shard."""
+
+    def __init__(self, manifest: Dict[str, Any]):
+        vals = manifest.get("values", {})
+        self._values = {c: [str(v).upper() for v in vals.get(c, [])] for c in ("accounts", "types", "statuses")}
+        months = [s["month"] for s in manifest["shards"].values() if s["month"] != _UNKNOWN]
+        self.months = np.array(sorted({_month_idx(m) for m in months}) or [-1], dtype=np.int32)
+
+    def values(self, col: str) -> List[str]:
+        return self._values[col]
+
+
+def _month_idx(label: str) -> int:
+    return -1 if label == _UNKNOWN else month_index(label)
+
+
+def _resident_manifest(name: str):
+    def _load():
+        manifest = read_manifest(name)
+        if manifest is None:
+            raise FileNotFoundError(manifest_path(name))
+        return manifest, _ManifestValues(manifest)
+    return resident(("faiss_shards", name), (manifest_path(name),), _load)
+
+
+def infer_sharded_filter(query: str, name: str = "tx_faiss") -> Dict[str, Any]:
+    return infer_filter(query, _resident_manifest(name)[1])
+
+
+def select_shards(manifest: Dict[str, Any], filters: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Shards a filter can reach, decided from the manifest alone."""
+    flt = filters or {}
+    acct = (flt.get("account_id") or "").upper()
+    lo, hi = flt.get("month_from"), flt.get("month_to")
+    out = []
+    for sname, s in manifest["shards"].items():
+        if acct and s["account"].upper() != acct:
+            continue
+        if lo is not None or hi is not None:
+            m = _month_idx(s["month"])
+            if m < 0 or (lo is not None and m < lo) or (hi is not None and m > hi):
+                continue
+        out.append(sname)
+    return out
+
+
+def search_sharded(query: str, top_k: int = 12, name: str = "tx_faiss", filters: Optional[Dict[str, Any]] = None,
+                   embed_model: str | None = None, search_params: dict | None = None) -> List[Dict[str, Any]]:
+    """Top-k over the shards `filters` can reach, searched in parallel and merged by score."""
+    manifest, _ = _resident_manifest(name)
+    targets = select_shards(manifest, filters)
+    if not targets:
+        return []
+    q = embed_query(query, embed_model or manifest["model"])
+    # account and month are already decided by shard choice; only type/status remain per row
+    inner = {k: v for k, v in (filters or {}).items() if k in ("types", "statuses") and v} or None
+    futures = [_executor().submit(search_vector, q, top_k, s, search_params, inner) for s in targets]
+    hits = [d for f in futures for d in f.result()]
+    return heapq.nlargest(top_k, hits, key=lambda d: d["score"])
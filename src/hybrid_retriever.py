@@ -0,0 +1,168 @@
+from __future__ import annotations
+import heapq
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .bm25_index import has_bm25_index, search_bm25
+from .faiss_index import has_faiss_index, semantic_search_faiss, infer_search_filter
+from .faiss_shards import has_sharded_index, infer_sharded_filter, search_sharded
+from .semantic_index import has_index, semantic_search
+from .tx_table import NAT, TransactionTable
+from .vector_filter import row_matches
+
+# Hybrid retrieval: semantic (FAISS), keyword (BM25) and recency rankings fused
+# with weighted reciprocal rank fusion, score(row) = sum_leg w_leg / (RRF_K + rank).
+# Everything works on integer row positions into the caller's transaction list:
+# a TransactionTable (id -> row, time index) is built once per list and extended
+# when the list grows, so a query only touches its O(k) candidates.
+
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+WEIGHTS = {
+    "semantic": float(os.getenv("HYBRID_W_SEMANTIC", "1.0")),
+    "keyword": float(os.getenv("HYBRID_W_KEYWORD", "1.0")),
+    "recency": float(os.getenv("HYBRID_W_RECENCY", "0.5")),
+}
+MAX_LISTS = 4
+
+# filter keys (vector_filter format) -> categorical table columns
+_FILTER_COLS = {"account_id": "account_id", "types": "transaction_type", "statuses": "transaction_status"}
+
+
+def _month_start(idx: int) -> int:
+    return int(np.datetime64(int(idx), "M").astype("datetime64[s]").astype(np.int64))
+
+
+def positions(table: TransactionTable, ids: Iterable[str]) -> List[int]:
+    """Row positions of `ids` in order; unknown ids are skipped."""
+    pos = (table.position(i) for i in ids)
+    return [p for p in pos if p is not None]
+
+
+def _matches(table: TransactionTable, flt: Dict[str, Any], rows: np.ndarray) -> np.ndarray:
+    m = np.ones(len(rows), dtype=bool)
+    for key, col in _FILTER_COLS.items():
+        want = flt.get(key)
+        if want:
+            m &= np.isin(table.codes[col][rows], table.code_set(col, [want] if isinstance(want, str) else want))
+    return m
+
+
+def newest(table: TransactionTable, k: int, flt: Optional[Dict[str, Any]] = None) -> List[int]:
+    """Up to k rows matching `flt`, newest first. Account and month range are binary searches over
+    the table's time index; type/status are checked on a block of rows at a time."""
+    flt = flt or {}
+    start, end = NAT, np.iinfo(np.int64).max
+    if flt.get("month_from") is not None or flt.get("month_to") is not None:
+        start = NAT + 1
+        if flt.get("month_from") is not None:
+            start = _month_start(flt["month_from"])
+        if flt.get("month_to") is not None:
+            end = _month_start(int(flt["month_to"]) + 1)
+    cand = table.rows_between(start, end, flt.get("account_id") or None)
+    rest = {key: v for key, v in flt.items() if key in ("types", "statuses") and v}
+    out: List[int] = []
+    block, hi = max(4 * k, 256), len(cand)
+    while hi > 0 and len(out) < k:
+        rows = cand[max(0, hi - block):hi][::-1]
+        out.extend((rows[_matches(table, rest, rows)] if rest else rows)[:k - len(out)].tolist())
+        hi -= block
+    return out
+
+
+_lock = threading.Lock()
+# id(list) -> (list, copy of its rows when indexed, table); the ref pins the id
+_tables: Dict[int, Tuple[Sequence[Any], List[Any], TransactionTable]] = {}
+
+
+def row_index(txns: Sequence[Any]) -> TransactionTable:
+    """Table over `txns` (row i = txns[i]), built on first use and extended when rows were appended to the list.
+    Lists are treated as append-only logs of immutable rows (as the datasets registry keeps them): a row
+    replaced in place is caught by an identity check of the indexed prefix and forces a rebuild."""
+    key = id(txns)
+    hit = _tables.get(key)
+    if hit and hit[0] is txns and len(hit[1]) == len(txns) and txns == hit[1]:
+        return hit[2]
+    with _lock:
+        hit = _tables.get(key)
+        n = len(hit[1]) if hit and hit[0] is txns else -1
+        if n == len(txns) and txns == hit[1]:
+            return hit[2]
+        if 0 <= n < len(txns) and txns[:n] == hit[1]:
+            tbl = hit[2].extend(txns[n:])
+        else:
+            tbl = TransactionTable.from_rows(txns)
+        _tables.pop(key, None)
+        _tables[key] = (txns, list(txns), tbl)
+        while len(_tables) > MAX_LISTS:
+            _tables.pop(next(iter(_tables)))
+        return tbl
+
+
+def semantic_ids(query: str, top_k: int) -> Tuple[List[str], Dict[str, Any]]:
+    """Semantic hits (sharded FAISS, monolithic FAISS, or the NPZ index) and the filter inferred
+    for the query, which the other legs reuse."""
+    flt: Dict[str, Any] = {}
+    try:
+        if has_sharded_index("tx_faiss"):
+            flt = infer_sharded_filter(query, "tx_faiss")
+            return [d["id"] for d in search_sharded(query, top_k=top_k, name="tx_faiss", filters=flt)], flt
+        if has_faiss_index("tx_faiss"):
+            flt = infer_search_filter(query, "tx_faiss")
+            return [d["id"] for d in semantic_search_faiss(query, top_k=top_k, name="tx_faiss", filters=flt)], flt
+        if has_index("tx_index"):
+            return [d["id"] for d in semantic_search(query, top_k=top_k, filename="tx_index")], flt
+    except Exception:
+        pass
+    return [], flt
+
+
+def keyword_rows(query: str, txns: Sequence[Any], top_k: int, flt: Optional[Dict[str, Any]] = None) -> List[int]:
+    """BM25 over the prebuilt inverted index; a linear term count only when none has been built."""
+    if has_bm25_index():
+        return positions(row_index(txns), (h["id"] for h in search_bm25(query, top_k=top_k, filters=flt)))
+    q = query.lower().split()
+    scored = []
+    for i, t in enumerate(txns):
+        if flt and not row_matches(flt, t):
+            continue
+        hay = f"{t.transaction_type} {t.transaction_status} {t.merchant_name} {t.currency_code} {t.account_id}".lower()
+        s = sum(hay.count(term) for term in q)
+        if s > 0:
+            scored.append((s, i))
+    return [i for _, i in heapq.nlargest(top_k, scored, key=lambda x: x[0])]
+
+
+def fuse(rankings: Dict[str, Sequence[int]], weights: Optional[Dict[str, float]] = None, top_k: int = 12,
+         k0: int = RRF_K) -> List[Tuple[int, float]]:
+    """Weighted reciprocal rank fusion of per-leg row rankings -> [(row, score)] best first."""
+    weights = WEIGHTS if weights is None else weights
+    scores: Dict[int, float] = {}
+    for leg, rows in rankings.items():
+        w = weights.get(leg, 0.0)
+        if not w:
+            continue
+        for rank, row in enumerate(rows, 1):
+            scores[row] = scores.get(row, 0.0) + w / (k0 + rank)
+    return heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+
+
+def hybrid_search(query: str, txns: Sequence[Any], top_k: int = 12, *, semantic: bool = True,
+                  weights: Optional[Dict[str, float]] = None,
+                  pins: Sequence[Tuple[int, float]] = ()) -> List[Tuple[int, float]]:
+    """Top-k rows of `txns` for `query` as [(row, score)]. `pins` are (row, score) pairs that
+    must appear and rank above the fused results (e.g. "latest posted payment")."""
+    ids, flt = semantic_ids(query, top_k) if semantic else ([], {})
+    table = row_index(txns)
+    rankings = {
+        "semantic": positions(table, ids),
+        "keyword": keyword_rows(query, txns, top_k, flt),
+        "recency": newest(table, top_k, flt),
+    }
+    pinned: Dict[int, float] = {}
+    for row, score in pins:
+        pinned[row] = max(score, pinned.get(row, score))
+    fused = [(r, s) for r, s in fuse(rankings, weights, top_k + len(pinned)) if r not in pinned]
+    return (sorted(pinned.items(), key=lambda kv: -kv[1]) + fused)[:top_k]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Row identity for incremental index builds: every row gets a stable int64
+# FAISS label derived from its id (its position, if it has none), and a
+# content hash of the packed text it was embedded from. A rebuild diffs
+# (id, hash) against the previous build and only embeds rows whose text changed.
+
+
+def row_label(row_id: str) -> int:
+    """Stable non-negative int64 label for an id (FAISS reserves -1)."""
+    h = hashlib.blake2b(str(row_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h, "little") & 0x7FFFFFFFFFFFFFFF
+
+
+def row_labels(row_ids: Sequence[str]) -> np.ndarray:
+    return np.fromiter((row_label(i) for i in row_ids), dtype=np.int64, count=len(row_ids))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def row_key(row_id: str, position: int) -> str:
+    """Row identity for labels and diffs: the id, or the row position for rows without one
+    (those are never merged with each other)."""
+    return row_id or f"\0{position}"
+
+
+def row_keys(ids: Sequence[str]) -> List[str]:
+    return [row_key(rid, i) for i, rid in enumerate(ids)]
+
+
+def dedupe_last(ids: List[str]) -> List[int]:
+    """Positions to keep so every id appears once (last occurrence wins); rows without an id are all kept."""
+    last: Dict[str, int] = {}
+    for i, rid in enumerate(row_keys(ids)):
+        last[rid] = i
+    return sorted(last.values()) if len(last) != len(ids) else list(range(len(ids)))
+
+
+def plan_update(old_ids: Sequence[str], old_hashes: Sequence[str],
+                new_ids: Sequence[str], new_hashes: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """-> (ids to remove from the index, positions in new_* to embed and add)."""
+    old = dict(zip(old_ids, old_hashes))
+    new = dict(zip(new_ids, new_hashes))
+    remove = [rid for rid, h in old.items() if new.get(rid) != h]
+    embed = [i for i, (rid, h) in enumerate(zip(new_ids, new_hashes)) if old.get(rid) != h]
+    return remove, embed
+
+
+def label_positions(labels: Sequence[int]) -> Dict[int, int]:
+    return {int(l): i for i, l in enumerate(labels)}
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import itertools
+import os
+import threading
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from .io import file_version
+
+# Resident registry for loaded search indexes. Each entry is keyed by
+# (module, name) and versioned by the (mtime, size) of the files it was read
+# from, so a rebuild on disk is picked up on the next query. Values are
+# immutable once published: a reload builds a new value and swaps the dict
+# entry, so in-flight searches keep the object they started with and readers
+# never wait on a reload when a previous version is available.
+
+MAX_ENTRIES = int(os.getenv("INDEX_REGISTRY_MAX", "256"))   # sharded indexes: bound to the active working set
+
+_lock = threading.Lock()
+_tick = itertools.count()
+_used: Dict[Tuple[str, str], int] = {}
+_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_entries: Dict[Tuple[str, str], Tuple[Tuple[str, ...], Any]] = {}   # key -> (version, value)
+
+
+def _key_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _version(paths: Sequence[str]) -> Tuple[str, ...]:
+    return tuple(file_version(p) for p in paths)
+
+
+def resident(key: Tuple[str, str], paths: Sequence[str], load: Callable[[], Any]) -> Any:
+    """Return load() for the current version of `paths`, reloading only after the files change."""
+    version = _version(paths)
+    hit = _entries.get(key)
+    _used[key] = next(_tick)
+    if hit and hit[0] == version:
+        return hit[1]
+    lock = _key_lock(key)
+    if hit and not lock.acquire(blocking=False):
+        return hit[1]   # another thread is reloading; serve the previous version meanwhile
+    if not hit:
+        lock.acquire()
+    try:
+        hit = _entries.get(key)
+        version = _version(paths)
+        if hit and hit[0] == version:
+            return hit[1]
+        for _ in range(3):
+            value = load()
+            after = _version(paths)
+            if after == version:
+                break
+            version = after   # files were swapped mid-read (e.g. index replaced before meta); read again
+        _entries[key] = (version, value)
+        if len(_entries) > MAX_ENTRIES:
+            _evict_lru(keep=key)
+        return value
+    finally:
+        lock.release()
+
+
+def _evict_lru(keep: Tuple[str, str]) -> None:
+    with _lock:
+        cold = sorted((k for k in list(_entries) if k != keep), key=lambda k: _used.get(k, -1))
+        for k in cold[:len(_entries) - MAX_ENTRIES]:
+            _entries.pop(k, None)
+            _used.pop(k, None)
+
+
+def evict(key: Tuple[str, str]) -> None:
+    _entries.pop(key, None)
+
+
+def clear() -> None:
+    _entries.clear()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import faiss
+
+from .vector_store import rescore
+
+# Index specs for the FAISS builders. A spec is a small dict persisted in the
+# index meta under "index" so search knows which runtime knobs apply:
+#
+#   flat                              exact inner product (default)
+#   ivf_flat:nlist=1024,nprobe=16     inverted lists, exact vectors
+#   ivf_pq:nlist=1024,m=64,nbits=8    inverted lists, product-quantized vectors
+#   hnsw:M=32,efConstruction=200,efSearch=64
+#
+# flat / ivf_flat / hnsw take storage=f32|fp16|sq8 (scalar-quantized codes, 2x /
+# 4x smaller) and every kind takes rescore=R: search fetches R*k candidates and
+# re-ranks them against a float32 side file (see vector_store.py).
+#
+# pca=D (PCA learned on the training sample) or truncate=D (keep the first D
+# dims, Matryoshka-style) reduce vectors before indexing; either way the output
+# is re-normalized. The projection is an IndexPreTransform stored inside the
+# index file, so every query vector goes through it at search time too.
+#
+# Rows keep their id-derived labels: IVF lists store them natively, every other
+# kind is wrapped in IndexIDMap2. (IndexIDMap2.remove_ids compacts its id map
+# but not the positions held in IVF lists, so IVF must not be wrapped.)
+# IVF and SQ8 variants are trained on the first embedded chunk; nlist/nbits are
+# clamped to what that sample can support and the effective values are stored.
+
+KINDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+IVF_KINDS = ("ivf_flat", "ivf_pq")
+_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "flat": {"storage": "f32", "rescore": 0, "pca": 0, "truncate": 0},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16, "storage": "f32", "rescore": 0, "pca": 0, "truncate": 0},
+    "ivf_pq": {"nlist": 1024, "m": 64, "nbits": 8, "nprobe": 16, "rescore": 0, "pca": 0, "truncate": 0},
+    "hnsw": {"M": 32, "efConstruction": 200, "efSearch": 64, "storage": "f32", "rescore": 0, "pca": 0, "truncate": 0},
+}
+_RUNTIME = ("nprobe", "efSearch", "rescore")
+STORAGE = {"f32": None, "fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def parse_spec(spec: Any = None) -> Dict[str, Any]:
+    """"ivf_pq:nlist=256,m=32" | {"kind": "hnsw", "M": 16} | None -> full spec dict with defaults filled in."""
+    if spec is None or spec == "":
+        spec = "flat"
+    if isinstance(spec, str):
+        kind, _, args = spec.strip().partition(":")
+        out: Dict[str, Any] = {"kind": kind.strip().lower()}
+        for part in filter(None, (a.strip() for a in args.split(","))):
+            k, sep, v = part.partition("=")
+            if not sep:
+                raise ValueError(f"bad index spec parameter {part!r} (expected key=value)")
+            out[k.strip()] = v.strip().lower() if k.strip() == "storage" else int(v)
+    else:
+        out = dict(spec)
+        out["kind"] = str(out.get("kind", "flat")).lower()
+    if out["kind"] not in KINDS:
+        raise ValueError(f"unknown index kind {out['kind']!r}; expected one of {', '.join(KINDS)}")
+    unknown = set(out) - {"kind"} - set(_DEFAULTS[out["kind"]])
+    if unknown:
+        raise ValueError(f"unknown parameters for {out['kind']}: {', '.join(sorted(unknown))}")
+    if out.get("storage", "f32") not in STORAGE:
+        raise ValueError(f"unknown storage {out['storage']!r}; expected one of {', '.join(STORAGE)}")
+    if out.get("pca") and out.get("truncate"):
+        raise ValueError("pca and truncate are mutually exclusive")
+    return {"kind": out["kind"], **_DEFAULTS[out["kind"]], **out}
+
+
+def same_structure(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """True if two specs build the same index (runtime-only knobs may differ)."""
+    strip = lambda s: {k: v for k, v in s.items() if k not in _RUNTIME}
+    return strip(parse_spec(a)) == strip(parse_spec(b))
+
+
+def resolve(old_meta: Optional[Dict[str, Any]], index_spec: Any = None) -> tuple:
+    """-> (requested spec, spec to keep building the existing index with, or None if it must be rebuilt).
+    `index_spec` None means "whatever the previous build asked for" (flat if there was none); runtime
+    knobs can change without a rebuild."""
+    old_eff = (old_meta or {}).get("index") or {"kind": "flat"}
+    old_req = (old_meta or {}).get("index_request") or old_eff
+    req = parse_spec(index_spec if index_spec is not None else old_req)
+    if old_meta is None or not same_structure(old_req, req):
+        return req, None
+    return req, {**old_eff, **{k: req[k] for k in _RUNTIME if k in req}}
+
+
+def supports_remove(spec: Dict[str, Any]) -> bool:
+    return spec["kind"] != "hnsw"   # HNSW graphs cannot drop nodes; changed rows force a rebuild
+
+
+def has_labels(index, spec: Optional[Dict[str, Any]]) -> bool:
+    """True if `index` maps rows to labels the way new_index builds `spec` (the stored effective spec).
+    Older builds wrapped IVF in IndexIDMap2 and pre-ID-map builds had no labels: both must be rebuilt."""
+    if (spec or {}).get("kind") in IVF_KINDS:
+        return not isinstance(index, faiss.IndexIDMap)
+    return isinstance(index, faiss.IndexIDMap2)
+
+
+def rescore_factor(spec: Optional[Dict[str, Any]], overrides: Optional[Dict[str, int]] = None) -> int:
+    return int({**(spec or {}), **(overrides or {})}.get("rescore") or 0)
+
+
+def new_index(spec: Dict[str, Any], sample: np.ndarray) -> tuple:
+    """Create (and train, for IVF/SQ8/PCA) an empty index for `spec` that takes add_with_ids labels;
+    returns (index, effective spec)."""
+    d_in, n = sample.shape[1], sample.shape[0]
+    spec = dict(spec)
+    kind = spec["kind"]
+    # PCA needs at least as many sample rows as output dims; a target >= the input dim means no reduction
+    if spec.get("pca"):
+        spec["pca"] = min(spec["pca"], n) if spec["pca"] < d_in else 0
+    if spec.get("truncate"):
+        spec["truncate"] = spec["truncate"] if spec["truncate"] < d_in else 0
+    dim = spec.get("pca") or spec.get("truncate") or d_in
+    ip = faiss.METRIC_INNER_PRODUCT
+    qtype = STORAGE[spec.get("storage", "f32")]
+    if kind == "flat":
+        inner = faiss.IndexFlatIP(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype, ip)
+    elif kind == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, spec["M"], ip) if qtype is None else faiss.IndexHNSWSQ(dim, qtype, spec["M"], ip)
+        inner.hnsw.efConstruction = spec["efConstruction"]
+    else:
+        # k-means wants ~39 points per list; fewer lists than that trains badly or not at all
+        spec["nlist"] = max(1, min(spec["nlist"], n // 39 or 1))
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            inner = faiss.IndexIVFFlat(quantizer, dim, spec["nlist"], ip) if qtype is None \
+                else faiss.IndexIVFScalarQuantizer(quantizer, dim, spec["nlist"], qtype, ip)
+        else:
+            if dim % spec["m"]:
+                raise ValueError(f"ivf_pq: m={spec['m']} must divide the embedding dimension {dim}")
+            # each PQ sub-quantizer is a k-means with 2**nbits centroids: same ~39 points per centroid
+            spec["nbits"] = max(1, min(spec["nbits"], int(np.log2(max(n // 39, 2)))))
+            inner = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["m"], spec["nbits"], ip)
+        spec["nprobe"] = min(spec["nprobe"], spec["nlist"])
+    if dim != d_in:
+        inner = faiss.IndexPreTransform(faiss.NormalizationTransform(dim, 2.0), inner)
+        inner.prepend_transform(faiss.PCAMatrix(d_in, dim) if spec.get("pca")
+                                else faiss.RemapDimensionsTransform(d_in, dim, False))
+    if not inner.is_trained:
+        # SQ8 learns per-dimension ranges from the sample (values outside it are clamped), PCA its projection
+        inner.train(np.ascontiguousarray(sample, dtype=np.float32))
+    return (inner if kind in IVF_KINDS else faiss.IndexIDMap2(inner)), spec
+
+
+def read_for_search(path: str):
+    """Open an index read-only with its vectors mmapped in place (flat codes, IVF lists), so opening
+    costs no copy of the vector data and the page cache is shared across processes."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except (AttributeError, RuntimeError):
+        return faiss.read_index(path)
+
+
+def search_params(spec: Optional[Dict[str, Any]], overrides: Optional[Dict[str, int]] = None, sel=None):
+    """faiss SearchParameters for the spec stored in an index's meta (None for unfiltered flat / legacy metas)."""
+    spec = {**(spec or {}), **(overrides or {})}
+    kind = spec.get("kind", "flat")
+    kw = {"sel": sel} if sel is not None else {}
+    if kind in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(nprobe=int(spec.get("nprobe", 1)), **kw)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=int(spec.get("efSearch", 16)), **kw)
+    return faiss.SearchParameters(**kw) if kw else None
+
+
+def search(index, q: np.ndarray, k: int, spec: Optional[Dict[str, Any]] = None,
+           overrides: Optional[Dict[str, int]] = None):
+    params = search_params(spec, overrides)
+    if params is None:
+        return index.search(q, k)
+    return index.search(q, k, params=params)
+
+
+def search_filtered(index, q: np.ndarray, k: int, sel, n_allowed: int, spec: Optional[Dict[str, Any]] = None,
+                    overrides: Optional[Dict[str, int]] = None):
+    """Search only rows accepted by `sel`. Returns min(k, n_allowed) hits: flat is exact, IVF/HNSW widen
+    nprobe/efSearch until enough filtered rows are reached (a selective filter can empty the probed lists)."""
+    spec = {**(spec or {"kind": "flat"}), **(overrides or {})}
+    want = min(k, n_allowed)
+    if want <= 0:
+        return np.zeros((len(q), 0), dtype=np.float32), np.zeros((len(q), 0), dtype=np.int64)
+    knob, limit = {"ivf_flat": ("nprobe", spec.get("nlist", 1)), "ivf_pq": ("nprobe", spec.get("nlist", 1)),
+                   "hnsw": ("efSearch", max(index.ntotal, 1))}.get(spec["kind"], (None, None))
+    while True:
+        D, I = index.search(q, want, params=search_params(spec, None, sel))
+        if knob is None or (I >= 0).sum(axis=1).min() >= want or spec[knob] >= limit:
+            return D, I
+        spec[knob] = min(max(spec[knob] * 4, want), limit)
+
+
+def recall_at_k(vectors: np.ndarray, spec: Any, k: int = 10, n_queries: int = 200, seed: int = 0,
+                overrides: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Build `spec` over `vectors` and compare its top-k against exact flat search (with rescore=R the
+    candidates are re-ranked against `vectors`, as search does with the side file). Queries are a random
+    sample of the vectors themselves. Returns recall@k, per-query latency and index bytes."""
+    X = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(len(X), size=min(n_queries, len(X)), replace=False)]
+    labels = np.arange(len(X), dtype=np.int64)
+    k = min(k, len(X))
+
+    flat = faiss.IndexFlatIP(X.shape[1])
+    flat.add(X)
+    t0 = time.perf_counter()
+    _, truth = flat.search(Q, k)
+    flat_ms = (time.perf_counter() - t0) * 1000 / len(Q)
+
+    t0 = time.perf_counter()
+    index, eff = new_index(parse_spec(spec), X)
+    index.add_with_ids(X, labels)
+    build_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    r = rescore_factor(eff, overrides)
+    _, got = search(index, Q, k * r if r else k, eff, overrides)
+    if r:
+        _, got = rescore(Q, got, X, k)
+    ms = (time.perf_counter() - t0) * 1000 / len(Q)
+
+    hits = sum(len(set(a) & set(b)) for a, b in zip(truth.tolist(), got.tolist()))
+    return {"spec": {**eff, **(overrides or {})}, "k": k, "queries": len(Q), f"recall@{k}": hits / (k * len(Q)),
+            "ms_per_query": ms, "flat_ms_per_query": flat_ms, "build_s": build_s,
+            "index_bytes": int(faiss.serialize_index(index).size), "f32_bytes": int(X.nbytes)}
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List
+
+from . import datasets
+from .io import delta_path, iter_delta_rows, read_delta_header, resolve_path, file_version
+from .models import Transaction, as_transaction
+from .snapshot import delta_watermark, read_manifest, snapshot_dir, write_snapshot
+
+# Append-only ingestion. New postings go to data/<name>.delta.jsonl (header line
+# ties the log to the base file version), are folded into the registry's cached
+# store in place, and are queued for embedding. compact() folds the log into the
+# mmap snapshot so cold starts do not replay it. The embedding queue lives in
+# memory; after a restart the first drain re-queues logged rows the index lacks.
+
+COMPACT_INTERVAL_S = float(os.getenv("TX_COMPACT_INTERVAL_S", "60"))
+COMPACT_MIN_BYTES = int(os.getenv("TX_COMPACT_MIN_BYTES", str(8 << 20)))
+
+_pending_lock = threading.Lock()
+_pending: Dict[str, List[Transaction]] = {}
+_recovered: set = set()   # paths whose log was checked against the index in this process
+
+
+def _row_json(t: Transaction) -> str:
+    return json.dumps(t.model_dump(by_alias=True, exclude_none=True), separators=(",", ":"))
+
+
+def _write_delta(p: str, txns: List[Transaction]) -> None:
+    dp = delta_path(p)
+    lines = [_row_json(t) for t in txns]
+    if read_delta_header(p) is None:
+        if os.path.exists(dp):
+            # log was written against an older base export; keep it aside, start fresh
+            os.replace(dp, f"{dp}.stale-{int(time.time())}")
+        lines.insert(0, json.dumps({"base_version": file_version(p), "log_id": uuid.uuid4().hex}))
+    with open(dp, "ab+") as f:
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")  # close a torn line left by an interrupted append
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_transactions(rows: Iterable[Any], path: str = "transactions.json") -> int:
+    """Durably append `rows` (dicts, Transaction or TransactionRecord) and make them visible to cached stores immediately."""
+    txns = [as_transaction(r) for r in rows]
+    if not txns:
+        return 0
+    datasets.append_rows(path, txns, lambda p: _write_delta(p, txns))
+    with _pending_lock:
+        _pending.setdefault(resolve_path(path), []).extend(txns)
+    return len(txns)
+
+
+def _unindexed_log_rows(p: str, name: str) -> List[Transaction]:
+    """Logged rows that index `name` lacks, e.g. queued by a process that exited before indexing them."""
+    from .faiss_index import has_faiss_index, unindexed
+    if not has_faiss_index(name):
+        return []   # nothing to catch up: the first full build embeds the whole store
+    return unindexed((as_transaction(r) for r in iter_delta_rows(p)), name)
+
+
+def pending_embeddings(path: str = "transactions.json", name: str = "tx_faiss") -> List[Transaction]:
+    """Drain rows appended since the last call that still need embedding. The first call for a path
+    also picks up logged rows missing from index `name`, so the queue survives a restart."""
+    p = resolve_path(path)
+    recovered = [] if p in _recovered else _unindexed_log_rows(p, name)
+    with _pending_lock:
+        _recovered.add(p)
+        queued = _pending.pop(p, [])
+    if recovered:
+        # rows queued by this process are in the log too; keep the queued copy
+        ids = {t.id for t in queued}
+        anon = {_row_json(t) for t in queued if not t.id}
+        recovered = [t for t in recovered if (t.id not in ids if t.id else _row_json(t) not in anon)]
+    return recovered + queued
+
+
+def index_pending(path: str = "transactions.json", name: str = "tx_faiss") -> int:
+    """Embed only the queued rows and add them to the FAISS index (and the BM25 keyword index, if built)."""
+    from .faiss_index import add_to_faiss_index
+    from .bm25_index import add_to_bm25_index, has_bm25_index
+    rows = pending_embeddings(path, name)
+    if not rows:
+        return 0
+    try:
+        if has_bm25_index():
+            add_to_bm25_index(rows)   # upsert: a retry after a FAISS failure re-adds nothing
+        add_to_faiss_index(rows, name=name)
+    except Exception:
+        with _pending_lock:
+            _pending.setdefault(resolve_path(path), [])[:0] = rows
+        raise
+    return len(rows)
+
+
+def compact(path: str = "transactions.json") -> str:
+    """Write the current store (base + deltas) as the snapshot, recording how much of the log it covers."""
+    p = resolve_path(path)
+    with datasets.locked(p):
+        tbl = datasets.get_table(p)
+        delta = delta_watermark(p)
+        version = file_version(p)
+    return write_snapshot(tbl, snapshot_dir(p), source=p, source_version=version, delta=delta)
+
+
+def uncompacted_bytes(path: str = "transactions.json") -> int:
+    p = resolve_path(path)
+    delta = delta_watermark(p)
+    if delta is None:
+        return 0
+    merged = (read_manifest(snapshot_dir(p)) or {}).get("delta") or {}
+    if merged.get("log_id") != delta["log_id"]:
+        return delta["bytes"]
+    return delta["bytes"] - merged.get("bytes", 0)
+
+
+def start_compactor(path: str = "transactions.json", interval_s: float = COMPACT_INTERVAL_S,
+                    min_bytes: int = COMPACT_MIN_BYTES) -> threading.Event:
+    """Background thread that compacts once the unmerged log exceeds `min_bytes`; set the returned event to stop it."""
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval_s):
+            try:
+                if uncompacted_bytes(path) >= min_bytes:
+                    compact(path)
+            except Exception:
+                pass  # retry on the next tick
+
+    threading.Thread(target=_loop, name="tx-compactor", daemon=True).start()
+    return stop
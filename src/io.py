@@ -1,17 +1,183 @@
 import json, os
-from typing import List
-from .models import Transaction, AccountSummary
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List
+from .models import Transaction, AccountSummary, decode_transaction
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-def load_transactions(path: str = "transactions.json") -> List[Transaction]:
-    p = path if os.path.isabs(path) else os.path.join(DATA_DIR, path)
+
+def resolve_path(path: str) -> str:
+    # absolute or cwd-relative paths win; bare names resolve under data/
+    p = path if os.path.isabs(path) or os.path.exists(path) else os.path.join(DATA_DIR, path)
+    return os.path.abspath(p)
+
+def file_version(path: str) -> str:
+    """(mtime, size) token for a resolved path; 'missing' if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+CHUNK_ROWS = int(os.getenv("TX_CHUNK_ROWS", "50000"))
+# Rows from our own ETL are trusted and decoded into slotted records; set
+# TX_STRICT_VALIDATION=true to run full pydantic validation instead.
+STRICT_VALIDATION = os.getenv("TX_STRICT_VALIDATION", "false").lower() == "true"
+_READ_BYTES = 1 << 20
+_DELIMS = " \t\r\n,:]}"
+
+def chunked(items: Iterable[Any], size: int = CHUNK_ROWS) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+class _JsonStream:
+    """Incremental reader over a text file: decodes one JSON value at a time from a bounded buffer."""
+    _dec = json.JSONDecoder()
+
+    def __init__(self, f):
+        self.f, self.buf, self.pos, self.eof = f, "", 0, False
+
+    def _fill(self) -> bool:
+        more = "" if self.eof else self.f.read(_READ_BYTES)
+        self.eof = not more
+        self.buf = self.buf[self.pos:] + more
+        self.pos = 0
+        return bool(more)
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                v, end = self._dec.raw_decode(self.buf, self.pos)
+                # a number cut by the buffer edge still decodes ("12" of "123", "1" of "1.5"),
+                # so only accept it once the next character is a delimiter
+                if self.eof or (end < len(self.buf) and self.buf[end] in _DELIMS):
+                    self.pos = end
+                    return v
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def array_items(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+def iter_transaction_rows(path: str = "transactions.json") -> Iterator[Dict[str, Any]]:
+    """Stream raw rows from a JSON array, a {"transactions": [...]} envelope, or JSONL,
+    without materializing the whole document."""
+    p = resolve_path(path)
     if not os.path.exists(p): raise FileNotFoundError(p)
     with open(p, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    items = data["transactions"] if isinstance(data, dict) and "transactions" in data else data
-    return [Transaction(**t) for t in items]
+        if p.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        js = _JsonStream(f)
+        if js.peek() == "[":
+            yield from js.array_items()
+            if js.peek():
+                raise ValueError(f"unexpected content at offset {js.pos} in {p}")
+            return
+        # envelope or concatenated objects (JSONL without the extension)
+        while js.peek() == "{":
+            js.expect("{")
+            obj, streamed = {}, False
+            while js.peek() != "}":
+                key = js.value()
+                js.expect(":")
+                if key == "transactions" and js.peek() == "[":
+                    yield from js.array_items()
+                    streamed = True
+                else:
+                    obj[key] = js.value()
+                if js.peek() == ",":
+                    js.pos += 1
+            js.expect("}")
+            if not streamed:
+                yield obj
+        if js.peek():
+            raise ValueError(f"unexpected content at offset {js.pos} in {p}")
+
+def delta_path(path: str = "transactions.json") -> str:
+    """Append-only log next to the base file: data/transactions.json -> data/transactions.delta.jsonl"""
+    return os.path.splitext(resolve_path(path))[0] + ".delta.jsonl"
+
+def read_delta_header(path: str = "transactions.json") -> Dict[str, Any] | None:
+    """Header of the delta log if it belongs to the current base file version, else None."""
+    try:
+        with open(delta_path(path), "rb") as f:
+            header = json.loads(f.readline() or b"{}")
+    except (FileNotFoundError, ValueError):
+        return None
+    return header if header.get("base_version") == file_version(resolve_path(path)) else None
+
+def iter_delta_rows(path: str = "transactions.json", start: int = 0, stop: int | None = None) -> Iterator[Dict[str, Any]]:
+    """Rows appended after the base file was written (see ingest.append_transactions).
+    `start`/`stop` are byte offsets into the log; a log written against an older base is ignored."""
+    if read_delta_header(path) is None:
+        return
+    with open(delta_path(path), "rb") as f:
+        header = f.readline()
+        f.seek(max(start, len(header)))
+        for line in f:
+            if stop is not None and f.tell() > stop:
+                return
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # torn line from an interrupted append
+
+def decode_chunks(rows: Iterable[Dict[str, Any]], chunk_size: int = CHUNK_ROWS,
+                  strict: bool | None = None) -> Iterator[List[Transaction]]:
+    strict = STRICT_VALIDATION if strict is None else strict
+    for batch in chunked(rows, chunk_size):
+        yield [decode_transaction(t, strict) for t in batch]
+
+def iter_transaction_chunks(path: str = "transactions.json", chunk_size: int = CHUNK_ROWS,
+                            with_delta: bool = True, strict: bool | None = None) -> Iterator[List[Transaction]]:
+    """Decoded rows (base file, then the delta log) in chunks of `chunk_size`;
+    peak memory is one chunk plus the read buffer."""
+    rows = iter_transaction_rows(path)
+    if with_delta:
+        rows = chain(rows, iter_delta_rows(path))
+    return decode_chunks(rows, chunk_size, strict)
+
+def load_transactions(path: str = "transactions.json", strict: bool | None = None) -> List[Transaction]:
+    out: List[Transaction] = []
+    for batch in iter_transaction_chunks(path, strict=strict):
+        out.extend(batch)
+    return out
 
 def load_account_summaries(path: str) -> list[AccountSummary]:
+    path = resolve_path(path)
     if not os.path.exists(path):
         return []
     with open(path, "r", encoding="utf-8") as f:
@@ -0,0 +1,205 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .index_delta import label_positions
+
+# Binary, memory-mapped index metadata. A meta directory (<name>.meta/) holds
+#   header.json           scalar fields + column schema + categorical vocabularies
+#   <col>.offsets.npy     int64 [n+1] and <col>.blob.npy uint8: string columns
+#   <col>.codes.npy       int32 codes into the header vocab (-1 = empty): categoricals
+#   <col>.npy             numeric columns (labels, months, ...)
+#   labels_sorted.npy     sorted labels + label_order.npy (their rows): label -> row by binary search
+# Opening one parses only the header and mmaps the arrays, so load time and
+# resident memory do not grow with the row count; rows are decoded on access.
+
+FORMAT_VERSION = 1
+HEADER = "header.json"
+
+
+class StrColumn(Sequence):
+    """Read-only string column over an offsets array and a UTF-8 blob."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets, self.blob = offsets, blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        data = self.blob.tobytes() if len(self.blob) else b""
+        off = self.offsets.tolist()
+        for a, b in zip(off, off[1:]):
+            yield data[a:b].decode("utf-8")
+
+
+class CatColumn(Sequence):
+    """Read-only dictionary-encoded column; exposes `codes` / `vocab` for vectorized filters."""
+
+    def __init__(self, codes: np.ndarray, vocab: List[str]):
+        self.codes, self.vocab = codes, vocab
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        c = int(self.codes[i])
+        return self.vocab[c] if c >= 0 else ""
+
+    def __iter__(self) -> Iterator[str]:
+        vocab = self.vocab
+        for c in self.codes.tolist():
+            yield vocab[c] if c >= 0 else ""
+
+
+class MetaView(Mapping):
+    """dict-like view of a meta directory: scalars from the header, columns mmapped lazily."""
+
+    def __init__(self, meta_dir: str):
+        self.dir = meta_dir
+        with open(os.path.join(meta_dir, HEADER), "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("format") != FORMAT_VERSION:
+            raise FileNotFoundError(f"unsupported meta format in {meta_dir}")
+        self._cols: Dict[str, Any] = {}
+        self._order: Optional[np.ndarray] = None
+
+    def _npy(self, fname: str) -> np.ndarray:
+        path = os.path.join(self.dir, fname)
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            return np.load(path)   # zero-length arrays cannot be mmapped
+
+    def _column(self, key: str):
+        col = self._cols.get(key)
+        if col is None:
+            kind = self.header["columns"][key]
+            if kind == "str":
+                col = StrColumn(self._npy(f"{key}.offsets.npy"), self._npy(f"{key}.blob.npy"))
+            elif kind == "cat":
+                col = CatColumn(self._npy(f"{key}.codes.npy"), self.header["vocab"][key])
+            else:
+                col = self._npy(f"{key}.npy")
+            self._cols[key] = col
+        return col
+
+    def __getitem__(self, key: str):
+        if key in self.header["columns"]:
+            return self._column(key)
+        return self.header["scalars"][key]
+
+    def __iter__(self):
+        yield from self.header["scalars"]
+        yield from self.header["columns"]
+
+    def __len__(self) -> int:
+        return len(self.header["scalars"]) + len(self.header["columns"])
+
+    def positions(self, labels: np.ndarray) -> np.ndarray:
+        """Row positions of FAISS labels (-1 where unknown), by binary search over the stored label order."""
+        if self._order is None:
+            self._sorted, self._order = self._npy("labels_sorted.npy"), self._npy("label_order.npy")
+        labels = np.asarray(labels, dtype=np.int64)
+        if not len(self._sorted):
+            return np.full(len(labels), -1, dtype=np.int64)
+        # searchsorted on the mmap touches O(log n) pages per label
+        j = np.clip(np.searchsorted(self._sorted, labels), 0, len(self._sorted) - 1)
+        return np.where(self._sorted[j] == labels, self._order[j], -1)
+
+
+def _encode_cat(values: Sequence[Any]):
+    lookup: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            codes[i] = -1
+        else:
+            codes[i] = lookup.setdefault(v, len(lookup))
+    return codes, list(lookup)
+
+
+def _encode_str(values: Sequence[Any]):
+    raw = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(raw) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in raw], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(raw), dtype=np.uint8)
+
+
+def write_meta(meta_dir: str, meta: Mapping[str, Any], columns: Mapping[str, str]) -> str:
+    """Write `meta` as a meta directory. `columns` maps per-row keys to a kind: "str", "cat",
+    "int64" or "int32"; every other key is stored as a scalar in the header. The directory is
+    swapped in only once complete."""
+    tmp = f"{meta_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    vocab: Dict[str, List[str]] = {}
+    for key, kind in columns.items():
+        values = meta[key]
+        if kind == "str":
+            offsets, blob = _encode_str(values)
+            np.save(os.path.join(tmp, f"{key}.offsets.npy"), offsets)
+            np.save(os.path.join(tmp, f"{key}.blob.npy"), blob)
+        elif kind == "cat":
+            codes, vocab[key] = _encode_cat(values)
+            np.save(os.path.join(tmp, f"{key}.codes.npy"), codes)
+        else:
+            np.save(os.path.join(tmp, f"{key}.npy"), np.asarray(values, dtype=kind))
+    if "labels" in columns:
+        labels = np.asarray(meta["labels"], dtype=np.int64)
+        order = np.argsort(labels, kind="stable")
+        np.save(os.path.join(tmp, "label_order.npy"), order)
+        np.save(os.path.join(tmp, "labels_sorted.npy"), labels[order])
+    header = {"format": FORMAT_VERSION, "rows": len(meta[next(iter(columns))]) if columns else 0,
+              "columns": dict(columns), "vocab": vocab,
+              "scalars": {k: v for k, v in meta.items() if k not in columns}}
+    with open(os.path.join(tmp, HEADER), "w", encoding="utf-8") as f:
+        json.dump(header, f)
+
+    old = f"{meta_dir}.old-{os.getpid()}"
+    if os.path.exists(meta_dir):
+        os.replace(meta_dir, old)
+    os.replace(tmp, meta_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta_dir
+
+
+def has_meta(meta_dir: str) -> bool:
+    return os.path.exists(os.path.join(meta_dir, HEADER))
+
+
+def read_meta(meta_dir: str) -> MetaView:
+    return MetaView(meta_dir)
+
+
+def label_lookup(meta: Mapping[str, Any]):
+    """labels -> row positions (-1 if unknown) for a binary or legacy JSON meta; None when
+    the index predates ID mapping and FAISS already returns row positions."""
+    if isinstance(meta, MetaView):
+        return meta.positions if "labels" in meta.header["columns"] else None
+    if "labels" not in meta:
+        return None
+    pos = label_positions(meta["labels"])
+    return lambda labels: np.fromiter((pos.get(int(l), -1) for l in labels), dtype=np.int64, count=len(labels))
+
+
+def materialize(meta: Mapping[str, Any]) -> Dict[str, Any]:
+    """Plain dict of lists (for builders that append/replace rows in place)."""
+    out = {}
+    for k, v in meta.items():
+        out[k] = v.tolist() if isinstance(v, np.ndarray) else list(v) if isinstance(v, (StrColumn, CatColumn)) else v
+    return out
@@ -11,6 +11,8 @@ Totals policy:
 - For “total credited / total deposits / sum of credits”, call tool `sum_credits` (optionally pass month='YYYY-MM').
 - For “total debited / total spends / sum of debits”, call tool `sum_debits` (optionally pass month='YYYY-MM').
 - Do NOT add amounts manually; rely on tools for totals. Return JSON {answer, reasoning, sources}.
+- Largest/highest single transactions → `top_transactions`; last/latest N → `latest_transactions`;
+  top merchants by spend or visits → `merchant_ranking`. Do not rank rows from the context yourself.
 """
 
 
@@ -18,9 +20,11 @@ BALANCE_RULES = """
 Balance policy:
 When asked about 'current balance', 'ending balance', 'account balance' or 'balance in a specific month':
 1. Always use the `endingBalance` field from the most recent POSTED transaction.
+   If `endingBalance` is None, use that transaction's `runningBalance` (reconstructed from POSTED amounts);
+   when it shows `anchored=false` it counts from a zero opening balance, so say so in the reasoning.
 2. Ignore transactions with status 'PENDING'.
 3. If a month/year is given, use the most recent POSTED transaction in that month.
-4. Do not sum amounts to compute balance — balance is directly given in `endingBalance`.
+4. Do not sum amounts to compute balance — balance is directly given in `endingBalance` or `runningBalance`.
 5. If no POSTED transaction exists for that period, respond with: "Information not available in the provided data."
 """
 
@@ -56,4 +56,55 @@ def render_llm_first_user(query: str, jsonl_rows: str) -> str:
         "TRANSACTIONS_JSONL:\n" + jsonl_rows + "\n\n"
         "Select the relevant rows and compute the result. "
         "Return STRICT JSON as specified."
-    )
\ No newline at end of file
+    )
+SYSTEM_PLAN = """
+You are a banking data analyst. Do not answer from memory: write a query plan that a local executor runs over the FULL dataset.
+
+Return STRICT JSON: {"plan": <plan or null>, "reasoning": string}
+A plan:
+{
+  "source": "transactions" | "accounts",
+  "filter":   [{"field": f, "op": "eq|ne|in|not_in|contains|gt|gte|lt|lte|between|is_null", "value": v}],
+  "group_by": [f],
+  "aggregate": [{"fn": "sum|sum_abs|avg|min|max|count", "field": f, "as": name}],   // omit to list rows
+  "order_by": [{"field": f or aggregate name, "desc": bool}],
+  "select":   [f],   // fields to show when listing rows
+  "limit": int
+}
+Transaction fields: transactionId, accountId, transactionType, transactionStatus, merchantName, currencyCode,
+amount, debitCreditIndicator, transactionDateTime, month ("YYYY-MM"), year ("YYYY").
+Account fields: accountId, accountStatus, accountType, productType, currentBalance, totalBalance, availableCredit,
+creditLimit, minimumDueAmount, pastDueAmount, paymentDueDate, lastUpdatedDate, balanceStatus, highestPriorityStatus, flags.
+Dates accept "YYYY", "YYYY-MM", "YYYY-MM-DD" or full ISO; "between" is inclusive of both ends.
+
+Rules:
+- “spend / spent / expenses” = transactionType "PURCHASE" and transactionStatus "POSTED".
+- “credits / credited” = debitCreditIndicator -1 and transactionStatus "POSTED"; “debits” = debitCreditIndicator 1 (use sum_abs).
+- “payments” = transactionType "PAYMENT" and transactionStatus "POSTED".
+- “latest / last N” = order_by transactionDateTime desc with a limit.
+- Resolve “this month”, “last month”, “this year” against TODAY given in the profile.
+- Balances, limits, due amounts and statuses come from source "accounts".
+Use plan=null only if the question cannot be expressed as a plan.
+"""
+
+SYSTEM_PLAN_ANSWER = """
+You are a banking copilot. You receive a question, the query plan that was run, and its exact result.
+Answer using ONLY the result; do not recompute or invent numbers.
+Return STRICT JSON: {"answer": string, "reasoning": string}
+If the result has no rows, say the information is not available in the data.
+"""
+
+def render_plan_user(query: str, profile: str) -> str:
+    return (
+        "Question: " + query + "\n\n"
+        "DATA_PROFILE:\n" + profile + "\n\n"
+        "Return the plan as STRICT JSON as specified."
+    )
+
+def render_plan_answer_user(query: str, plan_json: str, result_json: str) -> str:
+    return (
+        "Question: " + query + "\n\n"
+        "PLAN:\n" + plan_json + "\n\n"
+        "RESULT:\n" + result_json + "\n\n"
+        "Answer in STRICT JSON as specified."
+    )
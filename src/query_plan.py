@@ -0,0 +1,420 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tx_table import NAT, TransactionTable, _Encoder, month_label, parse_ts
+
+# Declarative query plans. Instead of reading candidate rows, the LLM emits a
+# small JSON plan that runs locally over the full dataset:
+#
+#   {"source": "transactions" | "accounts",
+#    "filter":   [{"field": "transactionType", "op": "eq", "value": "PURCHASE"},
+#                 {"field": "transactionDateTime", "op": "between", "value": ["2025-07-01", "2025-07-31"]}],
+#    "group_by": ["merchantName"],
+#    "aggregate": [{"fn": "sum", "field": "amount", "as": "total"}, {"fn": "count", "as": "n"}],
+#    "order_by": [{"field": "total", "desc": true}],
+#    "limit": 5}
+#
+# Without "aggregate" the plan lists rows ("select" picks the fields). Time
+# filters on transactions (transactionDateTime / month / year) become a binary
+# search over the table's time index; every other step is vectorized over
+# column arrays. Results carry the ids of the rows they were computed from.
+
+OPS = ("eq", "ne", "in", "not_in", "contains", "gt", "gte", "lt", "lte", "between", "is_null")
+AGGS = ("sum", "sum_abs", "avg", "min", "max", "count")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+MAX_SOURCES = 50
+
+TX_FIELDS = {
+    "transactionId": "str", "accountId": "cat", "transactionType": "cat", "transactionStatus": "cat",
+    "merchantName": "cat", "currencyCode": "cat", "amount": "num", "debitCreditIndicator": "num",
+    "transactionDateTime": "time", "month": "month", "year": "year",
+}
+_TX_CODES = {"accountId": "account_id", "transactionType": "transaction_type", "transactionStatus": "transaction_status",
+             "merchantName": "merchant_name", "currencyCode": "currency_code"}
+TX_SELECT = ("transactionId", "transactionDateTime", "amount", "transactionType", "transactionStatus", "merchantName", "accountId")
+
+ACCOUNT_FIELDS = {
+    "accountId": "cat", "accountNumberLast4": "cat", "accountStatus": "cat", "accountType": "cat", "productType": "cat",
+    "highestPriorityStatus": "cat", "balanceStatus": "cat", "currencyCode": "cat", "subStatuses": "cat", "flags": "cat",
+    "openedDate": "time", "closedDate": "time", "lastUpdatedDate": "time", "paymentDueDate": "time",
+    "paymentDueDateTime": "time", "billingCycleOpenDateTime": "time", "billingCycleCloseDateTime": "time",
+    "creditLimit": "num", "availableCredit": "num", "currentBalance": "num", "currentAdjustedBalance": "num",
+    "totalBalance": "num", "remainingBalance": "num", "revolvingCurrentBalance": "num", "minimumDueAmount": "num",
+    "pastDueAmount": "num", "numberOfInstallments": "num",
+}
+_TIME_FIELDS = ("transactionDateTime", "month", "year")   # answered by the transaction time index
+
+
+class PlanError(ValueError):
+    """The plan is malformed or references an unknown field, operator or aggregate."""
+
+
+class Column:
+    """kind: "cat" (codes into vocab), "num", "time" (epoch seconds, raw strings in `labels`),
+    "month" (months since 1970), "year", or "str"."""
+
+    def __init__(self, kind: str, values: np.ndarray, vocab: Optional[List[str]] = None, labels: Optional[np.ndarray] = None):
+        self.kind, self.values, self.vocab, self.labels = kind, values, vocab, labels
+
+    def take(self, rows: np.ndarray) -> "Column":
+        return Column(self.kind, self.values[rows], self.vocab, None if self.labels is None else self.labels[rows])
+
+    def output(self, i: int) -> Any:
+        v = self.values[i]
+        if self.kind == "cat":
+            return None if v < 0 else self.vocab[v]
+        if self.kind == "time":
+            return str(self.labels[i]) or None
+        if self.kind in ("month", "year"):
+            return None if v == NAT else (month_label(v) if self.kind == "month" else int(v))
+        if self.kind == "num":
+            return None if np.isnan(v) else round(float(v), 2)
+        return str(v)
+
+
+class Frame:
+    """Lazily materialized columns a plan can reference, plus the id column used for sources."""
+
+    def __init__(self, n: int, getters: Dict[str, Callable[[], Column]], ids: Callable[[], np.ndarray],
+                 rows_between: Optional[Callable[[int, int], np.ndarray]] = None):
+        self.n, self._getters, self._ids, self.rows_between = n, getters, ids, rows_between
+        self._cols: Dict[str, Column] = {}
+
+    def col(self, name: str) -> Column:
+        c = self._cols.get(name)
+        if c is None:
+            if name not in self._getters:
+                raise PlanError(f"unknown field: {name}")
+            c = self._cols[name] = self._getters[name]()
+        return c
+
+    def ids(self) -> np.ndarray:
+        return self._ids()
+
+    def take(self, rows: np.ndarray) -> "Frame":
+        return Frame(len(rows), {k: (lambda k=k: self.col(k).take(rows)) for k in self._getters},
+                     lambda: self.ids()[rows])
+
+
+def transaction_frame(tbl: TransactionTable) -> Frame:
+    def month() -> Column:
+        return Column("month", np.asarray(tbl.month, dtype=np.int64))
+
+    def year() -> Column:
+        m = np.asarray(tbl.month, dtype=np.int64)
+        return Column("year", np.where(m == NAT, NAT, m // 12 + 1970))
+
+    getters: Dict[str, Callable[[], Column]] = {
+        "transactionId": lambda: Column("str", tbl.ids_col),
+        "amount": lambda: Column("num", np.where(tbl.amount_null, np.nan, tbl.amount)),
+        "debitCreditIndicator": lambda: Column("num", np.asarray(tbl.dci, dtype=np.float64)),
+        "transactionDateTime": lambda: Column("time", tbl.ts, labels=tbl.dates),
+        "month": month, "year": year,
+    }
+    for field, col in _TX_CODES.items():
+        getters[field] = lambda col=col: Column("cat", tbl.codes[col], tbl.vocab[col])
+    return Frame(len(tbl), getters, lambda: tbl.ids_col, tbl.rows_between)
+
+
+def account_frame(accounts: Sequence[Any]) -> Frame:
+    rows = [a.model_dump(by_alias=True) if hasattr(a, "model_dump") else dict(a) for a in accounts]
+
+    def build(field: str, kind: str) -> Column:
+        raw = [r.get(field) for r in rows]
+        if kind == "num":
+            return Column("num", np.asarray([np.nan if v is None else float(v) for v in raw], dtype=np.float64))
+        if kind == "time":
+            return Column("time", np.asarray([parse_ts(v) for v in raw], dtype=np.int64),
+                          labels=np.asarray([v or "" for v in raw], dtype=object))
+        enc = _Encoder()
+        return Column("cat", enc.encode(["|".join(map(str, v)) if isinstance(v, list) else v for v in raw]), enc.vocab)
+
+    getters = {f: (lambda f=f, k=k: build(f, k)) for f, k in ACCOUNT_FIELDS.items()}
+    return Frame(len(rows), getters, lambda: np.asarray([r.get("accountId") or "" for r in rows], dtype=object))
+
+
+# ---------- filters ----------
+def _span(kind: str, value: Any) -> Tuple[int, int]:
+    """[start, end) epoch seconds covered by a 'YYYY', 'YYYY-MM', 'YYYY-MM-DD' or full ISO value."""
+    s = str(value).strip()
+    try:
+        if kind == "year" or (kind == "time" and len(s) == 4):
+            start = np.datetime64(s[:4], "Y")
+        elif kind == "month" or (kind == "time" and len(s) == 7):
+            start = np.datetime64(s[:7], "M")
+        elif kind == "time" and len(s) == 10:
+            start = np.datetime64(s, "D")
+        else:
+            ts = parse_ts(s)
+            if ts == NAT:
+                raise ValueError(s)
+            return ts, ts + 1
+    except ValueError:
+        raise PlanError(f"unparseable date: {value!r}")
+    return int(start.astype("datetime64[s]").astype(np.int64)), int((start + 1).astype("datetime64[s]").astype(np.int64))
+
+
+def _window(kind: str, op: str, value: Any) -> Optional[Tuple[int, int]]:
+    """Time filter as a [start, end) range, or None for ops that are not a single range."""
+    lo, hi = NAT + 1, np.iinfo(np.int64).max
+    if op == "between":
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise PlanError("between takes [low, high]")
+        return _span(kind, value[0])[0], _span(kind, value[1])[1]
+    if op not in ("eq", "gt", "gte", "lt", "lte"):
+        return None
+    s, e = _span(kind, value)
+    return {"eq": (s, e), "gt": (e, hi), "gte": (s, hi), "lt": (lo, s), "lte": (lo, e)}[op]
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _mask(frame: Frame, flt: Dict[str, Any]) -> np.ndarray:
+    field, op, value = flt.get("field"), flt.get("op", "eq"), flt.get("value")
+    if op not in OPS:
+        raise PlanError(f"unknown op: {op}")
+    col = frame.col(field)
+    if col.kind in ("time", "month", "year"):
+        ts = frame.col("transactionDateTime").values if col.kind != "time" else col.values
+        if op == "is_null":
+            return ts == NAT
+        win = _window(col.kind, op, value)
+        if win is not None:
+            return (ts >= win[0]) & (ts < win[1])
+        if op in ("in", "not_in", "ne"):
+            m = np.zeros(frame.n, dtype=bool)
+            for v in _as_list(value):
+                s, e = _span(col.kind, v)
+                m |= (ts >= s) & (ts < e)
+            return ~m & (ts != NAT) if op != "in" else m
+        raise PlanError(f"op {op} does not apply to {field}")
+    if col.kind == "cat":
+        if op == "is_null":
+            return col.values < 0
+        if op == "contains":
+            sub = str(value).casefold()
+            hits = [i for i, v in enumerate(col.vocab) if sub in str(v).casefold()]
+        elif op in ("eq", "ne", "in", "not_in"):
+            want = {str(v).casefold() for v in _as_list(value)}
+            hits = [i for i, v in enumerate(col.vocab) if str(v).casefold() in want]
+        else:
+            raise PlanError(f"op {op} does not apply to {field}")
+        m = np.isin(col.values, np.asarray(hits, dtype=np.int32))
+        return ~m if op in ("ne", "not_in") else m
+    if col.kind == "str":
+        vals = col.values.astype(str)
+        if op == "contains":
+            return np.char.find(np.char.lower(vals), str(value).lower()) >= 0
+        if op in ("eq", "ne", "in", "not_in"):
+            m = np.isin(vals, [str(v) for v in _as_list(value)])
+            return ~m if op in ("ne", "not_in") else m
+        raise PlanError(f"op {op} does not apply to {field}")
+    # num
+    x = col.values
+    if op == "is_null":
+        return np.isnan(x)
+    try:
+        if op == "between":
+            lo, hi = (float(v) for v in value)
+            return (x >= lo) & (x <= hi)
+        if op in ("in", "not_in"):
+            m = np.isin(x, [float(v) for v in _as_list(value)])
+            return ~m if op == "not_in" else m
+        v = float(value)
+    except (TypeError, ValueError):
+        raise PlanError(f"bad value for {field}: {value!r}")
+    if op == "contains":
+        raise PlanError(f"op contains does not apply to {field}")
+    return {"eq": x == v, "ne": x != v, "gt": x > v, "gte": x >= v, "lt": x < v, "lte": x <= v}[op]
+
+
+def _apply_filters(frame: Frame, filters: List[Dict[str, Any]]) -> Frame:
+    rest = list(filters)
+    if frame.rows_between is not None:
+        # time constraints on transactions: intersect their ranges, then one binary search
+        lo, hi, used = NAT + 1, np.iinfo(np.int64).max, False
+        for f in list(rest):
+            if f.get("field") in _TIME_FIELDS:
+                win = _window(TX_FIELDS[f["field"]], f.get("op", "eq"), f.get("value"))
+                if win is not None:
+                    lo, hi, used = max(lo, win[0]), min(hi, win[1]), True
+                    rest.remove(f)
+        if used:
+            frame = frame.take(frame.rows_between(lo, hi) if lo < hi else np.zeros(0, dtype=np.int64))
+    if not rest:
+        return frame
+    m = np.ones(frame.n, dtype=bool)
+    for f in rest:
+        m &= _mask(frame, f)
+    return frame.take(np.flatnonzero(m))
+
+
+# ---------- grouping / aggregation ----------
+def _group_keys(frame: Frame, fields: List[str]):
+    """(group index per row, number of groups, first row of each group)."""
+    if not fields:
+        return np.zeros(frame.n, dtype=np.int64), 1, np.zeros(min(frame.n, 1), dtype=np.int64)
+    cols = []
+    for f in fields:
+        c = frame.col(f)
+        if c.kind in ("time", "str"):
+            raise PlanError(f"cannot group by {f}; use month or year for dates")
+        cols.append(np.nan_to_num(c.values, nan=np.iinfo(np.int64).min).astype(np.int64) if c.kind == "num" else c.values.astype(np.int64))
+    keys = np.stack(cols, axis=1)
+    _, first, inv = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return inv.reshape(-1), len(first), first
+
+
+def _aggregate(frame: Frame, inv: np.ndarray, n_groups: int, agg: Dict[str, Any]) -> np.ndarray:
+    fn = agg.get("fn")
+    if fn not in AGGS:
+        raise PlanError(f"unknown aggregate: {fn}")
+    if fn == "count" and not agg.get("field"):
+        return np.bincount(inv, minlength=n_groups).astype(np.float64)
+    col = frame.col(agg.get("field"))
+    if col.kind != "num":
+        if fn != "count":
+            raise PlanError(f"{fn} needs a numeric field, got {agg.get('field')}")
+        if col.kind == "cat":
+            present = col.values >= 0
+        elif col.kind == "str":
+            present = np.ones(frame.n, dtype=bool)
+        else:
+            present = col.values != NAT
+        return np.bincount(inv, weights=present.astype(np.float64), minlength=n_groups)
+    x = col.values
+    valid = ~np.isnan(x)
+    cnt = np.bincount(inv, weights=valid.astype(np.float64), minlength=n_groups)
+    if fn == "count":
+        return cnt
+    if fn in ("sum", "sum_abs", "avg"):
+        w = np.where(valid, np.abs(x) if fn == "sum_abs" else x, 0.0)
+        s = np.bincount(inv, weights=w, minlength=n_groups)
+        if fn != "avg":
+            return s
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(cnt > 0, s / cnt, np.nan)
+    out = np.full(n_groups, np.nan)
+    sel = np.flatnonzero(valid)
+    if len(sel):
+        order = sel[np.argsort(inv[sel], kind="stable")]
+        g = inv[order]
+        starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+        out[g[starts]] = (np.minimum if fn == "min" else np.maximum).reduceat(x[order], starts)
+    return out
+
+
+def _order_rows(rows: List[Dict[str, Any]], order_by: List[Dict[str, Any]]) -> List[int]:
+    """Stable multi-key sort of result rows; missing values go last in either direction."""
+    idx = list(range(len(rows)))
+    for o in reversed(order_by):
+        field, desc = o.get("field"), bool(o.get("desc"))
+        present = [i for i in idx if rows[i].get(field) is not None]
+        present.sort(key=lambda i: rows[i][field], reverse=desc)
+        idx = present + [i for i in idx if rows[i].get(field) is None]
+    return idx
+
+
+def _row_sort_keys(frame: Frame, order_by: List[Dict[str, Any]]) -> List[np.ndarray]:
+    """One float key per order_by entry, ascending, with missing values last."""
+    keys = []
+    for o in order_by:
+        c = frame.col(o.get("field"))
+        if c.kind == "cat":
+            rank = np.argsort(np.argsort([str(v).casefold() for v in c.vocab], kind="stable")).astype(np.float64)
+            k = np.where(c.values >= 0, rank[np.maximum(c.values, 0)] if len(rank) else 0.0, np.nan)
+        elif c.kind == "str":
+            k = np.unique(c.values.astype(str), return_inverse=True)[1].reshape(-1).astype(np.float64)
+        elif c.kind == "num":
+            k = c.values.astype(np.float64)
+        else:
+            k = np.where(c.values == NAT, np.nan, c.values.astype(np.float64))
+        k = -k if o.get("desc") else k
+        keys.append(np.nan_to_num(k, nan=np.inf))
+    return keys
+
+
+def execute(plan: Dict[str, Any], transactions: Optional[TransactionTable] = None,
+            accounts: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """Run `plan` -> {"columns", "rows", "matched", "sources"}. Raises PlanError on a bad plan."""
+    if not isinstance(plan, dict):
+        raise PlanError("plan must be an object")
+    source = plan.get("source", "transactions")
+    if source == "transactions" and transactions is not None:
+        frame, fields = transaction_frame(transactions), TX_FIELDS
+    elif source == "accounts" and accounts is not None:
+        frame, fields = account_frame(accounts), ACCOUNT_FIELDS
+    else:
+        raise PlanError(f"unknown or unavailable source: {source}")
+    filters = plan.get("filter") or []
+    group_by = plan.get("group_by") or []
+    aggs = plan.get("aggregate") or []
+    order_by = plan.get("order_by") or []
+    if isinstance(filters, dict):
+        filters = [filters]
+    if isinstance(aggs, dict):
+        aggs = [aggs]
+    group_by, order_by = _as_list(group_by), [o if isinstance(o, dict) else {"field": o} for o in _as_list(order_by)]
+    # the plan is model output: check its shape before anything calls .get() on it
+    if not isinstance(filters, list) or not all(isinstance(f, dict) and isinstance(f.get("field"), str) for f in filters):
+        raise PlanError("filter must be a list of {field, op, value} objects")
+    if not isinstance(aggs, list) or not all(isinstance(a, dict) for a in aggs):
+        raise PlanError("aggregate must be a list of {fn, field, as} objects")
+    if not all(isinstance(a.get("field"), (str, type(None))) and isinstance(a.get("as"), (str, type(None))) for a in aggs):
+        raise PlanError("aggregate field and as must be strings")
+    if not all(isinstance(g, str) for g in group_by):
+        raise PlanError("group_by must be a list of field names")
+    if not all(isinstance(o.get("field"), str) for o in order_by):
+        raise PlanError("order_by must be a list of field names or {field, desc} objects")
+    try:
+        limit = min(int(plan.get("limit") or DEFAULT_LIMIT), MAX_LIMIT)
+    except (TypeError, ValueError):
+        raise PlanError("limit must be an integer")
+    if limit < 1:
+        raise PlanError("limit must be positive")
+    for f in filters + [{"field": g} for g in group_by]:
+        if f.get("field") not in fields:
+            raise PlanError(f"unknown field: {f.get('field')}")
+
+    frame = _apply_filters(frame, filters)
+    ids = frame.ids()
+
+    if not aggs and not group_by:
+        # row listing: order on column arrays, keep the top `limit`
+        select = [f for f in _as_list(plan.get("select") or (TX_SELECT if source == "transactions" else list(fields))) if isinstance(f, str) and f in fields]
+        rows = np.arange(frame.n)
+        if order_by and frame.n:
+            keys = _row_sort_keys(frame, order_by)
+            if frame.n > limit and len(keys) == 1:
+                kth = np.partition(keys[0], limit - 1)[limit - 1]
+                rows = np.flatnonzero(keys[0] <= kth)
+                keys = [k[rows] for k in keys]
+            rows = rows[np.lexsort([rows] + keys[::-1])]
+        rows = rows[:limit]
+        cols = [frame.col(f) for f in select]
+        out = [{f: c.output(int(i)) for f, c in zip(select, cols)} for i in rows]
+        return {"columns": select, "rows": out, "matched": frame.n, "sources": [str(ids[i]) for i in rows[:MAX_SOURCES]]}
+
+    inv, n_groups, first = _group_keys(frame, group_by)
+    names = [a.get("as") or (f"{a.get('fn')}_{a.get('field')}" if a.get("field") else a.get("fn")) for a in aggs]
+    values = [_aggregate(frame, inv, n_groups, a) for a in aggs]
+    key_cols = [frame.col(g) for g in group_by]
+    out = []
+    for j in range(n_groups if frame.n else (0 if group_by else 1)):
+        row = {g: c.output(int(first[j])) for g, c in zip(group_by, key_cols)}
+        for a, name, v in zip(aggs, names, values):
+            x = float(v[j]) if frame.n else (0.0 if a.get("fn") in ("count", "sum", "sum_abs") else np.nan)
+            row[name] = None if np.isnan(x) else int(x) if a.get("fn") == "count" else round(x, 2)
+        out.append(row)
+    for o in order_by:
+        if o.get("field") not in names and o.get("field") not in group_by:
+            raise PlanError(f"order_by field must be a group_by field or an aggregate alias: {o.get('field')}")
+    keep = _order_rows(out, order_by)[:limit] if order_by else list(range(min(len(out), limit)))
+    contributing = np.flatnonzero(np.isin(inv, keep)) if group_by else np.arange(frame.n)
+    return {"columns": list(group_by) + names, "rows": [out[j] for j in keep], "matched": frame.n,
+            "sources": [str(ids[i]) for i in contributing[:MAX_SOURCES]]}
@@ -1,15 +1,19 @@
 # src/retrieval.py
 import os
-from datetime import datetime
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
-from .models import Transaction
-from .nlp_utils import parse_month, month_key
-from .semantic_index import has_index, semantic_search
-from .faiss_index import has_faiss_index, semantic_search_faiss
+from .models import AccountSummary, Transaction
+from .nlp_utils import parse_month
+from .tx_table import month_index
+from .hybrid_retriever import hybrid_search, newest, row_index
+from .tx_balance import account_anchors, row_balances
 
 
-def _pack_text(t: Transaction) -> str:
+def _pack_text(t: Transaction, running: tuple = (None, False)) -> str:
+    # feeds without endingBalance get the balance reconstructed from POSTED amounts (tx_balance)
+    bal, anchored = running
+    derived = "" if getattr(t, "ending_balance", None) is not None or bal is None else (
+        f"runningBalance={bal} anchored={str(anchored).lower()} | ")
     return (
         f"[{t.id}] "
         f"type={t.transaction_type} | "
@@ -17,106 +21,49 @@ def _pack_text(t: Transaction) -> str:
         f"date={t.transaction_date_time} | "
         f"amount={t.amount} {t.currency_code or ''} | "
         f"endingBalance={getattr(t, 'ending_balance', None)} | "
+        f"{derived}"
         f"merchant={t.merchant_name or ''} | accountId={t.account_id}"
     )
 
 
-def _keyword_rank(query: str, docs: List[Dict[str, str]], top_k: int = 12) -> List[Dict[str, str]]:
-    q = query.lower().split()
-    scored = []
-    for d in docs:
-        text = d["text"].lower()
-        score = sum(text.count(term) for term in q)
-        scored.append((score, d))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [d for sc, d in scored[:top_k] if sc > 0]
+def _latest_row(txns: List[Transaction], *, posted_only: bool = True, ym: str | None = None, types=None):
+    """Row of the newest transaction in scope (binary search over the presorted timestamps)."""
+    flt: Dict[str, Any] = {}
+    if posted_only:
+        flt["statuses"] = ["POSTED"]
+    if types:
+        flt["types"] = types
+    if ym:
+        flt["month_from"] = flt["month_to"] = month_index(ym)
+    hit = newest(row_index(txns), 1, flt)
+    return hit[0] if hit else None
 
 
-def _dt_key(iso: str | None) -> datetime:
-    if not iso:
-        return datetime.min
-    try:
-        return datetime.fromisoformat(iso.replace("Z", "+00:00"))
-    except Exception:
-        try:
-            return datetime.strptime(iso.split(".")[0].replace("Z", ""), "%Y-%m-%dT%H:%M:%S")
-        except Exception:
-            return datetime.min
-
-
-def _select_latest(txns: List[Transaction], *, posted_only: bool = True, ym: str | None = None):
-    pool = [
-        t for t in txns
-        if (not posted_only or (t.transaction_status or "").upper() == "POSTED")
-        and (ym is None or (t.transaction_date_time and month_key(t.transaction_date_time) == ym))
-    ]
-    if not pool:
-        return None
-    return max(pool, key=lambda x: _dt_key(x.transaction_date_time))
-
-
-def retrieve_transactions_context(query: str, txns: List[Transaction], top_k: int = 12) -> List[Dict[str, str]]:
-    # ---- init ----
-    docs: List[Dict[str, str]] = []
-
-    # ---- 1) FAISS semantic search (preserve results) ----
-    if has_faiss_index("tx_faiss") and os.getenv("OPENAI_API_KEY"):
-        try:
-            docs.extend(semantic_search_faiss(query, top_k=top_k, name="tx_faiss"))
-        except Exception:
-            pass
-
+def retrieve_transactions_context(query: str, txns: List[Transaction], top_k: int = 12,
+                                  accounts: Optional[List[AccountSummary]] = None) -> List[Dict[str, str]]:
+    """Top-k context docs; `accounts` (summaries) anchor the reconstructed running balances."""
     q = query.lower()
 
     # Compute month scope SAFELY (ym can be None)
     yr, mo = parse_month(q)
     ym = f"{yr:04d}-{mo:02d}" if (yr and mo) else None
 
-    # ---- 2) Latest/most recent/last transaction pin ----
+    # ---- pins: rows the question names outright rank above the fused results ----
+    pins = []
+    # latest/most recent/last transaction
     if any(k in q for k in ["latest transaction", "most recent transaction", "last transaction"]):
         posted_only = ("pending" not in q) and ("include pending" not in q)
-        latest_any = _select_latest(txns, posted_only=posted_only, ym=ym)
-        if latest_any:
-            docs.append({"id": latest_any.id, "text": _pack_text(latest_any), "score": 1e14})
-
-    # ---- 3) Balance queries: pin latest POSTED (optionally within month) ----
+        pins.append((_latest_row(txns, posted_only=posted_only, ym=ym), 1e14))
+    # balance queries: latest POSTED (optionally within month)
     if "balance" in q or "ending balance" in q or "current balance" in q:
-        latest_posted = _select_latest(txns, posted_only=True, ym=ym) or _select_latest(txns, posted_only=False, ym=ym)
-        if latest_posted:
-            docs.append({"id": latest_posted.id, "text": _pack_text(latest_posted), "score": 1e12})
-
-    # ---- 4) Payment phrases: pin latest POSTED PAYMENT ----
+        row = _latest_row(txns, posted_only=True, ym=ym)
+        pins.append((_latest_row(txns, posted_only=False, ym=ym) if row is None else row, 1e12))
+    # payment phrases: latest POSTED PAYMENT
     if "payment" in q:
-        pays = [
-            t for t in txns
-            if (t.transaction_type or "").upper() == "PAYMENT"
-            and (t.transaction_status or "").upper() == "POSTED"
-            and (ym is None or (t.transaction_date_time and month_key(t.transaction_date_time) == ym))
-        ]
-        if pays:
-            latest_pay = max(pays, key=lambda x: _dt_key(x.transaction_date_time))
-            docs.append({"id": latest_pay.id, "text": _pack_text(latest_pay), "score": 1e13})
-
-    # ---- 5) NPZ/LlamaIndex fallback only if still empty ----
-    if not docs and has_index("tx_index") and os.getenv("OPENAI_API_KEY"):
-        try:
-            docs.extend(semantic_search(query, top_k=top_k, filename="tx_index"))
-        except Exception:
-            pass
-
-    # ---- 6) Keyword fallback only if still empty ----
-    if not docs:
-        base = [{"id": t.id, "text": _pack_text(t)} for t in txns]
-        docs = _keyword_rank(query, base, top_k) or base[:top_k]
+        pins.append((_latest_row(txns, posted_only=True, ym=ym, types=["PAYMENT"]), 1e13))
 
-    # ---- 7) De-dupe + sort by score desc + cap top_k ----
-    seen = set()
-    out: List[Dict[str, str]] = []
-    for d in sorted(docs, key=lambda x: x.get("score", 0.0), reverse=True):
-        if d["id"] in seen:
-            continue
-        seen.add(d["id"])
-        out.append(d)
-        if len(out) >= top_k:
-            break
-    return out
\ No newline at end of file
+    # ---- semantic + keyword + recency, fused by rank ----
+    hits = hybrid_search(query, txns, top_k=top_k, semantic=bool(os.getenv("OPENAI_API_KEY")),
+                         pins=[(r, s) for r, s in pins if r is not None])
+    running = row_balances(row_index(txns), [r for r, _ in hits], account_anchors(accounts))
+    return [{"id": txns[r].id, "text": _pack_text(txns[r], b), "score": s} for (r, s), b in zip(hits, running)]
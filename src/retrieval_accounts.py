@@ -1,10 +1,10 @@
 # src/retrieval_accounts.py
 from __future__ import annotations
 from typing import List, Dict, Any
-from datetime import datetime
 
 from .models import AccountSummary
 from .faiss_index import has_faiss_index, semantic_search_faiss
+from .tx_table import parse_ts
 
 ACCOUNT_HINTS = (
     "balance", "current balance", "total balance",
@@ -14,17 +14,6 @@ ACCOUNT_HINTS = (
     "billing cycle", "statement", "opened", "closed"
 )
 
-def _dt_key(iso: str | None) -> datetime:
-    if not iso:
-        return datetime.min
-    try:
-        return datetime.fromisoformat(iso.replace("Z","+00:00"))
-    except Exception:
-        try:
-            return datetime.strptime(iso.split(".")[0].replace("Z",""), "%Y-%m-%dT%H:%M:%S")
-        except Exception:
-            return datetime.min
-
 def looks_like_account_query(q: str) -> bool:
     q = (q or "").lower()
     return any(k in q for k in ACCOUNT_HINTS)
@@ -59,7 +48,7 @@ def retrieve_accounts(query: str, accounts: List[AccountSummary], top_k=12) -> L
     seen = set()
     pool = []
     # prioritize newest lastUpdatedDate
-    accounts_sorted = sorted(accounts, key=lambda a: _dt_key(getattr(a, "lastUpdatedDate", None)), reverse=True)
+    accounts_sorted = sorted(accounts, key=lambda a: parse_ts(getattr(a, "lastUpdatedDate", None)), reverse=True)
     for a in accounts_sorted:
         if a.accountId in seen:
             continue
@@ -67,5 +56,5 @@ def retrieve_accounts(query: str, accounts: List[AccountSummary], top_k=12) -> L
         pool.append(a)
     # if FAISS provided ids, reorder to put them first
     idset = set(ids)
-    pool.sort(key=lambda a: (a.accountId in idset, _dt_key(getattr(a,"lastUpdatedDate",None))), reverse=True)
+    pool.sort(key=lambda a: (a.accountId in idset, parse_ts(getattr(a,"lastUpdatedDate",None))), reverse=True)
     return pool[:top_k]
\ No newline at end of file
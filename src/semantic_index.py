@@ -2,6 +2,10 @@
 import os, numpy as np
 from typing import List, Dict, Tuple
 from .models import Transaction
+from .embed_cache import cached_embed
+from .embed_client import embed_query
+from .embed_async import embed_texts_concurrent
+from .index_registry import resident
 
 INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "index")
 os.makedirs(INDEX_DIR, exist_ok=True)
@@ -13,22 +17,15 @@ def _pack_text(t: Transaction) -> str:
     return "TRANSACTION " + " | ".join([p for p in parts if p and not p.endswith('=None') and not p.endswith('=')])
 
 def build_index(transactions: List[Transaction], embed_model: str | None = None, filename: str = "tx_index"):
-    from openai import OpenAI
     embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"))
     texts = [_pack_text(t) for t in transactions]
     ids = [t.id for t in transactions]
-    vecs = []
-    chunk = 64
-    for i in range(0, len(texts), chunk):
-        batch = texts[i:i+chunk]
-        resp = client.embeddings.create(model=embed_model, input=batch)
-        for d in resp.data:
-            vecs.append(d.embedding)
-    V = np.array(vecs, dtype="float32")
-    Vn = V/(np.linalg.norm(V, axis=1, keepdims=True)+1e-8)
+    # same cache key as faiss_index, so vectors embedded by either builder are reused by the other
+    Vn = cached_embed(texts, f"openai:{embed_model}", lambda missing: embed_texts_concurrent(missing, embed_model))
     path = os.path.join(INDEX_DIR, f"{filename}.npz")
-    np.savez_compressed(path, V=Vn, ids=np.array(ids), texts=np.array(texts), model=np.array([embed_model]))
+    with open(path + ".tmp", "wb") as f:   # write-then-rename: resident readers reload only complete files
+        np.savez_compressed(f, V=Vn, ids=np.array(ids), texts=np.array(texts), model=np.array([embed_model]))
+    os.replace(path + ".tmp", path)
     return path
 
 def has_index(filename: str = "tx_index") -> bool:
@@ -40,14 +37,16 @@ def load_index(filename: str = "tx_index"):
     data = np.load(p, allow_pickle=True)
     return data["V"], list(data["ids"]), list(data["texts"])
 
+def _resident_index(filename: str = "tx_index"):
+    # decompressing the npz dominates a search; keep it resident until the file is rebuilt
+    p = os.path.join(INDEX_DIR, f"{filename}.npz")
+    if not os.path.exists(p): raise FileNotFoundError(p)
+    return resident(("semantic_index", filename), (p,), lambda: load_index(filename))
+
 def semantic_search(query: str, top_k: int = 12, embed_model: str | None = None, filename: str = "tx_index"):
-    from openai import OpenAI
-    V, ids, texts = load_index(filename)
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"))
+    V, ids, texts = _resident_index(filename)
     embed_model = embed_model or os.getenv("EMBED_MODEL", "BAAI/bge-en-icl")
-    qv = client.embeddings.create(model=embed_model, input=query).data[0].embedding
-    import numpy as np
-    q = np.array(qv, dtype="float32"); q = q/(np.linalg.norm(q)+1e-8)
+    q = embed_query(query, embed_model)
     sims = V @ q
     idx = np.argsort(-sims)[:top_k]
     return [{"id": ids[i], "text": texts[i], "score": float(sims[i])} for i in idx]
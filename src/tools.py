@@ -1,135 +1,87 @@
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Iterable
-from .models import Transaction
+from typing import List, Dict, Any, Iterable
+import numpy as np
+from .tx_table import as_table, month_bounds, month_label
+from .tx_cube import month_range
+from .tx_balance import account_anchors, balances
+from . import tx_rank
 from .domain import get_field_doc
 
-def _to_dict(i):
-    if i is None:
-        return {}
-    if hasattr(i, "model_dump"):        # Pydantic v2
-        return i.model_dump(by_alias=True)
-    if hasattr(i, "dict"):              # Pydantic v1
-        return i.dict(by_alias=True)
-    if isinstance(i, dict):
-        return i
-    if isinstance(i, str):
-        try:
-            return json.loads(i)
-        except Exception:
-            return {}
-    return {}
-
-def _parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
-    if not dt_str or not isinstance(dt_str, str):
-        return None
-    s = dt_str.strip()
-    # tolerate trailing Z and fractional seconds
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
-    except Exception:
-        try:
-            return datetime.strptime(s.split(".")[0].replace("Z",""), "%Y-%m-%dT%H:%M:%S")
-        except Exception:
-            return None
-
-def _match_month_year(d: dict, month: Optional[str], year: Optional[str]) -> bool:
-    """month = 'YYYY-MM' or None, year = 'YYYY' or None."""
-    if not month and not year:
-        return True
-    dt = _parse_iso(d.get("transactionDateTime") or d.get("transaction_date_time"))
-    if not dt:
-        # last‑ditch substring fallback (handles well‑formed ISO strings)
-        s = (d.get("transactionDateTime") or d.get("transaction_date_time") or "")
-        if month and isinstance(s, str) and s.startswith(month):
-            return True
-        if year and isinstance(s, str) and s.startswith(year):
-            return True
-        return False
-    if month:
-        try:
-            y, m = month.split("-")
-            return dt.year == int(y) and dt.month == int(m)
-        except Exception:
-            return False
-    if year:
-        try:
-            return dt.year == int(year)
-        except Exception:
-            return False
-    return True
-
-def _is_posted(d: dict) -> bool:
-    return (d.get("transactionStatus") or d.get("transaction_status") or "").upper() == "POSTED"
-
-def _is_credit(d: dict) -> bool:
-    """Credit = debitCreditIndicator == -1 (string or int)."""
-    ind = d.get("debitCreditIndicator")
-    try:
-        return int(ind) == -1
-    except Exception:
-        return False
-
-def _is_debit(d: dict) -> bool:
-    """Debit = debitCreditIndicator == 1 (string or int)."""
-    ind = d.get("debitCreditIndicator")
+# ---------- totals ----------
+# month/year totals come from the table's aggregate cube (tx_cube): O(cells in the period), not O(rows)
+def _posted_total(transactions: Iterable, month: str | None, year: str | None, absolute: bool = False, **dims) -> float:
+    cube = as_table(transactions).cube()
     try:
-        return int(ind) == 1
-    except Exception:
-        return False
+        lo, hi = month_range(month, year)
+    except ValueError:
+        return 0.0
+    return cube.total(cube.cells(lo, hi, status="POSTED", **dims), absolute=absolute)
 
-# ---------- totals ----------
 def sum_credits(transactions: Iterable, month: str | None = None, year: str | None = None) -> float:
     """Total of POSTED credits. Credit strictly = debitCreditIndicator == -1."""
-    total = 0.0
-    for t in transactions:
-        d = _to_dict(t)
-        if not _is_posted(d):
-            continue
-        if not _match_month_year(d, month, year):
-            continue
-        if not _is_credit(d):
-            continue
-        try:
-            total += float(d.get("amount") or 0.0)
-        except Exception:
-            pass
-    return float(total)
+    return _posted_total(transactions, month, year, dci=-1)
 
 def sum_debits(transactions: Iterable, month: str | None = None, year: str | None = None) -> float:
     """Total of POSTED debits. Debit strictly = debitCreditIndicator == 1."""
-    total = 0.0
-    for t in transactions:
-        d = _to_dict(t)
-        if not _is_posted(d):
-            continue
-        if not _match_month_year(d, month, year):
-            continue
-        if not _is_debit(d):
-            continue
-        try:
-            # amounts may be positive; we sum their absolute value
-            amt = float(d.get("amount") or 0.0)
-            total += abs(amt)
-        except Exception:
-            pass
-    return float(total)
+    # amounts may be positive; we sum their absolute value
+    return _posted_total(transactions, month, year, absolute=True, dci=1)
 
 def sum_payments(transactions: Iterable, month: str | None = None, year: str | None = None) -> float:
     """Total of POSTED PAYMENT transactions (by type). Use when business asks 'total payment ...'."""
-    total = 0.0
-    for t in transactions:
-        d = _to_dict(t)
-        if not _is_posted(d):
-            continue
-        if not _match_month_year(d, month, year):
-            continue
-        if (d.get("transactionType") or d.get("transaction_type") or "").upper() != "PAYMENT":
-            continue
-        try:
-            total += float(d.get("amount") or 0.0)
-        except Exception:
-            pass
-    return float(total)
+    return _posted_total(transactions, month, year, txn_type="PAYMENT")
+
+# ---------- balances ----------
+# running balance per account reconstructed from POSTED amounts (tx_balance): one binary search per account
+def account_balance(transactions: Iterable, account_id: str | None = None, month: str | None = None,
+                    year: str | None = None, accounts: Iterable | None = None) -> List[Dict[str, Any]]:
+    """Balance per account (or one account) at the end of month/year, or now. `accounts` (AccountSummary
+    rows) anchor each account to its currentBalance; unanchored accounts count from zero."""
+    try:
+        _, hi = month_range(month, year)
+    except ValueError:
+        return []
+    when = None if hi is None else month_bounds(month_label(hi))[1] - 1
+    return balances(as_table(transactions), when, account_id, account_anchors(accounts))
+
+# ---------- rankings ----------
+# top-N reads k rows off the table's presorted amount/time orders; merchant rankings use its
+# per-merchant rollup (tx_rank), so each call is O(k) over the full history
+MAX_TOP = 100
+
+def _listing(tbl, rows: List[int]) -> List[Dict[str, Any]]:
+    return [{**tbl.record(i), "accountId": tbl.value("account_id", i)} for i in rows]
+
+def top_transactions(transactions: Iterable, k: int = 5, side: str = "out", transaction_type: str | None = None,
+                     status: str | None = None, account_id: str | None = None,
+                     month: str | None = None, year: str | None = None) -> List[Dict[str, Any]]:
+    """Largest k transactions by amount: side 'out' = money spent (most negative first),
+    'in' = money received, 'any' = largest absolute amount."""
+    tbl = as_table(transactions)
+    try:
+        rows = tx_rank.largest(tbl, max(1, min(int(k or 5), MAX_TOP)), side, transaction_type, status, account_id, month, year)
+    except (TypeError, ValueError):
+        return []
+    return _listing(tbl, rows)
+
+def latest_transactions(transactions: Iterable, k: int = 5, transaction_type: str | None = None,
+                        status: str | None = None, account_id: str | None = None,
+                        month: str | None = None, year: str | None = None) -> List[Dict[str, Any]]:
+    """Newest k transactions, newest first."""
+    tbl = as_table(transactions)
+    try:
+        rows = tx_rank.latest(tbl, max(1, min(int(k or 5), MAX_TOP)), transaction_type, status, account_id, month, year)
+    except (TypeError, ValueError):
+        return []
+    return _listing(tbl, rows)
+
+def merchant_ranking(transactions: Iterable, by: str = "spend", k: int = 5, month: str | None = None,
+                     year: str | None = None, min_count: int = 1, include_pending: bool = False) -> List[Dict[str, Any]]:
+    """Merchants ranked by 'spend' (sum of outflows) or 'count' (visits), POSTED only unless
+    include_pending; min_count keeps merchants with at least that many visits."""
+    try:
+        return as_table(transactions).merchants().rank(by, max(1, min(int(k or 5), MAX_TOP)), month, year,
+                                                       None if include_pending else "POSTED", max(1, int(min_count or 1)))
+    except (TypeError, ValueError):
+        return []
 
 def explain_field(field_name: str) -> dict | None:
     doc = get_field_doc(field_name)
@@ -137,21 +89,17 @@ def explain_field(field_name: str) -> dict | None:
         return None
     return {"field": field_name, "explanation": doc}
 
-def filter_transactions(transactions: List[Transaction], 
+def filter_transactions(transactions: Iterable, 
                         min_amount: float | None = None, 
                         max_amount: float | None = None,
                         transaction_type: str | None = None,
                         merchant_name: str | None = None,
                         status: str | None = None) -> List[Dict[str, Any]]:
-    res = []
-    for t in transactions:
-        if transaction_type and (t.transaction_type or "").upper() != transaction_type.upper(): continue
-        if merchant_name and (t.merchant_name or "").lower() != merchant_name.lower(): continue
-        if status and (t.transaction_status or "").upper() != status.upper(): continue
-        if min_amount is not None and (t.amount or 0) < min_amount: continue
-        if max_amount is not None and (t.amount or 0) > max_amount: continue
-        res.append({"transactionId": t.id, "amount": t.amount, "type": t.transaction_type, "date": t.transaction_date_time})
-    return res
+    tbl = as_table(transactions)
+    m = tbl.eq("transaction_type", transaction_type) & tbl.eq("merchant_name", merchant_name) & tbl.eq("transaction_status", status)
+    if min_amount is not None: m &= tbl.amount >= min_amount
+    if max_amount is not None: m &= tbl.amount <= max_amount
+    return [{k: r[k] for k in ("transactionId", "amount", "type", "date")} for r in map(tbl.record, np.flatnonzero(m))]
 
 def sum_amounts(items: List[Dict[str, Any]]) -> float:
     return float(sum((i.get("amount") or 0.0) for i in items))
@@ -159,8 +107,7 @@ def sum_amounts(items: List[Dict[str, Any]]) -> float:
 def count_items(items: List[Dict[str, Any]]) -> int:
     return int(len(items))
 
-def get_transaction_by_id(transactions: List[Transaction], txn_id: str) -> Dict[str, Any] | None:
-    for t in transactions:
-        if (t.id or "") == (txn_id or ""):
-            return {"transactionId": t.id, "amount": t.amount, "type": t.transaction_type, "date": t.transaction_date_time, "status": t.transaction_status, "currency": t.currency_code, "merchant": t.merchant_name}
-    return None
+def get_transaction_by_id(transactions: Iterable, txn_id: str) -> Dict[str, Any] | None:
+    tbl = as_table(transactions)
+    i = tbl.position(txn_id)
+    return None if i is None else tbl.record(i)
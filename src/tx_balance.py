@@ -0,0 +1,135 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .tx_table import NAT, _SortedRows, parse_ts
+
+# Running balances reconstructed from POSTED transactions (amounts are signed:
+# credits positive, debits negative). POSTED rows are kept sorted by
+# (account, ts); a grouped cumulative sum over that order gives each account's
+# balance after every row, so the balance on any date is one binary search.
+# Appended rows are merged into the order and only the accounts they touch are
+# re-summed. Sums start at zero per account; an anchor (AccountSummary
+# currentBalance as of lastUpdatedDate) shifts an account so that its
+# reconstruction meets the reported balance.
+
+_END = np.iinfo(np.int64).max
+
+
+def _posted_rows(tbl, first: int = 0) -> np.ndarray:
+    codes = tbl.codes["transaction_status"][first:]
+    return first + np.flatnonzero(np.isin(codes, tbl.code_set("transaction_status", ["POSTED"])))
+
+
+class RunningBalance:
+    def __init__(self, idx: _SortedRows, cum: np.ndarray, column: np.ndarray):
+        self.idx = idx          # POSTED rows by (account code, ts)
+        self.cum = cum          # balance after each idx position, from zero per account
+        self.column = column    # the same per table row; NaN where the row is not POSTED
+
+    @classmethod
+    def from_table(cls, tbl) -> "RunningBalance":
+        rows = _posted_rows(tbl)
+        idx = _SortedRows.build(tbl.codes["account_id"][rows], tbl.ts[rows], rows)
+        column = np.full(len(tbl), np.nan)
+        cum = np.empty(len(rows))
+        _resum(idx, tbl.amount, cum, column, np.unique(idx.keys))
+        return cls(idx, cum, column)
+
+    def extend(self, tbl, first_row: int) -> "RunningBalance":
+        """Balances for `tbl` = the table this was built on plus rows first_row..; accounts
+        without new POSTED rows keep their sums."""
+        rows = _posted_rows(tbl, first_row)
+        column = np.full(len(tbl), np.nan)
+        column[:first_row] = self.column
+        if not len(rows):
+            return RunningBalance(self.idx, self.cum, column)
+        keys = tbl.codes["account_id"][rows]
+        idx = self.idx.extend(keys, tbl.ts[rows], rows)
+        cum = column[idx.order]
+        _resum(idx, tbl.amount, cum, column, np.unique(keys))
+        return RunningBalance(idx, cum, column)
+
+    def at(self, code: int, when: int = _END) -> Tuple[float, int]:
+        """(balance after the last POSTED row of account `code` with ts <= when, that row);
+        (0.0, -1) when there is none."""
+        a, b = self.idx.span(code)
+        j = a + int(np.searchsorted(self.idx.ts[a:b], when, "right"))
+        return (float(self.cum[j - 1]), int(self.idx.order[j - 1])) if j > a else (0.0, -1)
+
+    def offsets(self, tbl, anchors: Optional[Dict[str, Tuple[float, int]]] = None) -> np.ndarray:
+        """Per account code: amount to add to the zero-based sums; NaN for accounts without an anchor."""
+        out = np.full(len(tbl.vocab["account_id"]), np.nan)
+        for acct, (balance, ts) in (anchors or {}).items():
+            for c in tbl.code_set("account_id", [acct]).tolist():
+                out[c] = balance - self.at(c, _END if ts == NAT else ts)[0]
+        return out
+
+
+def _resum(idx: _SortedRows, amount: np.ndarray, cum: np.ndarray, column: np.ndarray, codes: np.ndarray) -> None:
+    """Recompute the cumulative sums of the given account codes in place: one cumsum over their
+    concatenated segments, minus the running total at each segment start."""
+    lo, hi = np.searchsorted(idx.keys, codes, "left"), np.searchsorted(idx.keys, codes, "right")
+    lens = hi - lo
+    n = int(lens.sum())
+    if not n:
+        return
+    ends = np.cumsum(lens)
+    pos = np.repeat(lo - (ends - lens), lens) + np.arange(n)
+    rows = idx.order[pos]
+    run = np.concatenate(([0.0], np.cumsum(amount[rows])))
+    vals = run[1:] - np.repeat(run[ends - lens], lens)
+    cum[pos] = vals
+    column[rows] = vals
+
+
+def account_anchors(accounts: Iterable[Any]) -> Dict[str, Tuple[float, int]]:
+    """accountId -> (currentBalance, ts of lastUpdatedDate; NAT = as of the newest POSTED row).
+    The newest lastUpdatedDate wins when an account appears more than once."""
+    out: Dict[str, Tuple[float, int]] = {}
+    for a in accounts or ():
+        acct, bal = getattr(a, "accountId", None), getattr(a, "currentBalance", None)
+        if not acct or bal is None:
+            continue
+        ts = parse_ts(getattr(a, "lastUpdatedDate", None))
+        if acct not in out or ts >= out[acct][1]:
+            out[acct] = (float(bal), ts)
+    return out
+
+
+def balances(tbl, when: Optional[int] = None, account: Optional[str] = None,
+             anchors: Optional[Dict[str, Tuple[float, int]]] = None) -> List[Dict[str, Any]]:
+    """Balance per account (or the one named, case-insensitively) after its last POSTED row with
+    ts <= when (None = newest). Accounts with no such row are left out."""
+    rb = tbl.running_balance()
+    off = rb.offsets(tbl, anchors)
+    codes = tbl.code_set("account_id", [account]) if account else np.unique(rb.idx.keys)
+    out = []
+    for c in codes.tolist():
+        if c < 0:
+            continue
+        bal, row = rb.at(c, _END if when is None else when)
+        if row < 0:
+            continue
+        anchored = bool(not np.isnan(off[c]))
+        out.append({"accountId": tbl.vocab["account_id"][c], "balance": round(bal + (float(off[c]) if anchored else 0.0), 2),
+                    "asOf": str(tbl.dates[row]) or None, "currency": tbl.value("currency_code", row),
+                    "anchored": anchored, "sourceId": str(tbl.ids_col[row])})
+    return out
+
+
+def row_balances(tbl, rows: Iterable[int], anchors: Optional[Dict[str, Tuple[float, int]]] = None) -> List[Tuple[Optional[float], bool]]:
+    """(balance after the row, anchored) per row; (None, False) for rows that are not POSTED."""
+    rows = np.asarray(list(rows), dtype=np.int64)
+    rb = tbl.running_balance()
+    off = rb.offsets(tbl, anchors)
+    out = []
+    for v, c in zip(rb.column[rows].tolist(), tbl.codes["account_id"][rows].tolist()):
+        if np.isnan(v):
+            out.append((None, False))
+        elif c >= 0 and not np.isnan(off[c]):
+            out.append((round(v + float(off[c]), 2), True))
+        else:
+            out.append((round(v, 2), False))
+    return out
@@ -0,0 +1,113 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .tx_table import NAT, month_key
+
+# Materialized aggregate cube over a TransactionTable: one cell per
+# (month, account, type, status, debit/credit indicator) holding sum, sum of
+# positive amounts, count, min and max of `amount`. Cells are sorted month
+# first, so a month or year total is a binary search plus a pass over that
+# period's cells, independent of the number of rows. Appending rows folds
+# their cells into a new cube (cost grows with cells, not rows).
+
+DIMS = ("month", "account_id", "transaction_type", "transaction_status", "dci")
+_CAT_DIMS = ("account_id", "transaction_type", "transaction_status")
+
+
+def month_range(month: Optional[str] = None, year: Optional[str] = None) -> Tuple[Optional[int], Optional[int]]:
+    """Inclusive month-index range for month = 'YYYY-MM' or year = 'YYYY' (month wins; neither = open).
+    Raises ValueError for a malformed value."""
+    if month:
+        m = int(np.datetime64(month_key(month), "M").astype(np.int64))
+        return m, m
+    if year:
+        y = int(np.datetime64(str(year)[:4], "Y").astype("datetime64[M]").astype(np.int64))
+        return y, y + 11
+    return None, None
+
+
+class AggregateCube:
+    def __init__(self, keys: Dict[str, np.ndarray], agg: Dict[str, np.ndarray], vocab: Dict[str, List[str]]):
+        self.keys = keys      # dim -> per-cell key (month index, category code, dci)
+        self.agg = agg        # "sum", "pos", "count", "min", "max" per cell
+        self.vocab = vocab    # the table's (shared, growing) vocabularies
+
+    @classmethod
+    def from_table(cls, tbl) -> "AggregateCube":
+        keys = {"month": np.asarray(tbl.month, dtype=np.int64), "dci": np.asarray(tbl.dci, dtype=np.int8)}
+        keys.update({c: np.asarray(tbl.codes[c], dtype=np.int32) for c in _CAT_DIMS})
+        amt = np.asarray(tbl.amount, dtype=np.float64)
+        agg = {"sum": amt, "pos": np.maximum(amt, 0.0), "count": np.ones(len(amt), dtype=np.int64), "min": amt, "max": amt}
+        return cls(*_group(keys, agg), tbl.vocab)
+
+    def __len__(self) -> int:
+        return len(self.agg["count"])
+
+    def extend(self, add) -> "AggregateCube":
+        """New cube with the rows of table `add` (same vocabularies) folded in."""
+        other = AggregateCube.from_table(add)
+        keys = {d: np.concatenate([self.keys[d], other.keys[d]]) for d in DIMS}
+        agg = {a: np.concatenate([self.agg[a], other.agg[a]]) for a in self.agg}
+        return AggregateCube(*_group(keys, agg), self.vocab)
+
+    def cells(self, month_from: Optional[int] = None, month_to: Optional[int] = None, account: Optional[str] = None,
+              txn_type: Optional[str] = None, status: Optional[str] = None, dci: Optional[int] = None) -> np.ndarray:
+        """Indices of cells in the month range (inclusive month indexes; None = open) matching the
+        given dimensions. Category values compare case-insensitively."""
+        month = self.keys["month"]
+        lo = 0 if month_from is None else int(np.searchsorted(month, month_from, "left"))
+        hi = len(month) if month_to is None else int(np.searchsorted(month, month_to, "right"))
+        if month_to is not None and month_from is None:
+            lo = int(np.searchsorted(month, NAT, "right"))   # open start still excludes undated rows
+        m = np.ones(max(hi - lo, 0), dtype=bool)
+        for col, want in (("account_id", account), ("transaction_type", txn_type), ("transaction_status", status)):
+            if want:
+                w = str(want).casefold()
+                codes = [i for i, v in enumerate(self.vocab[col]) if str(v).casefold() == w]
+                m &= np.isin(self.keys[col][lo:hi], codes)
+        if dci is not None:
+            m &= self.keys["dci"][lo:hi] == dci
+        return lo + np.flatnonzero(m)
+
+    def total(self, cells: np.ndarray, absolute: bool = False) -> float:
+        s = self.agg["sum"][cells].sum()
+        return float(2.0 * self.agg["pos"][cells].sum() - s if absolute else s)
+
+    def count(self, cells: np.ndarray) -> int:
+        return int(self.agg["count"][cells].sum())
+
+    def extremes(self, cells: np.ndarray):
+        """(min, max) amount over the cells, or (None, None) when empty."""
+        if not len(cells):
+            return None, None
+        return float(self.agg["min"][cells].min()), float(self.agg["max"][cells].max())
+
+    def by(self, cells: np.ndarray, dim: str):
+        """Per-value rollup of the cells along one dimension: (keys, sum, pos, count)."""
+        keys, inv = np.unique(self.keys[dim][cells], return_inverse=True)
+        n = len(keys)
+        return (keys, np.bincount(inv, weights=self.agg["sum"][cells], minlength=n),
+                np.bincount(inv, weights=self.agg["pos"][cells], minlength=n),
+                np.bincount(inv, weights=self.agg["count"][cells], minlength=n).astype(np.int64))
+
+
+def _group(keys: Dict[str, np.ndarray], agg: Dict[str, np.ndarray], dims: Tuple[str, ...] = DIMS):
+    """Sort by `dims` (first = most significant) and combine rows/cells that share a key."""
+    if not len(agg["count"]):
+        return keys, agg
+    order = np.lexsort(tuple(keys[d] for d in reversed(dims)))
+    keys = {d: v[order] for d, v in keys.items()}
+    change = np.zeros(len(order), dtype=bool)
+    change[0] = True
+    for v in keys.values():
+        change[1:] |= v[1:] != v[:-1]
+    starts = np.flatnonzero(change)
+    keys = {d: v[starts] for d, v in keys.items()}
+    out = {}
+    for a, v in agg.items():
+        v = v[order]
+        ufunc = np.minimum if a == "min" else np.maximum if a == "max" else np.add
+        out[a] = ufunc.reduceat(v, starts)
+    return keys, out
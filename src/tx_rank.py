@@ -0,0 +1,175 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .tx_cube import _group, month_range
+from .tx_table import NAT, month_bounds, month_label
+
+# Top-N selection over presorted orders. The table keeps rows sorted by amount
+# (next to its time index), so "largest debits" or "latest 5" read k rows off
+# one end of an order; type/status/account/period filters are checked a block
+# at a time. When an account or period narrows the rows a lot, the selection
+# runs over that slice instead (O(rows in slice)). Merchant rankings come from
+# per-(month, merchant, status) cells whose all-time totals are ranked once.
+
+SIDES = ("out", "in", "any")
+_END = np.iinfo(np.int64).max
+
+
+def _span(month: Optional[str], year: Optional[str]) -> Tuple[int, int]:
+    """[start, end) seconds for month/year (month wins; neither = all dated and undated rows)."""
+    lo, hi = month_range(month, year)
+    if lo is None:
+        return NAT, _END
+    return month_bounds(month_label(lo))[0], month_bounds(month_label(hi))[1]
+
+
+def _keep(tbl, txn_type: Optional[str] = None, status: Optional[str] = None, account: Optional[str] = None,
+          start: int = NAT, end: int = _END):
+    """Row filter for block walks; None when nothing is filtered."""
+    cats = [(c, tbl.code_set(c, [v])) for c, v in (("transaction_type", txn_type), ("transaction_status", status),
+                                                     ("account_id", account)) if v]
+    if not cats and start == NAT and end == _END:
+        return None
+
+    def keep(rows: np.ndarray) -> np.ndarray:
+        m = np.ones(len(rows), dtype=bool)
+        for col, codes in cats:
+            m &= np.isin(tbl.codes[col][rows], codes)
+        if start != NAT or end != _END:
+            ts = tbl.ts[rows]
+            m &= (ts >= start) & (ts < end)
+        return m
+    return keep
+
+
+def walk(order: np.ndarray, k: int, keep=None, from_end: bool = True) -> List[int]:
+    """First k rows of `order` (read from its end when from_end) that pass `keep`."""
+    out: List[int] = []
+    block, n = max(4 * k, 256), len(order)
+    pos = n if from_end else 0
+    while len(out) < k and (pos > 0 if from_end else pos < n):
+        if from_end:
+            rows, pos = order[max(0, pos - block):pos][::-1], pos - block
+        else:
+            rows, pos = order[pos:pos + block], pos + block
+        out.extend((rows[keep(rows)] if keep else rows)[:k - len(out)].tolist())
+    return out
+
+
+def latest(tbl, k: int, txn_type: Optional[str] = None, status: Optional[str] = None, account: Optional[str] = None,
+           month: Optional[str] = None, year: Optional[str] = None) -> List[int]:
+    """Newest k rows, newest first: account and period are binary searches on the time index."""
+    start, end = _span(month, year)
+    return walk(tbl.rows_between(start, end, account), k, _keep(tbl, txn_type, status))
+
+
+def largest(tbl, k: int, side: str = "out", txn_type: Optional[str] = None, status: Optional[str] = None,
+            account: Optional[str] = None, month: Optional[str] = None, year: Optional[str] = None) -> List[int]:
+    """Top k rows by amount: side 'out' = biggest outflows (most negative), 'in' = biggest inflows,
+    'any' = biggest |amount|. Zero amounts are never returned."""
+    if side not in SIDES:
+        raise ValueError(f"side must be one of {SIDES}")
+    if side == "any":
+        rows = largest(tbl, k, "out", txn_type, status, account, month, year) + \
+            largest(tbl, k, "in", txn_type, status, account, month, year)
+        return sorted(rows, key=lambda r: -abs(tbl.amount[r]))[:k]
+    start, end = _span(month, year)
+    if account or month or year:
+        cand = tbl.rows_between(start, end, account)
+        if len(cand) * 8 <= len(tbl):
+            return _select(tbl, cand, k, side, _keep(tbl, txn_type, status))
+    idx = tbl.amount_order()
+    if side == "out":
+        order = idx.order[:int(np.searchsorted(idx.ts, 0.0, "left"))]
+    else:
+        order = idx.order[int(np.searchsorted(idx.ts, 0.0, "right")):]
+    return walk(order, k, _keep(tbl, txn_type, status, account, start, end), from_end=side == "in")
+
+
+def _select(tbl, rows: np.ndarray, k: int, side: str, keep) -> List[int]:
+    """Exact top k of a (small) row slice by partial sort."""
+    if keep is not None:
+        rows = rows[keep(rows)]
+    amt = tbl.amount[rows]
+    rows, amt = (rows[amt < 0], amt[amt < 0]) if side == "out" else (rows[amt > 0], -amt[amt > 0])
+    if len(rows) > k:
+        part = np.argpartition(amt, k - 1)[:k]
+        rows, amt = rows[part], amt[part]
+    return rows[np.argsort(amt, kind="stable")].tolist()
+
+
+_MDIMS = ("month", "merchant_name", "transaction_status")
+
+
+class MerchantRollup:
+    """Rows grouped per (month, merchant, status): visit count, spend (sum of outflows) and net amount.
+    Cells are sorted month first, so a period is a binary search plus its cells."""
+
+    def __init__(self, keys: Dict[str, np.ndarray], agg: Dict[str, np.ndarray], vocab: Dict[str, List[str]]):
+        self.keys, self.agg, self.vocab = keys, agg, vocab
+        self._ranked: Dict[Optional[str], Tuple[np.ndarray, Dict[str, np.ndarray], Dict[str, np.ndarray]]] = {}
+
+    @classmethod
+    def from_table(cls, tbl) -> "MerchantRollup":
+        keys = {"month": np.asarray(tbl.month, dtype=np.int64),
+                "merchant_name": np.asarray(tbl.codes["merchant_name"], dtype=np.int32),
+                "transaction_status": np.asarray(tbl.codes["transaction_status"], dtype=np.int32)}
+        amt = np.asarray(tbl.amount, dtype=np.float64)
+        agg = {"count": np.ones(len(amt), dtype=np.int64), "spend": np.maximum(-amt, 0.0), "net": amt}
+        return cls(*_group(keys, agg, _MDIMS), tbl.vocab)
+
+    def extend(self, add) -> "MerchantRollup":
+        """New rollup with the rows of table `add` (same vocabularies) folded in."""
+        other = MerchantRollup.from_table(add)
+        keys = {d: np.concatenate([self.keys[d], other.keys[d]]) for d in _MDIMS}
+        agg = {a: np.concatenate([self.agg[a], other.agg[a]]) for a in self.agg}
+        return MerchantRollup(*_group(keys, agg, _MDIMS), self.vocab)
+
+    def _totals(self, lo: Optional[int], hi: Optional[int], status: Optional[str]):
+        """(merchant codes, {agg: per-merchant total}) over cells in months lo..hi."""
+        month = self.keys["month"]
+        a = 0 if lo is None else int(np.searchsorted(month, lo, "left"))
+        b = len(month) if hi is None else int(np.searchsorted(month, hi, "right"))
+        cells = np.arange(a, max(a, b))
+        if status:
+            w = str(status).casefold()
+            codes = [i for i, v in enumerate(self.vocab["transaction_status"]) if str(v).casefold() == w]
+            cells = cells[np.isin(self.keys["transaction_status"][cells], codes)]
+        cells = cells[self.keys["merchant_name"][cells] >= 0]
+        merchants, inv = np.unique(self.keys["merchant_name"][cells], return_inverse=True)
+        return merchants, {g: np.bincount(inv, weights=self.agg[g][cells], minlength=len(merchants)) for g in self.agg}
+
+    def _all_time(self, status: Optional[str]):
+        key = str(status).casefold() if status else None
+        hit = self._ranked.get(key)
+        if hit is None:
+            merchants, tot = self._totals(None, None, status)
+            orders = {g: np.lexsort((merchants, -tot[g])) for g in ("count", "spend")}
+            hit = self._ranked[key] = (merchants, tot, orders)
+        return hit
+
+    def rank(self, by: str = "spend", k: int = 10, month: Optional[str] = None, year: Optional[str] = None,
+             status: Optional[str] = None, min_count: int = 1) -> List[Dict[str, Any]]:
+        """Top k merchants by 'spend' or 'count' (visits) with at least min_count visits. All-time
+        rankings are precomputed (O(k) per call); a period ranks that period's cells."""
+        if by not in ("spend", "count"):
+            raise ValueError("by must be 'spend' or 'count'")
+        lo, hi = month_range(month, year)
+        if lo is None:
+            merchants, tot, orders = self._all_time(status)
+            order = orders[by]
+        else:
+            merchants, tot = self._totals(lo, hi, status)
+            order = np.lexsort((merchants, -tot[by]))
+        keep = None
+        if by == "count":   # counts descend along the order: cut at min_count
+            order = order[:int(np.searchsorted(-tot["count"][order], -min_count, "right"))]
+        elif min_count > 1:
+            keep = lambda js: tot["count"][js] >= min_count
+        out: List[Dict[str, Any]] = []
+        for j in walk(order, k, keep, from_end=False):
+            out.append({"merchant": self.vocab["merchant_name"][merchants[j]], "count": int(tot["count"][j]),
+                        "spend": round(float(tot["spend"][j]), 2), "net": round(float(tot["net"][j]), 2)})
+        return out
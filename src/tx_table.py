@@ -0,0 +1,493 @@
+from __future__ import annotations
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .io import chunked
+
+# Columnar (NumPy) view over transactions. Built once per load; tools and
+# deterministic helpers filter with boolean masks instead of walking pydantic rows.
+# Timestamps are parsed once into the int64 `ts` column; a lazily built time
+# index (rows sorted by ts, and by (account, ts)) turns month/year/date-range
+# selection into binary searches and is merged, not rebuilt, on extend().
+# The same structure sorted by amount backs top-N selection (tx_rank).
+
+NAT = np.iinfo(np.int64).min  # same bit pattern numpy uses for NaT
+
+CATEGORICAL = ("transaction_type", "transaction_status", "merchant_name", "account_id", "currency_code")
+
+_ALIASES = {
+    "transaction_id": "transactionId",
+    "account_id": "accountId",
+    "transaction_type": "transactionType",
+    "transaction_status": "transactionStatus",
+    "transaction_date_time": "transactionDateTime",
+    "currency_code": "currencyCode",
+    "merchant_name": "merchantName",
+    "debit_credit_indicator": "debitCreditIndicator",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _as_mapping(r: Any) -> Any:
+    if isinstance(r, dict) or hasattr(r, "transaction_id"):
+        return r
+    if hasattr(r, "model_dump"):        # Pydantic v2
+        return r.model_dump(by_alias=True)
+    if hasattr(r, "dict"):              # Pydantic v1
+        return r.dict(by_alias=True)
+    if isinstance(r, str):
+        try:
+            return json.loads(r)
+        except Exception:
+            return {}
+    return {}
+
+
+def _get(r: Any, snake: str) -> Any:
+    if isinstance(r, dict):
+        v = r.get(_ALIASES.get(snake, snake))
+        return r.get(snake) if v is None else v
+    return getattr(r, snake, None)
+
+
+def parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
+    if not dt_str or not isinstance(dt_str, str):
+        return None
+    s = dt_str.strip()
+    # tolerate trailing Z and fractional seconds
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except Exception:
+        try:
+            return datetime.strptime(s.split(".")[0].replace("Z", ""), "%Y-%m-%dT%H:%M:%S")
+        except Exception:
+            return None
+
+
+def parse_ts(dt_str: Optional[str]) -> int:
+    """Wall-clock epoch seconds (offset dropped, so year/month match the ISO string); NAT if unparseable."""
+    dt = parse_iso(dt_str)
+    if dt is None:
+        return NAT
+    return int((dt.replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+_DATE_PREFIX = re.compile(r"(\d{4})-(\d{2})(?:-(\d{2}))?")
+
+
+def parse_row_ts(dt_str: Optional[str]) -> int:
+    """parse_ts, except that a string which does not parse but starts with 'YYYY-MM[-DD]' (e.g. '2025-07',
+    '2025-07-03 late') is placed at the start of that month/day, so it still counts in its month and year
+    (the row-wise tools matched such strings by prefix)."""
+    ts = parse_ts(dt_str)
+    if ts != NAT or not isinstance(dt_str, str):
+        return ts
+    m = _DATE_PREFIX.match(dt_str.strip())
+    if m is None:
+        return NAT
+    for day in (int(m.group(3) or 1), 1):
+        try:
+            return int((datetime(int(m.group(1)), int(m.group(2)), day) - _EPOCH).total_seconds())
+        except ValueError:
+            continue
+    return NAT
+
+
+def _indicator(v: Any) -> int:
+    try:
+        return int(v)
+    except Exception:
+        return 0
+
+
+def month_key(month: str) -> str:
+    """'YYYY-MM' for 'YYYY-MM', 'YYYY-M' or a longer ISO date; ValueError for anything else."""
+    y, m = str(month).strip().split("-")[:2]
+    if len(y) != 4 or not 1 <= int(m[:2]) <= 12:
+        raise ValueError(f"not a month: {month!r}")
+    return f"{int(y):04d}-{int(m[:2]):02d}"
+
+
+def month_index(month: str) -> int:
+    """'YYYY-MM' -> months since 1970-01."""
+    y, m = month.split("-")[:2]
+    return (int(y) - 1970) * 12 + int(m) - 1
+
+
+def month_label(idx: int) -> str:
+    y, m = divmod(int(idx), 12)
+    return f"{y + 1970:04d}-{m + 1:02d}"
+
+
+def month_bounds(month: str) -> Tuple[int, int]:
+    start = np.datetime64(month_key(month), "M")
+    return int(start.astype("datetime64[s]").astype(np.int64)), int((start + 1).astype("datetime64[s]").astype(np.int64))
+
+
+def year_bounds(year: str) -> Tuple[int, int]:
+    start = np.datetime64(str(year)[:4], "Y")
+    return int(start.astype("datetime64[s]").astype(np.int64)), int((start + 1).astype("datetime64[s]").astype(np.int64))
+
+
+class _Encoder:
+    """Dictionary encoder that keeps its vocabulary across chunks; missing/empty values get code -1."""
+
+    def __init__(self, vocab: Optional[List[str]] = None):
+        self.vocab: List[str] = vocab if vocab is not None else []
+        self.lookup: Dict[str, int] = {v: i for i, v in enumerate(self.vocab)}
+        self.shared = False   # vocab list is referenced by a live table: copy it before adding values
+
+    def encode(self, values: List[Any]) -> np.ndarray:
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, v in enumerate(values):
+            if v is None or v == "":
+                codes[i] = -1
+                continue
+            c = self.lookup.get(v)
+            if c is None:
+                if self.shared:
+                    self.vocab, self.shared = list(self.vocab), False
+                c = self.lookup[v] = len(self.vocab)
+                self.vocab.append(v)
+            codes[i] = c
+        return codes
+
+
+class _SortedRows:
+    """Row permutation sorted by (key, ts), with the sorted keys and timestamps alongside, so
+    selecting one key's rows in a time range is two binary searches. Missing dates (NAT) sort first."""
+
+    def __init__(self, order: np.ndarray, keys: np.ndarray, ts: np.ndarray):
+        self.order, self.keys, self.ts = order, keys, ts
+
+    @classmethod
+    def build(cls, keys: np.ndarray, ts: np.ndarray, rows: Optional[np.ndarray] = None) -> "_SortedRows":
+        """Index over `rows` (default: all rows 0..n-1), whose keys/ts are given."""
+        order = np.lexsort((ts, keys))
+        return cls(order if rows is None else rows[order], keys[order], ts[order])
+
+    def span(self, key: int) -> Tuple[int, int]:
+        return int(np.searchsorted(self.keys, key, "left")), int(np.searchsorted(self.keys, key, "right"))
+
+    def rows(self, key: int, start: int, end: int) -> np.ndarray:
+        """Rows with this key and start <= ts < end, oldest first (a view, no copy)."""
+        a, b = self.span(key)
+        seg = self.ts[a:b]
+        return self.order[a + int(np.searchsorted(seg, start)):a + int(np.searchsorted(seg, end))]
+
+    def extend(self, keys: np.ndarray, ts: np.ndarray, rows: np.ndarray) -> "_SortedRows":
+        """New index with `rows` (keys/ts of the appended rows) merged in, without re-sorting."""
+        o = np.lexsort((ts, keys))
+        keys, ts = keys[o], ts[o]
+        at = np.empty(len(o), dtype=np.int64)
+        for key in np.unique(keys):
+            a, b = self.span(key)
+            sel = keys == key
+            at[sel] = a + np.searchsorted(self.ts[a:b], ts[sel], "right")
+        return _SortedRows(np.insert(self.order, at, rows[o]), np.insert(self.keys, at, keys), np.insert(self.ts, at, ts))
+
+
+class TransactionTable:
+    """Typed columns: amount float64 (0.0 where missing, flagged in amount_null), ts int64 (wall-clock
+    seconds), dci int8, dictionary-encoded CATEGORICAL columns, plus raw ids/date strings for output."""
+
+    def __init__(self, ids: np.ndarray, dates: np.ndarray, amount: np.ndarray, ts: np.ndarray,
+                 dci: np.ndarray, codes: Dict[str, np.ndarray], vocab: Dict[str, List[str]],
+                 amount_null: Optional[np.ndarray] = None):
+        self.ids_col = ids
+        self.dates = dates
+        self.amount = amount
+        self.amount_null = amount_null if amount_null is not None else np.zeros(len(amount), dtype=bool)
+        self.ts = ts
+        self.dci = dci
+        self.codes = codes
+        self.vocab = vocab
+        self._month = None
+        self._pos = None
+        self._by_time: Optional[_SortedRows] = None   # all rows by ts
+        self._by_acct: Optional[_SortedRows] = None   # rows by (account code, ts)
+        self._cube = None                               # tx_cube.AggregateCube, built on first use
+        self._balance = None                            # tx_balance.RunningBalance, built on first use
+        self._by_amount: Optional[_SortedRows] = None   # all rows by amount (the "ts" slot holds amounts)
+        self._merchants = None                          # tx_rank.MerchantRollup, built on first use
+        self._enc: Optional[Dict[str, _Encoder]] = None
+        self._store: Optional[Dict[str, Any]] = None   # growable buffers behind the columns (see extend)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]) -> "TransactionTable":
+        return cls.from_chunks(chunked(rows))
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[List[Any]], encoders: Optional[Dict[str, _Encoder]] = None) -> "TransactionTable":
+        """Build column-by-column from row chunks; only one chunk of row objects is alive at a time."""
+        enc = encoders or {c: _Encoder() for c in CATEGORICAL}
+        parts: Dict[str, List[np.ndarray]] = {k: [] for k in ("ids", "dates", "amount", "amount_null", "ts", "dci", *CATEGORICAL)}
+        for chunk in chunks:
+            ids, dates, amount, null, ts, dci = [], [], [], [], [], []
+            cats: Dict[str, List[Any]] = {c: [] for c in CATEGORICAL}
+            for r in chunk:
+                r = _as_mapping(r)
+                ids.append(_get(r, "transaction_id") or "")
+                d = _get(r, "transaction_date_time")
+                dates.append(d or "")
+                ts.append(parse_row_ts(d))
+                a = _get(r, "amount")
+                try:
+                    amount.append(float(a or 0.0))
+                    null.append(a is None)
+                except Exception:
+                    amount.append(0.0)
+                    null.append(True)
+                dci.append(_indicator(_get(r, "debit_credit_indicator")))
+                for c in CATEGORICAL:
+                    cats[c].append(_get(r, c))
+            parts["ids"].append(np.asarray(ids, dtype=str))
+            parts["dates"].append(np.asarray(dates, dtype=str))
+            parts["amount"].append(np.asarray(amount, dtype=np.float64))
+            parts["amount_null"].append(np.asarray(null, dtype=bool))
+            parts["ts"].append(np.asarray(ts, dtype=np.int64))
+            parts["dci"].append(np.asarray(dci, dtype=np.int8))
+            for c in CATEGORICAL:
+                parts[c].append(enc[c].encode(cats[c]))
+        empty = {"ids": str, "dates": str, "amount": np.float64, "amount_null": bool, "ts": np.int64, "dci": np.int8}
+        col = {k: np.concatenate(v) if v else np.empty(0, dtype=empty.get(k, np.int32)) for k, v in parts.items()}
+        return cls(col["ids"], col["dates"], col["amount"], col["ts"], col["dci"],
+                   {c: col[c] for c in CATEGORICAL}, {c: enc[c].vocab for c in CATEGORICAL}, col["amount_null"])
+
+    def __len__(self) -> int:
+        return int(self.amount.shape[0])
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        cols = {"ids": self.ids_col, "dates": self.dates, "amount": self.amount, "amount_null": self.amount_null,
+                "ts": self.ts, "dci": self.dci}
+        cols.update({f"{c}.codes": self.codes[c] for c in CATEGORICAL})
+        return cols
+
+    def extend(self, rows: Iterable[Any]) -> "TransactionTable":
+        """New table = self + rows, sharing this table's (over-allocated) buffers, id map and month
+        column, so repeated appends cost amortized O(len(rows)). `self` is left untouched for
+        in-flight readers: it never sees rows past its own length, and new categorical values go
+        into copied vocabularies."""
+        if self._enc is None:
+            self._enc = {c: _Encoder(self.vocab[c]) for c in CATEGORICAL}
+        for e in self._enc.values():
+            e.shared = True   # self.vocab keeps its lists; new values go into copies
+        add = TransactionTable.from_chunks(chunked(rows), encoders=self._enc)
+        n, k = len(self), len(add)
+        if self._store is None or self._store["n"] != n:
+            self._store = {"n": n}   # first append from this table: start a fresh chain
+        store = self._store
+        new_cols = add.columns()
+        if self._month is not None:
+            new_cols["month"] = add.month
+        else:
+            store.pop("month", None)
+        out = {}
+        for key, arr in {**self.columns(), "month": self._month}.items():
+            if arr is None:
+                continue
+            buf = store.get(key)
+            dtype = np.promote_types(arr.dtype, new_cols[key].dtype)
+            if buf is None or buf.shape[0] < n + k or buf.dtype != dtype:
+                buf = np.empty(max(n + k, (n + k) * 3 // 2), dtype=dtype)
+                buf[:n] = arr
+                store[key] = buf
+            buf[n:n + k] = new_cols[key]
+            out[key] = buf[:n + k]
+        store["n"] = n + k
+        tbl = TransactionTable(out["ids"], out["dates"], out["amount"], out["ts"], out["dci"],
+                               {c: out[f"{c}.codes"] for c in CATEGORICAL}, {c: self._enc[c].vocab for c in CATEGORICAL},
+                               out["amount_null"])
+        tbl._enc, tbl._store, tbl._month = self._enc, store, out.get("month")
+        if self._pos is not None:
+            new_ids = add.ids_col.tolist()
+            # one map shared along the append chain (position() ignores rows past a table's end);
+            # a new chain, or a re-used id that would move under older tables, gets its own copy
+            share = store.get("pos") is self._pos and self._pos.keys().isdisjoint(new_ids)
+            tbl._pos = store["pos"] = self._pos if share else dict(self._pos)
+            tbl._pos.update((t, n + i) for i, t in enumerate(new_ids))
+        if self._by_time is not None:
+            tbl._by_time = self._by_time.extend(np.zeros(k, dtype=np.int32), add.ts, np.arange(n, n + k))
+        if self._by_acct is not None:
+            tbl._by_acct = self._by_acct.extend(add.codes["account_id"], add.ts, np.arange(n, n + k))
+        if self._cube is not None:
+            tbl._cube = self._cube.extend(add)
+        if self._balance is not None:
+            tbl._balance = self._balance.extend(tbl, n)
+        if self._by_amount is not None:
+            tbl._by_amount = self._by_amount.extend(np.zeros(k, dtype=np.int32), add.amount, np.arange(n, n + k))
+        if self._merchants is not None:
+            tbl._merchants = self._merchants.extend(add)
+        return tbl
+
+    def take(self, rows: np.ndarray) -> "TransactionTable":
+        """Sub-table of `rows` (renumbered from 0), sharing vocabularies; costs O(len(rows))."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return TransactionTable(self.ids_col[rows], self.dates[rows], self.amount[rows], self.ts[rows], self.dci[rows],
+                                {c: self.codes[c][rows] for c in CATEGORICAL}, self.vocab, self.amount_null[rows])
+
+    # ---------- masks ----------
+    def all(self) -> np.ndarray:
+        return np.ones(len(self), dtype=bool)
+
+    def eq(self, col: str, value: Optional[str]) -> np.ndarray:
+        """Case-insensitive equality on a categorical column, evaluated once per distinct value."""
+        if not value:
+            return self.all()
+        return np.isin(self.codes[col], self.code_set(col, [value]))
+
+    def code_set(self, col: str, values: Iterable[str]) -> np.ndarray:
+        """Codes of a categorical column whose value case-insensitively equals any of `values`."""
+        want = {str(v).casefold() for v in values}
+        return np.asarray([i for i, v in enumerate(self.vocab[col]) if str(v).casefold() in want], dtype=np.int32)
+
+    def posted(self) -> np.ndarray:
+        return self.eq("transaction_status", "POSTED")
+
+    def credit(self) -> np.ndarray:
+        """Credit = debitCreditIndicator == -1."""
+        return self.dci == -1
+
+    def debit(self) -> np.ndarray:
+        """Debit = debitCreditIndicator == 1."""
+        return self.dci == 1
+
+    def between(self, start: int, end: int) -> np.ndarray:
+        """start <= ts < end (wall-clock seconds)."""
+        m = np.zeros(len(self), dtype=bool)
+        m[self.rows_between(start, end)] = True
+        return m
+
+    def in_month(self, month: str) -> np.ndarray:
+        return self.between(*month_bounds(month))
+
+    def in_year(self, year: str) -> np.ndarray:
+        return self.between(*year_bounds(year))
+
+    def in_period(self, month: str | None = None, year: str | None = None) -> np.ndarray:
+        """month = 'YYYY-MM' or None, year = 'YYYY' or None; month wins when both are set."""
+        try:
+            if month:
+                return self.in_month(month)
+            if year:
+                return self.in_year(year)
+        except Exception:
+            return np.zeros(len(self), dtype=bool)
+        return self.all()
+
+    # ---------- time index ----------
+    def _time(self) -> _SortedRows:
+        if self._by_time is None:
+            self._by_time = _SortedRows.build(np.zeros(len(self), dtype=np.int32), self.ts)
+        return self._by_time
+
+    def _acct_time(self) -> _SortedRows:
+        if self._by_acct is None:
+            self._by_acct = _SortedRows.build(self.codes["account_id"], self.ts)
+        return self._by_acct
+
+    def rows_between(self, start: int, end: int, account: Optional[str] = None) -> np.ndarray:
+        """Rows with start <= ts < end, oldest first, optionally of one account (case-insensitive).
+        Binary searches over the sorted time index; costs O(log n + rows returned)."""
+        if account is None:
+            return self._time().rows(0, start, end)
+        idx = self._acct_time()
+        parts = [idx.rows(int(c), start, end) for c in self.code_set("account_id", [account])]
+        if len(parts) == 1:
+            return parts[0]
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        return rows[np.argsort(self.ts[rows], kind="stable")]
+
+    def period(self, month: str | None = None, year: str | None = None, account: Optional[str] = None) -> "TransactionTable":
+        """Sub-table for month = 'YYYY-MM' or year = 'YYYY' (month wins; neither = all time), optionally one account."""
+        try:
+            if month:
+                start, end = month_bounds(month)
+            elif year:
+                start, end = year_bounds(year)
+            else:
+                start, end = NAT, np.iinfo(np.int64).max
+        except Exception:
+            return self.take(np.zeros(0, dtype=np.int64))
+        if start == NAT and account is None:
+            return self
+        return self.take(self.rows_between(start, end, account))
+
+    def latest_ts(self) -> Optional[int]:
+        """Newest timestamp, or None when no row has a date."""
+        ts = self._time().ts
+        return int(ts[-1]) if len(ts) and ts[-1] != NAT else None
+
+    def cube(self):
+        """Aggregate cube (sum/count/min/max per account, month, type, status, dci) over this table."""
+        if self._cube is None:
+            from .tx_cube import AggregateCube
+            self._cube = AggregateCube.from_table(self)
+        return self._cube
+
+    def amount_order(self) -> _SortedRows:
+        """All rows sorted by amount (ascending); `.order` rows, `.ts` their amounts."""
+        if self._by_amount is None:
+            self._by_amount = _SortedRows.build(np.zeros(len(self), dtype=np.int32), self.amount)
+        return self._by_amount
+
+    def merchants(self):
+        """Per-merchant visit/spend rollup (see tx_rank), built on first use."""
+        if self._merchants is None:
+            from .tx_rank import MerchantRollup
+            self._merchants = MerchantRollup.from_table(self)
+        return self._merchants
+
+    def running_balance(self):
+        """Per-account running balance over POSTED rows (see tx_balance), built on first use."""
+        if self._balance is None:
+            from .tx_balance import RunningBalance
+            self._balance = RunningBalance.from_table(self)
+        return self._balance
+
+    @property
+    def month(self) -> np.ndarray:
+        """Months since 1970-01 per row (NAT where the date is missing)."""
+        if self._month is None:
+            self._month = self.ts.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+        return self._month
+
+    # ---------- reads ----------
+    def total(self, mask: np.ndarray, absolute: bool = False) -> float:
+        a = self.amount[mask]
+        return float(np.abs(a).sum() if absolute else a.sum())
+
+    def ids(self, mask: np.ndarray) -> List[str]:
+        return self.ids_col[mask].tolist()
+
+    def value(self, col: str, i: int) -> Optional[str]:
+        c = int(self.codes[col][i])
+        return None if c < 0 else self.vocab[col][c]
+
+    def position(self, txn_id: str) -> Optional[int]:
+        if self._pos is None:
+            self._pos = {t: i for i, t in enumerate(self.ids_col.tolist())}
+        i = self._pos.get(txn_id or "")
+        return i if i is not None and i < len(self) else None
+
+    def record(self, i: int) -> Dict[str, Any]:
+        return {
+            "transactionId": str(self.ids_col[i]),
+            "amount": None if self.amount_null[i] else float(self.amount[i]),
+            "type": self.value("transaction_type", i),
+            "date": str(self.dates[i]) or None,
+            "status": self.value("transaction_status", i),
+            "currency": self.value("currency_code", i),
+            "merchant": self.value("merchant_name", i),
+        }
+
+
+def as_table(transactions: Any) -> TransactionTable:
+    if isinstance(transactions, TransactionTable):
+        return transactions
+    return TransactionTable.from_rows(transactions)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+from .nlp_utils import MONTHS, parse_last_n_months
+from .meta_store import CatColumn
+from .tx_table import parse_iso, month_index, _Encoder
+
+# Metadata filters for vector search. Builders store per-row account / type /
+# status / month columns next to the ids; FilterColumns dictionary-encodes
+# them once per loaded index and keeps one boolean bitmap per value, so a
+# filter is a few ANDs over cached bitmaps. The surviving labels become a FAISS
+# IDSelector and the search only scores rows that satisfy the filter.
+#
+# A filter is a plain dict, every key optional:
+#   {"account_id": "acct-1", "types": ["PAYMENT"], "statuses": ["POSTED"],
+#    "month_from": <months since 1970>, "month_to": <inclusive>}
+
+META_COLUMNS = {"account_id": "accounts", "types": "types", "statuses": "statuses"}
+_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+_YM_RE = re.compile(r"\b(20\d{2})[-/](0?[1-9]|1[0-2])\b")
+_MON_YEAR_RE = re.compile(r"\b([a-z]{3,9})\.?\s+(20\d{2})\b")
+# a value right after one of these ("not pending", "other than fees") is excluded, not selected
+_NEGATION = r"(?:not|no|non|except|excluding|without|other\s+than|besides|aside\s+from)[\s-]+(?:\w+\s+){0,2}"
+_COMPARISON_RE = re.compile(r"\b(?:vs|versus|compared?|comparison|than|relative\s+to)\b")
+
+
+def row_month(dt_str: Optional[str]) -> int:
+    """Months since 1970-01 for an ISO timestamp, -1 if it does not parse."""
+    dt = parse_iso(dt_str)
+    return (dt.year - 1970) * 12 + dt.month - 1 if dt else -1
+
+
+def row_meta(t: Any) -> Dict[str, Any]:
+    """Filterable fields of one Transaction, in meta column names."""
+    return {"accounts": t.account_id or "", "types": (t.transaction_type or "").upper(),
+            "statuses": (t.transaction_status or "").upper(), "months": row_month(t.transaction_date_time)}
+
+
+class FilterColumns:
+    """Encoded filter columns for one loaded index (rows in meta order)."""
+
+    def __init__(self, meta: Dict[str, Any], labels: np.ndarray):
+        self.labels = labels
+        self.codes: Dict[str, np.ndarray] = {}
+        self.lookup: Dict[str, Dict[str, int]] = {}
+        for col in META_COLUMNS.values():
+            src = meta[col]
+            if isinstance(src, CatColumn):
+                # already dictionary-encoded on disk: fold case over the vocab, keep the mmapped codes
+                self.codes[col] = np.asarray(src.codes)
+                self.lookup[col] = {}
+                for c, v in enumerate(src.vocab):
+                    self.lookup[col].setdefault(str(v).upper(), []).append(c)
+                continue
+            enc = _Encoder()
+            self.codes[col] = enc.encode([str(v).upper() if v else "" for v in src])
+            self.lookup[col] = {v: [c] for v, c in enc.lookup.items()}
+        self.months = np.asarray(meta["months"], dtype=np.int32)
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+
+    @staticmethod
+    def supported(meta: Dict[str, Any]) -> bool:
+        return "months" in meta and all(c in meta for c in META_COLUMNS.values())
+
+    def values(self, col: str) -> List[str]:
+        return [v for v in self.lookup[col] if v]
+
+    def _bitmap(self, col: str, value: str) -> np.ndarray:
+        key = (col, value)
+        bm = self._bitmaps.get(key)
+        if bm is None:
+            codes = self.lookup[col].get(value.upper(), [])
+            bm = self._bitmaps[key] = np.isin(self.codes[col], codes)
+        return bm
+
+    def mask(self, flt: Dict[str, Any], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask over all rows, or over just `rows` (row positions) when given."""
+        if rows is not None:
+            return self._rows_mask(flt, np.asarray(rows, dtype=np.int64))
+        m = np.ones(len(self.labels), dtype=bool)
+        for key, col in META_COLUMNS.items():
+            want = flt.get(key)
+            if not want:
+                continue
+            want = [want] if isinstance(want, str) else want
+            any_of = np.zeros(len(self.labels), dtype=bool)
+            for v in want:
+                any_of |= self._bitmap(col, v)
+            m &= any_of
+        return m & self._month_mask(flt, self.months)
+
+    def _rows_mask(self, flt: Dict[str, Any], rows: np.ndarray) -> np.ndarray:
+        # few candidate rows (e.g. keyword hits): test them directly instead of building full bitmaps
+        m = np.ones(len(rows), dtype=bool)
+        for key, col in META_COLUMNS.items():
+            want = flt.get(key)
+            if want:
+                want = [want] if isinstance(want, str) else want
+                codes = [c for v in want for c in self.lookup[col].get(v.upper(), [])]
+                m &= np.isin(self.codes[col][rows], codes)
+        return m & self._month_mask(flt, self.months[rows])
+
+    @staticmethod
+    def _month_mask(flt: Dict[str, Any], months: np.ndarray) -> np.ndarray:
+        m = np.ones(len(months), dtype=bool)
+        if flt.get("month_from") is not None:
+            m &= months >= int(flt["month_from"])
+        if flt.get("month_to") is not None:
+            m &= (months <= int(flt["month_to"])) & (months >= 0)
+        return m
+
+    def selector(self, flt: Dict[str, Any]):
+        """(IDSelectorBatch over matching labels, number of matching rows)."""
+        allowed = np.ascontiguousarray(self.labels[self.mask(flt)], dtype=np.int64)
+        return faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed)), len(allowed)
+
+
+def _mentioned(values: List[str], q: str, suffix: str = "") -> List[str]:
+    """Values named in `q` (already lower-cased); a negated mention ("not pending") does not count."""
+    out = []
+    for v in values:
+        word = rf"\b{re.escape(v.lower())}{suffix}\b"
+        if v and re.search(word, q) and not re.search(rf"\b{_NEGATION}{word}", q):
+            out.append(v)
+    return out
+
+
+def infer_filter(query: str, cols: Optional[FilterColumns] = None) -> Dict[str, Any]:
+    """Account, time range, type and status constraints stated in `query`. Values are matched
+    against what the index actually contains; with no columns only the time range is inferred."""
+    q = (query or "").lower()
+    flt: Dict[str, Any] = {}
+    if cols is not None:
+        accts = [a for a in cols.values("accounts") if a and re.search(rf"(?<![\w-]){re.escape(a.lower())}(?![\w-])", q)]
+        if len(accts) == 1:
+            flt["account_id"] = accts[0]
+        # type words often just describe the question ("did my payment reduce interest?"), so a type
+        # only becomes a hard filter when it is the single one named and nothing is compared
+        types = _mentioned(cols.values("types"), q, r"(e?s)?")
+        if len(types) == 1 and not _COMPARISON_RE.search(q):
+            flt["types"] = types
+        statuses = _mentioned(cols.values("statuses"), q)
+        if statuses:
+            flt["statuses"] = statuses
+
+    # only explicit months: a bare "may"/"march" has no year and is too easy to misread as a hard filter
+    m = _YM_RE.search(q)
+    ym = (int(m.group(1)), int(m.group(2))) if m else None
+    if ym is None:
+        m = next((m for m in _MON_YEAR_RE.finditer(q) if m.group(1) in MONTHS), None)
+        ym = (int(m.group(2)), MONTHS[m.group(1)]) if m else None
+    if ym:
+        flt["month_from"] = flt["month_to"] = month_index(f"{ym[0]:04d}-{ym[1]:02d}")
+        return flt
+    n = parse_last_n_months(q)
+    if n and cols is not None and (cols.months >= 0).any():
+        # relative to the newest month in the data, like the engine's "last N months" tools
+        latest = int(cols.months.max())
+        flt["month_from"], flt["month_to"] = latest - n + 1, latest
+        return flt
+    y = _YEAR_RE.search(q)
+    if y:
+        flt["month_from"], flt["month_to"] = month_index(f"{y.group(1)}-01"), month_index(f"{y.group(1)}-12")
+    return flt
+
+
+def row_matches(flt: Dict[str, Any], t: Any) -> bool:
+    """Same filter applied to a single Transaction (for keyword / non-vector candidates)."""
+    if not flt:
+        return True
+    r = row_meta(t)
+    for key, col in META_COLUMNS.items():
+        want = flt.get(key)
+        if want:
+            want = [want] if isinstance(want, str) else want
+            if r[col].upper() not in {w.upper() for w in want}:
+                return False
+    if flt.get("month_from") is not None and r["months"] < int(flt["month_from"]):
+        return False
+    if flt.get("month_to") is not None and not (0 <= r["months"] <= int(flt["month_to"])):
+        return False
+    return True
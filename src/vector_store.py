@@ -0,0 +1,90 @@
+from __future__ import annotations
+import os
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from .io import chunked
+
+# Full-precision side file for quantized indexes. With an SQ8/fp16 or PQ index
+# spec and rescore=R, search asks FAISS for R*k candidates and re-ranks them by
+# exact inner product against float32 vectors in <index>.f32.npy (rows in meta
+# order). The file is memory-mapped, so only the candidate rows are paged in;
+# the resident index keeps the compact codes only.
+
+
+def vectors_path(index_path: str) -> str:
+    return index_path + ".f32.npy"
+
+
+def read_vectors(path: str) -> Optional[np.ndarray]:
+    try:
+        return np.load(path, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class VectorFile:
+    """float32 [n, dim] npy filled block by block through a memmap and swapped in on close()."""
+
+    def __init__(self, path: str, n: int):
+        self.path, self.n = path, n
+        self.tmp = f"{path}.tmp-{os.getpid()}.npy"
+        self.filled = np.zeros(n, dtype=bool)
+        self._out: Optional[np.ndarray] = None
+
+    def put(self, rows: Sequence[int], vecs: np.ndarray) -> None:
+        if self._out is None:
+            self._out = np.lib.format.open_memmap(self.tmp, mode="w+", dtype=np.float32, shape=(self.n, vecs.shape[1]))
+        rows = np.asarray(rows, dtype=np.int64)
+        self._out[rows] = vecs
+        self.filled[rows] = True
+
+    def complete(self, ids: Sequence[str], texts: Sequence[str], old_ids: Optional[Sequence[str]],
+                 embed: Callable[[List[str]], np.ndarray]) -> str:
+        """Fill rows not put() during the build: unchanged ids are copied from the previous side file,
+        anything else (e.g. rescoring newly enabled) goes through `embed` (cache hits after a build)."""
+        missing = np.flatnonzero(~self.filled)
+        old = read_vectors(self.path)
+        if len(missing) and old is not None and old_ids is not None and len(old) == len(old_ids) \
+                and (self._out is None or old.shape[1] == self._out.shape[1]):
+            pos = {rid: i for i, rid in enumerate(old_ids)}
+            for batch in chunked(missing.tolist()):
+                pairs = [(i, pos[ids[i]]) for i in batch if ids[i] in pos]
+                if pairs:
+                    rows, src = zip(*pairs)
+                    self.put(rows, old[np.asarray(src)])
+        for batch in chunked(np.flatnonzero(~self.filled).tolist()):
+            self.put(batch, embed([texts[i] for i in batch]))
+        return self.close()
+
+    def close(self) -> str:
+        if self._out is None:   # no rows at all
+            self._out = np.lib.format.open_memmap(self.tmp, mode="w+", dtype=np.float32, shape=(0, 0))
+        self._out.flush()
+        self._out = None
+        os.replace(self.tmp, self.path)
+        return self.path
+
+
+def remove_vectors(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def rescore(q: np.ndarray, rows: np.ndarray, vectors: np.ndarray, k: int):
+    """Re-rank candidate rows (positions into `vectors`, -1 = no hit) by exact inner product.
+    q: [nq, d], rows: [nq, c] -> (scores [nq, k], rows [nq, k]) padded with -inf / -1."""
+    q = np.asarray(q, dtype=np.float32).reshape(len(rows), -1)
+    D = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    I = np.full((len(rows), k), -1, dtype=np.int64)
+    for j, cand in enumerate(np.asarray(rows)):
+        cand = np.sort(cand[cand >= 0])   # sorted reads walk the mmap forward
+        if not len(cand):
+            continue
+        s = np.asarray(vectors[cand], dtype=np.float32) @ q[j]
+        order = np.argsort(-s, kind="stable")[:k]
+        D[j, :len(order)], I[j, :len(order)] = s[order], cand[order]
+    return D, I
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+# tests import the app as `src.<module>`, like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MERCHANTS = ["Amazon", "Apple", "Coffee Roasters", "Shell", "Whole Foods", None]
+TYPES = ["PURCHASE", "DEPOSIT", "WITHDRAWAL", "INTEREST", "FEE", "REFUND", "PAYMENT"]
+OUTFLOWS = ("PURCHASE", "WITHDRAWAL", "FEE", "PAYMENT")
+
+
+def _rows(n, seed=7, start=0):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(start, start + n):
+        ttype = rnd.choice(TYPES)
+        amount = round(rnd.uniform(1, 3000), 2)
+        if ttype in OUTFLOWS:
+            amount = -amount
+        out.append({
+            "transactionId": f"t-{i:05d}",
+            "accountId": rnd.choice(["acct-1", "acct-2", "ACCT-3"]),
+            "transactionType": ttype,
+            "transactionStatus": rnd.choice(["POSTED", "POSTED", "PENDING"]),
+            "amount": amount,
+            "transactionDateTime": f"{rnd.choice([2024, 2025])}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+                                   f"T{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}Z",
+            "currencyCode": "USD",
+            "merchantName": rnd.choice(MERCHANTS),
+            "debitCreditIndicator": 1 if amount < 0 else -1,
+        })
+    return out
+
+
+@pytest.fixture
+def make_rows():
+    """make_rows(n, seed=7, start=0) -> synthetic transaction dicts (export JSON shape), ids t-<start>.."""
+    return _rows
+
+
+@pytest.fixture
+def tx_rows():
+    return _rows(1500)
+
+
+@pytest.fixture
+def tx_file(tmp_path, tx_rows):
+    """tx_rows written as an export file under tmp_path, with an empty dataset registry."""
+    from src import datasets
+    p = tmp_path / "transactions.json"
+    p.write_text(json.dumps(tx_rows), encoding="utf-8")
+    datasets.clear()
+    yield str(p)
+    datasets.clear()
+
+
+def _hash_embed(texts, _model=None, dim=32):
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for i, t in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha1(t.encode()).digest()[:8], "little")
+        out[i] = np.random.default_rng(seed).standard_normal(dim)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def faiss_dir(tmp_path, monkeypatch):
+    """FAISS indexes under tmp_path, embedded offline by a text-hash fake; returns the fake embed(texts)."""
+    from src import faiss_index, index_registry
+    monkeypatch.setattr(faiss_index, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(faiss_index, "_embed_texts", _hash_embed)
+    index_registry.clear()
+    return _hash_embed
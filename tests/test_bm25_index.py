@@ -0,0 +1,99 @@
+import math
+from collections import Counter
+
+import pytest
+
+from src import bm25_index, index_registry
+from src.bm25_index import B, K1, add_to_bm25_index, build_bm25_index, doc_text, search_bm25, tokenize
+from src.models import TransactionRecord
+from src.vector_filter import row_month
+
+QUERIES = ["shell", "coffee roasters purchase", "shop 7 pending", "acct-2 fee", "shops", "refund usd acct-3", "nothing"]
+
+
+def _brute(records, query, flt=None):
+    """Textbook BM25 over the live docs: id -> score."""
+    docs = {t.id: Counter(tokenize(doc_text(t))) for t in records}
+    n = len(docs)
+    avgdl = sum(sum(c.values()) for c in docs.values()) / n
+    df = Counter(tok for c in docs.values() for tok in c)
+    out = {}
+    for rid, tf in docs.items():
+        score = 0.0
+        for tok in dict.fromkeys(tokenize(query)):
+            if tf[tok]:
+                dl = sum(tf.values())
+                score += math.log1p((n - df[tok] + 0.5) / (df[tok] + 0.5)) * tf[tok] * (K1 + 1) / (tf[tok] + K1 * (1 - B + B * dl / avgdl))
+        if score > 0:
+            out[rid] = score
+    if flt:
+        t_by = {t.id: t for t in records}
+        out = {rid: s for rid, s in out.items() if _keep(t_by[rid], flt)}
+    return out
+
+
+def _keep(t, flt):
+    return ((not flt.get("account_id") or t.account_id.upper() == flt["account_id"].upper())
+            and (not flt.get("statuses") or t.transaction_status in flt["statuses"])
+            and (flt.get("month_from") is None or row_month(t.transaction_date_time) >= flt["month_from"]))
+
+
+def _check(records, query, top_k=25, flt=None):
+    ref = _brute(records, query, flt)
+    got = search_bm25(query, top_k=top_k, filters=flt)
+    want = sorted(ref.values(), reverse=True)[:top_k]
+    assert [g["score"] for g in got] == pytest.approx(want, rel=1e-4)
+    assert all(g["score"] == pytest.approx(ref[g["id"]], rel=1e-4) for g in got)
+
+
+@pytest.fixture
+def records(make_rows, tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "INDEX_DIR", str(tmp_path))
+    index_registry.clear()
+    rows = make_rows(1200)
+    for i, r in enumerate(rows[::3]):
+        r["merchantName"] = f"Shop {i % 40}"   # some rarer terms next to the common ones
+    return [TransactionRecord.from_dict(r) for r in rows]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_brute_force(records, query):
+    build_bm25_index(records)
+    _check(records, query)
+    _check(records, query, top_k=3)
+
+
+@pytest.mark.parametrize("flt", [{"account_id": "ACCT-2"}, {"statuses": ["PENDING"]},
+                                 {"account_id": "acct-1", "month_from": row_month("2025-06-01")}])
+def test_filtered_search(records, flt):
+    build_bm25_index(records)
+    for q in QUERIES:
+        _check(records, q, flt=flt)
+
+
+def test_incremental_updates_match_a_fresh_build(records, make_rows):
+    build_bm25_index(records[:900])
+    changed = [TransactionRecord.from_dict({**r.model_dump(by_alias=True), "merchantName": "Corner Deli"})
+               for r in records[100:150]]
+    add_to_bm25_index(changed + records[900:])
+    live = records[:100] + changed + records[150:]
+    for q in QUERIES + ["corner deli"]:
+        _check(live, q)
+    # dropping over a quarter of the docs compacts the index
+    build_bm25_index(live[:500])
+    assert len(bm25_index.read_meta(bm25_index.bm25_path())["ids"]) == 500
+    for q in QUERIES + ["corner deli"]:
+        _check(live[:500], q)
+
+
+def test_rows_without_ids_are_kept(records):
+    anon = [TransactionRecord.from_dict({**r.model_dump(by_alias=True), "transactionId": None}) for r in records[:5]]
+    build_bm25_index(records[5:20] + anon)
+    assert bm25_index.read_meta(bm25_index.bm25_path())["live"].sum() == 20
+    add_to_bm25_index(anon[:2])
+    build_bm25_index(records[5:20] + anon)
+    assert bm25_index.read_meta(bm25_index.bm25_path())["live"].sum() == 20
+
+
+def test_tokenize():
+    assert tokenize("7-Eleven Shops ACCT-1 glass") == ["7", "eleven", "7eleven", "shop", "acct", "1", "acct1", "glass"]
@@ -0,0 +1,52 @@
+import json
+import threading
+
+from src import datasets
+
+
+def test_values_are_cached_until_the_file_changes(tx_file, tx_rows):
+    builds = []
+    build = lambda p: builds.append(p) or len(builds)
+    assert datasets.cached(tx_file, "probe", build) == 1
+    assert datasets.cached(tx_file, "probe", build) == 1
+    assert datasets.get_transactions(tx_file) is datasets.get_transactions(tx_file)
+    assert datasets.get_table(tx_file) is datasets.get_table(tx_file)
+    before = datasets.dataset_version(tx_file)
+    with open(tx_file, "w", encoding="utf-8") as f:
+        json.dump(tx_rows[:3], f)
+    assert datasets.dataset_version(tx_file) != before
+    assert datasets.cached(tx_file, "probe", build) == 2
+    assert [t.id for t in datasets.get_transactions(tx_file)] == [r["transactionId"] for r in tx_rows[:3]]
+    assert len(datasets.get_table(tx_file)) == 3
+
+
+def test_append_rows_updates_or_drops_cached_values(tx_file, tmp_path):
+    seen = []
+    datasets.cached(tx_file, "probe", lambda p: "old")
+    txns = datasets.get_transactions(tx_file)
+    n = len(txns)
+
+    def write(p):
+        seen.append(p)
+        (tmp_path / "transactions.delta.jsonl").write_text("x\n")
+
+    version = datasets.append_rows(tx_file, ["r1", "r2"], write)
+    assert seen == [tx_file] and version == datasets.dataset_version(tx_file)
+    assert datasets.get_transactions(tx_file) is txns and txns[n:] == ["r1", "r2"]
+    # no appender for "probe": rebuilt on next use
+    assert datasets.cached(tx_file, "probe", lambda p: "new") == "new"
+
+
+def test_builds_may_use_other_values_of_the_same_file(tx_file, tx_rows):
+    # a derived value built from another cached value of the same path must not block on the path lock
+    out = []
+    worker = threading.Thread(target=lambda: out.append(
+        datasets.cached(tx_file, "ids", lambda p: [t.id for t in datasets.get_transactions(p)])), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive(), "nested cached() call deadlocked"
+    assert out == [[r["transactionId"] for r in tx_rows]]
+
+
+def test_missing_account_file(tmp_path):
+    assert datasets.get_account_summaries(str(tmp_path / "account-summary.json")) == []
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import random
+
+import httpx
+import numpy as np
+import pytest
+
+from src import embed_async
+from src.embed_async import EmbeddingError, embed_texts_concurrent, plan_batches
+
+
+def _vec(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 101), 1.0]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Mock /embeddings endpoint; set .fail to a callable(batch, attempt) -> response or None."""
+    state = {"requests": [], "fail": lambda batch, n: None}
+
+    async def handler(request):
+        batch = json.loads(request.content)["input"]
+        state["requests"].append(batch)
+        await asyncio.sleep(random.random() / 200)   # finish out of order
+        bad = state["fail"](batch, len(state["requests"]))
+        if bad is not None:
+            return bad
+        data = [{"index": i, "embedding": _vec(t)} for i, t in reversed(list(enumerate(batch)))]
+        return httpx.Response(200, json={"data": data})
+
+    real = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: real(transport=httpx.MockTransport(handler), **kw))
+    monkeypatch.setattr(embed_async, "_backoff", lambda attempt, retry_after: 0.0)
+    return state
+
+
+def _want(texts):
+    V = np.asarray([_vec(t) for t in texts], dtype=np.float32)
+    return V / np.linalg.norm(V, axis=1, keepdims=True)
+
+
+def test_plan_batches_respects_rows_and_tokens():
+    texts = ["x" * 40] * 10 + ["y" * 400] + ["z"] * 5
+    spans = plan_batches(texts, max_rows=4, max_tokens=50)
+    assert spans[0][0] == 0 and spans[-1][1] == len(texts)
+    assert all(a == b for (_, a), (b, _) in zip(spans, spans[1:]))
+    for s, e in spans:
+        assert e - s <= 4
+        assert e - s == 1 or sum(embed_async.estimate_tokens(t) for t in texts[s:e]) <= 50
+    assert plan_batches([]) == []
+
+
+def test_results_come_back_in_input_order(server):
+    texts = [f"row {i} " + "w" * (i % 7) for i in range(300)]
+    V = embed_texts_concurrent(texts, "m", concurrency=8, batch_rows=16, base_url="http://stub")
+    assert len(server["requests"]) == 19
+    assert np.allclose(V, _want(texts), atol=1e-6)
+
+
+def test_transient_errors_are_retried_and_large_batches_split(server):
+    server["fail"] = lambda batch, n: (httpx.Response(429, headers={"retry-after": "0"}) if n <= 2
+                                       else httpx.Response(413) if len(batch) > 5 else None)
+    embed_async.reset_stats()
+    texts = [f"t{i}" for i in range(20)]
+    V = embed_texts_concurrent(texts, "m", concurrency=1, batch_rows=20, base_url="http://stub")
+    assert np.allclose(V, _want(texts), atol=1e-6)
+    st = embed_async.stats()
+    assert st["retries"] == 2 and st["splits"] >= 2 and st["rows"] == 20
+
+
+def test_client_errors_raise(server, monkeypatch):
+    server["fail"] = lambda batch, n: httpx.Response(400, text="bad model")
+    with pytest.raises(EmbeddingError, match="HTTP 400"):
+        embed_texts_concurrent(["a"], "m", base_url="http://stub")
+    monkeypatch.setattr(embed_async, "MAX_RETRIES", 2)
+    server["fail"] = lambda batch, n: httpx.Response(503)
+    with pytest.raises(EmbeddingError, match="after 2 retries"):
+        embed_texts_concurrent(["a"], "m", base_url="http://stub")
+
+
+def test_runs_inside_an_event_loop(server):
+    async def main():
+        return embed_texts_concurrent(["a", "bb"], "m", base_url="http://stub")
+    assert np.allclose(asyncio.run(main()), _want(["a", "bb"]), atol=1e-6)
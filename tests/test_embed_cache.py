@@ -0,0 +1,63 @@
+import types
+
+import numpy as np
+import pytest
+
+from src import embed_cache
+from src.embed_cache import cached_embed
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "CACHE_PATH", str(tmp_path / "emb.sqlite"))
+    monkeypatch.setattr(embed_cache, "_conn", None)
+    monkeypatch.setattr(embed_cache, "ENABLED", True)
+    yield embed_cache
+    if embed_cache._conn is not None:
+        embed_cache._conn.close()
+
+
+def _fake(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return np.asarray([[len(t), sum(map(ord, t)) % 97, 1.0] for t in texts], dtype=np.float32)
+    return embed
+
+
+def test_only_misses_are_embedded(cache):
+    calls = []
+    a = cached_embed(["x", "yy", "x"], "st:m", _fake(calls))
+    assert calls == [["x", "yy"]]
+    b = cached_embed(["yy", "zzz", "x"], "st:m", _fake(calls))
+    assert calls[1:] == [["zzz"]]
+    assert np.array_equal(b[0], a[1]) and np.array_equal(b[2], a[0]) and a.dtype == np.float32
+    cached_embed(["x"], "openai:m", _fake(calls))   # models do not share entries
+    assert calls[2:] == [["x"]]
+
+
+def test_eviction_drops_least_recently_used(cache, monkeypatch):
+    clock = types.SimpleNamespace(now=1000)
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    monkeypatch.setattr(cache, "MAX_BYTES", 120 << 10)   # room for about two of the batches below
+    small = lambda ts: np.ones((len(ts), 64), dtype=np.float32)
+    a, b, c = ([f"{tag} {i}" for i in range(100)] for tag in "abc")
+    cached_embed(a, "st:m", small)
+    clock.now = 2000
+    cached_embed(b, "st:m", small)
+    clock.now = 3000
+    cache.get_many("st:m", a)   # a read refreshes a
+    clock.now = 4000
+    cached_embed(c, "st:m", small)
+    gone = lambda texts: sum(v is None for v in cache.get_many("st:m", texts))
+    assert gone(c) == 0 and gone(a) == 0 and gone(b) > 0
+    assert cache._live_bytes(cache._connect()) <= 120 << 10
+    cache.clear()
+    assert cache.get_many("st:m", c[:1]) == [None]
+
+
+def test_disabled_cache_always_embeds(cache, monkeypatch):
+    monkeypatch.setattr(cache, "ENABLED", False)
+    calls = []
+    cached_embed(["a"], "st:m", _fake(calls))
+    cached_embed(["a"], "st:m", _fake(calls))
+    assert calls == [["a"], ["a"]]
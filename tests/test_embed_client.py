@@ -0,0 +1,64 @@
+import types
+
+import numpy as np
+import pytest
+
+from src import embed_client
+from src.embed_client import cached_queries, cached_query, embed_queries, query_cache_stats
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    calls = []
+
+    def create(model, input):
+        calls.append(list(input))
+        data = [types.SimpleNamespace(embedding=[float(len(t)), 1.0, 0.0]) for t in input]
+        return types.SimpleNamespace(data=data)
+
+    client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=create))
+    monkeypatch.setattr(embed_client, "get_client", lambda: client)
+    monkeypatch.setattr(embed_client, "_queries", embed_client._QueryCache(4, 3600))
+    return calls
+
+
+def test_query_cache_normalizes_whitespace(fake_client):
+    calls = []
+    embed = lambda q: calls.append(q) or np.ones(3)
+    a = cached_query("  total   spend\n", "openai:m", embed)
+    b = cached_query("total spend", "openai:m", embed)
+    cached_query("Total spend", "openai:m", embed)   # case is kept
+    cached_query("total spend", "st:m", embed)
+    assert a is b and calls == ["total spend", "Total spend", "total spend"]
+    with pytest.raises(ValueError):
+        a[0] = 2.0   # shared between callers, read-only
+    assert query_cache_stats()["hits"] == 1
+
+
+def test_batch_embeds_only_unique_misses(fake_client):
+    V = embed_queries(["aa", "b", "aa ", "ccc"], "m")
+    assert fake_client == [["aa", "b", "ccc"]]
+    assert V.shape == (4, 3) and np.array_equal(V[0], V[2])
+    assert np.allclose(np.linalg.norm(V, axis=1), 1.0, atol=1e-6)
+    embed_queries(["ccc", "dddd"], "m")
+    assert fake_client[1:] == [["dddd"]]
+    assert cached_queries([], "openai:m", lambda qs: 1 / 0).shape == (0, 0)
+
+
+def test_lru_and_ttl(fake_client, monkeypatch):
+    for q in ["a", "b", "c", "d", "a", "e"]:   # size 4: "b" is the coldest when "e" arrives
+        embed_queries([q], "m")
+    fake_client.clear()
+    embed_queries(["a", "c", "d", "e"], "m")
+    embed_queries(["b"], "m")
+    assert fake_client == [["b"]]
+    clock = types.SimpleNamespace(monotonic=lambda: 1e12)
+    monkeypatch.setattr(embed_client, "time", clock)
+    embed_queries(["e"], "m")   # expired
+    assert fake_client[-1] == ["e"]
+
+
+def test_remote_requests_are_batched(fake_client):
+    texts = [f"t{i}" for i in range(150)]
+    V = embed_client.embed_texts(texts, "m")
+    assert [len(c) for c in fake_client] == [64, 64, 22] and V.shape == (150, 3)
@@ -0,0 +1,33 @@
+import pytest
+
+from src import faiss_index
+from src.models import TransactionRecord
+
+
+@pytest.fixture
+def index(faiss_dir, monkeypatch, make_rows):
+    calls = []
+    monkeypatch.setattr(faiss_index, "embed_query", lambda q, model: faiss_dir([q])[0])
+    monkeypatch.setattr(faiss_index, "embed_queries", lambda qs, model: calls.append(list(qs)) or faiss_dir(qs))
+    records = [TransactionRecord.from_dict(r) for r in make_rows(400)]
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix")
+    return records, calls
+
+
+def test_batch_matches_one_query_at_a_time(index, monkeypatch):
+    records, calls = index
+    searches = []
+    real = faiss_index.search_vectors
+    monkeypatch.setattr(faiss_index, "search_vectors", lambda Q, *a: searches.append(len(Q)) or real(Q, *a))
+    queries = [faiss_index._pack_text(t) for t in records[:40:3]] + ["free text query"]
+    flts = [None, {"account_id": "acct-2"}, {"statuses": ["PENDING"]}] * 5
+    flts = flts[:len(queries)]
+    got = faiss_index.semantic_search_faiss_batch(queries, top_k=5, name="ix", filters=flts)
+    assert calls == [queries]   # one embedding call for the whole batch
+    assert sorted(searches) == [5, 5, 5]   # one index.search per distinct filter
+    for q, f, docs in zip(queries, flts, got):
+        want = faiss_index.semantic_search_faiss(q, top_k=5, name="ix", filters=f)
+        assert [d["id"] for d in docs] == [d["id"] for d in want]
+    shared = faiss_index.semantic_search_faiss_batch(queries[:3], top_k=5, name="ix", filters={"account_id": "acct-1"})
+    assert all(d["id"] in {t.id for t in records if t.account_id == "acct-1"} for docs in shared for d in docs)
+    assert faiss_index.semantic_search_faiss_batch([], name="ix") == []
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from src import faiss_index, faiss_shards
+from src.faiss_shards import build_sharded_index, read_manifest, search_sharded, select_shards
+from src.models import TransactionRecord
+from src.tx_table import month_index
+
+FILTERS = [None, {"account_id": "acct-2"}, {"statuses": ["PENDING"], "types": ["FEE", "PURCHASE"]},
+           {"account_id": "ACCT-3", "month_from": month_index("2024-04"), "month_to": month_index("2024-09")},
+           {"month_from": month_index("2025-11")}, {"account_id": "nobody"}]
+
+
+@pytest.fixture
+def sharded(faiss_dir, tmp_path, monkeypatch, make_rows):
+    monkeypatch.setattr(faiss_shards, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(faiss_shards, "embed_query", lambda query, model: faiss_dir([query])[0])
+    embedded = []
+    monkeypatch.setattr(faiss_index, "_embed_texts", lambda texts, model: embedded.extend(texts) or faiss_dir(texts))
+    rows = make_rows(600)
+    rows[9]["transactionDateTime"] = None
+    records = [TransactionRecord.from_dict(r) for r in rows]
+    build_sharded_index(records, embed_model="m", name="sh")
+    return records, embedded
+
+
+@pytest.mark.parametrize("flt", FILTERS)
+def test_sharded_search_matches_one_flat_index(sharded, faiss_dir, flt):
+    records, _ = sharded
+    faiss_index.build_faiss_index(records, embed_model="m", name="mono", index_spec="flat")
+    for t in records[::111]:
+        text = faiss_index._pack_text(t)
+        got = search_sharded(text, 6, "sh", filters=flt)
+        want = faiss_index.search_vector(faiss_dir([text])[0], 6, "mono", filters=flt)
+        assert [d["id"] for d in got] == [d["id"] for d in want]
+
+
+def test_rebuild_only_touches_changed_shards(sharded, tmp_path):
+    records, embedded = sharded
+    manifest = read_manifest("sh")
+    assert sum(s["rows"] for s in manifest["shards"].values()) == len(records)
+    assert any(s["month"] == "unknown" for s in manifest["shards"].values())
+    embedded.clear()
+    changed = records[:]
+    changed[3] = TransactionRecord.from_dict({**records[3].model_dump(by_alias=True), "merchantName": "New Shop"})
+    gone = [t for t in records if t.account_id == "acct-1" and t.transaction_date_time
+            and t.transaction_date_time.startswith("2024-01")]
+    assert gone and records[3] not in gone
+    changed = [t for t in changed if t not in gone]
+    build_sharded_index(changed, embed_model="m", name="sh")
+    assert len(embedded) == 1 and "New Shop" in embedded[0]
+    dead = faiss_shards.shard_name("sh", "acct-1", "2024-01")
+    assert dead not in read_manifest("sh")["shards"]
+    assert not any(n.startswith(dead) for n in os.listdir(tmp_path))
+
+
+def test_select_shards_uses_the_manifest_only():
+    manifest = {"shards": {"a": {"account": "acct-1", "month": "2024-05"}, "b": {"account": "acct-2", "month": "2024-06"},
+                           "c": {"account": "acct-1", "month": "unknown"}}}
+    assert select_shards(manifest) == ["a", "b", "c"]
+    assert select_shards(manifest, {"account_id": "ACCT-1"}) == ["a", "c"]
+    assert select_shards(manifest, {"month_from": month_index("2024-06")}) == ["b"]
+    assert faiss_shards.shard_name("sh", "a/b", "2024-01") != faiss_shards.shard_name("sh", "a_b", "2024-01")
@@ -0,0 +1,63 @@
+import pytest
+
+from src import hybrid_retriever
+from src.hybrid_retriever import fuse, hybrid_search, newest, row_index
+from src.models import TransactionRecord
+from src.retrieval_llmfirst import retrieve_candidates
+from src.tx_table import parse_ts
+
+
+@pytest.fixture
+def txns(tx_rows, monkeypatch):
+    # no on-disk semantic/BM25 indexes: the keyword leg falls back to its linear scan
+    monkeypatch.setattr(hybrid_retriever, "semantic_ids", lambda query, top_k: ([], {}))
+    monkeypatch.setattr(hybrid_retriever, "has_bm25_index", lambda: False)
+    return [TransactionRecord.from_dict(r) for r in tx_rows]
+
+
+def test_fuse_weights_reciprocal_ranks():
+    got = fuse({"a": [1, 2, 3], "b": [3, 1]}, {"a": 1.0, "b": 2.0}, top_k=3, k0=10)
+    scores = dict(got)
+    assert scores[3] == pytest.approx(1 / 13 + 2 / 11)
+    assert scores[1] == pytest.approx(1 / 11 + 2 / 12)
+    assert [r for r, _ in got] == sorted(scores, key=lambda r: -scores[r])
+
+
+def test_newest_matches_sort(txns):
+    tbl = row_index(txns)
+    flt = {"account_id": "acct-2", "statuses": ["POSTED"]}
+    want = sorted((i for i, t in enumerate(txns) if t.account_id == "acct-2" and t.transaction_status == "POSTED"),
+                  key=lambda i: parse_ts(txns[i].transaction_date_time), reverse=True)[:10]
+    got = newest(tbl, 10, flt)
+    assert [parse_ts(txns[i].transaction_date_time) for i in got] == [parse_ts(txns[i].transaction_date_time) for i in want]
+
+
+def test_row_index_extends_with_list(txns, make_rows):
+    before = row_index(txns)
+    txns.extend(TransactionRecord.from_dict(r) for r in make_rows(10, seed=3, start=len(txns)))
+    after = row_index(txns)
+    assert len(after) == len(txns) and after is not before
+    assert after.position(txns[-1].id) == len(txns) - 1
+    assert row_index(txns) is after
+
+
+def test_row_index_rebuilds_after_an_in_place_edit(txns):
+    before = row_index(txns)
+    old_id = txns[5].id
+    txns[5] = TransactionRecord.from_dict({**txns[5].model_dump(by_alias=True), "transactionId": "edited", "amount": 1.5})
+    after = row_index(txns)
+    assert after is not before and len(after) == len(txns)
+    assert after.position("edited") == 5 and after.position(old_id) is None and after.amount[5] == 1.5
+
+
+def test_pins_rank_first(txns):
+    hits = hybrid_search("shell purchase", txns, top_k=5, semantic=False, pins=[(7, 1e12), (3, 1e14)])
+    assert [r for r, _ in hits[:2]] == [3, 7] and len(hits) == 5
+
+
+def test_candidates_come_back_newest_first(txns):
+    cands = retrieve_candidates("coffee roasters purchase", txns, top_k=40)
+    assert len(cands) == 40
+    ts = [parse_ts(t.transaction_date_time) for t in cands]
+    assert ts == sorted(ts, reverse=True)
+    assert any(t.merchant_name == "Coffee Roasters" for t in cands)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from src import faiss_index
+from src.index_delta import content_hash, dedupe_last, plan_update, row_keys, row_label, row_labels
+from src.models import Transaction
+
+DIM = 16
+
+
+def test_labels_are_stable_and_non_negative():
+    ids = [f"t-{i}" for i in range(2000)]
+    labels = row_labels(ids)
+    assert labels.tolist() == [row_label(i) for i in ids]
+    assert (labels >= 0).all() and len(set(labels.tolist())) == len(ids)
+    assert row_label("t-1") == row_label("t-1") != row_label("t-2")
+
+
+def test_dedupe_keeps_last_occurrence():
+    assert dedupe_last(["a", "b", "c"]) == [0, 1, 2]
+    assert dedupe_last(["a", "b", "a", "c", "b"]) == [2, 3, 4]
+    assert dedupe_last([]) == []
+    assert dedupe_last(["", "a", "", "a", ""]) == [0, 2, 3, 4]   # rows without an id are never merged
+    assert row_keys(["", "a", ""]) == ["\0" + "0", "a", "\0" + "2"]
+
+
+def test_plan_update_diffs_ids_and_hashes():
+    old = (["a", "b", "c", "d"], ["1", "2", "3", "4"])
+    new = (["b", "c", "e", "a"], ["2", "9", "5", "1"])
+    remove, embed = plan_update(*old, *new)
+    assert sorted(remove) == ["c", "d"]    # c changed, d gone
+    assert embed == [1, 2]                 # changed c, new e
+    assert plan_update(*old, *old) == ([], [])
+
+
+@pytest.fixture
+def embed_calls(tmp_path, monkeypatch):
+    calls = []
+
+    def _embed(texts, _model=None):
+        calls.append(list(texts))
+        out = np.stack([np.random.default_rng(int(content_hash(t)[:8], 16)).standard_normal(DIM) for t in texts])
+        return (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+
+    monkeypatch.setattr(faiss_index, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(faiss_index, "_embed_texts", _embed)
+    return calls
+
+
+def _txns(n):
+    return [Transaction(transactionId=f"t-{i}", accountId="acct-1", transactionType="PURCHASE", transactionStatus="POSTED",
+                        amount=-float(i), transactionDateTime="2025-05-01T09:00:00Z", merchantName=f"shop {i}")
+            for i in range(n)]
+
+
+def test_rebuild_embeds_only_changed_rows(embed_calls):
+    txns = _txns(60)
+    faiss_index.build_faiss_index(txns, embed_model="m", name="ix")
+    assert sum(len(c) for c in embed_calls) == 60
+    embed_calls.clear()
+    update = txns[:50] + _txns(62)[60:]
+    update[4] = update[4].model_copy(update={"merchant_name": "renamed"})
+    faiss_index.build_faiss_index(update, embed_model="m", name="ix")
+    embedded = [t for c in embed_calls for t in c]
+    assert len(embedded) == 3 and any("renamed" in t for t in embedded)
+    embed_calls.clear()
+    faiss_index.build_faiss_index(update, embed_model="m", name="ix")
+    assert not any(embed_calls)
+
+
+def test_rows_without_ids_are_all_indexed(embed_calls):
+    txns = _txns(10)
+    for i in (2, 5, 7):
+        txns[i] = txns[i].model_copy(update={"transaction_id": None})
+    faiss_index.build_faiss_index(txns, embed_model="m", name="ix")
+    index, meta = faiss_index._load_index_and_meta("ix")
+    assert index.ntotal == 10 and len(set(meta["labels"])) == 10 and list(meta["ids"]).count("") == 3
+    embed_calls.clear()
+    faiss_index.build_faiss_index(txns, embed_model="m", name="ix")
+    assert not any(embed_calls)
+    faiss_index.add_to_faiss_index([_txns(12)[11].model_copy(update={"transaction_id": None})], name="ix")
+    index, meta = faiss_index._load_index_and_meta("ix")
+    assert index.ntotal == 11 and len(set(meta["labels"])) == 11
@@ -0,0 +1,69 @@
+import os
+import threading
+
+import pytest
+
+from src import index_registry
+from src.index_registry import resident
+
+
+@pytest.fixture(autouse=True)
+def _empty_registry():
+    index_registry.clear()
+    yield
+    index_registry.clear()
+
+
+def _touch(p, text):
+    p.write_text(text)
+    st = os.stat(p)
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))   # a distinct mtime even on coarse clocks
+
+
+def test_reloads_only_after_the_files_change(tmp_path):
+    f = tmp_path / "ix.bin"
+    _touch(f, "v1")
+    loads = []
+
+    def load():
+        loads.append(f.read_text())
+        return loads[-1]
+
+    assert resident(("m", "ix"), (str(f),), load) == "v1"
+    assert resident(("m", "ix"), (str(f),), load) == "v1"
+    _touch(f, "v2!")
+    assert resident(("m", "ix"), (str(f),), load) == "v2!"
+    assert loads == ["v1", "v2!"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_registry, "MAX_ENTRIES", 2)
+    f = tmp_path / "ix.bin"
+    _touch(f, "x")
+    loads = []
+    get = lambda name: resident(("m", name), (str(f),), lambda: loads.append(name) or name)
+    get("a"), get("b"), get("a"), get("c")   # b is the coldest when c arrives
+    get("a"), get("b")
+    assert loads == ["a", "b", "c", "b"]
+
+
+def test_readers_keep_the_old_value_during_a_reload(tmp_path):
+    f = tmp_path / "ix.bin"
+    _touch(f, "v1")
+    key = ("m", "ix")
+    resident(key, (str(f),), lambda: "v1")
+    _touch(f, "v2!")
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "v2"
+
+    t = threading.Thread(target=resident, args=(key, (str(f),), slow))
+    t.start()
+    started.wait(5)
+    assert resident(key, (str(f),), lambda: "unexpected") == "v1"   # served without waiting
+    release.set()
+    t.join(5)
+    assert resident(key, (str(f),), lambda: "unexpected") == "v2"
@@ -0,0 +1,107 @@
+import hashlib
+
+import faiss
+import numpy as np
+import pytest
+
+from src import faiss_index
+from src.index_spec import has_labels, new_index, parse_spec, recall_at_k
+from src.models import Transaction
+
+DIM = 32
+SPECS = ["flat", "flat:storage=sq8,rescore=4", "ivf_flat:nlist=16,nprobe=16", "ivf_flat:nlist=16,nprobe=16,pca=16",
+         "ivf_pq:nlist=8,m=8,nbits=8,nprobe=8,rescore=8", "hnsw:M=16,efSearch=256"]
+
+
+def _embed(texts, _model=None):
+    out = np.empty((len(texts), DIM), dtype=np.float32)
+    for i, t in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha1(t.encode()).digest()[:8], "little")
+        out[i] = np.random.default_rng(seed).standard_normal(DIM)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def _txns(n, tag=""):
+    return [Transaction(transactionId=f"t-{i:04d}", accountId=f"acct-{i % 3}", transactionType="PURCHASE",
+                        transactionStatus="POSTED", amount=-float(i), transactionDateTime="2025-07-01T10:00:00Z",
+                        merchantName=f"m{i}{tag}") for i in range(n)]
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(faiss_index, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(faiss_index, "_embed_texts", _embed)
+    return tmp_path
+
+
+def _self_hits(name, txns, k=5):
+    texts = [faiss_index._pack_text(t) for t in txns]
+    got = faiss_index.search_vectors(_embed(texts), k, name)
+    return sum(t.id in {d["id"] for d in docs} for t, docs in zip(txns, got)) / len(txns)
+
+
+def test_ivf_remove_keeps_labels():
+    X = _embed([f"row {i}" for i in range(400)])
+    index, _ = new_index(parse_spec("ivf_flat:nlist=4,nprobe=4"), X)
+    labels = np.arange(1000, 1400, dtype=np.int64)
+    index.add_with_ids(X, labels)
+    index.remove_ids(labels[[3, 7]])
+    _, I = index.search(X[[0, 10, 399]], 1, params=faiss.SearchParametersIVF(nprobe=4))
+    assert I[:, 0].tolist() == [1000, 1010, 1399]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_incremental_update_keeps_every_row_searchable(index_dir, spec):
+    txns = _txns(400)
+    faiss_index.build_faiss_index(txns, embed_model="m", name="ix", index_spec=spec)
+    # drop two rows, change one, add one
+    update = txns[2:]
+    update[5] = update[5].model_copy(update={"merchant_name": "changed"})
+    update.append(_txns(401)[-1])
+    faiss_index.build_faiss_index(update, embed_model="m", name="ix")
+    assert _self_hits("ix", update) >= 0.95
+    got = faiss_index.search_vectors(_embed([faiss_index._pack_text(txns[0])]), 5, "ix")[0]
+    assert "t-0000" not in {d["id"] for d in got}
+
+    more = [t.model_copy(update={"merchant_name": "upsert"}) for t in update[:3]]
+    faiss_index.add_to_faiss_index(more, embed_model="m", name="ix")
+    assert _self_hits("ix", more + update[3:]) >= 0.95
+
+
+def test_legacy_wrapped_ivf_is_rebuilt():
+    X = _embed([f"row {i}" for i in range(100)])
+    spec = parse_spec("ivf_flat:nlist=2,nprobe=2")
+    index, eff = new_index(spec, X)
+    assert has_labels(index, eff)
+    assert not has_labels(faiss.IndexIDMap2(index), eff)
+    flat, eff = new_index(parse_spec("flat"), X)
+    assert has_labels(flat, eff) and not has_labels(faiss.IndexFlatIP(DIM), eff)
+
+
+def test_pca_keeps_recall_on_low_rank_vectors():
+    rng = np.random.default_rng(0)
+    X = (rng.standard_normal((2000, 8)) @ rng.standard_normal((8, 64))).astype(np.float32)
+    X += 0.01 * rng.standard_normal(X.shape).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    rep = recall_at_k(X, "flat:pca=16", k=10, n_queries=100)
+    assert rep["spec"]["pca"] == 16 and rep["recall@10"] >= 0.95
+    assert rep["index_bytes"] < rep["f32_bytes"] / 2
+
+
+def test_truncate_searches_the_leading_dims():
+    X = _embed([f"row {i}" for i in range(300)])
+    index, eff = new_index(parse_spec("flat:truncate=8"), X)
+    index.add_with_ids(X, np.arange(len(X), dtype=np.int64))
+    _, I = index.search(X[:5], 3)
+    head = X[:, :8] / np.linalg.norm(X[:, :8], axis=1, keepdims=True)
+    assert I.tolist() == np.argsort(-(head[:5] @ head.T), axis=1, kind="stable")[:, :3].tolist()
+
+
+def test_reduction_is_clamped_and_validated():
+    X = _embed([f"row {i}" for i in range(20)])
+    assert new_index(parse_spec("flat:pca=64"), X)[1]["pca"] == 0   # not below the input dim
+    assert new_index(parse_spec("flat:pca=30"), X)[1]["pca"] == 20   # capped by the sample
+    with pytest.raises(ValueError):
+        parse_spec("flat:pca=8,truncate=8")
+    with pytest.raises(ValueError):
+        parse_spec("ivf_pq:storage=sq8")
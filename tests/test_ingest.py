@@ -0,0 +1,93 @@
+import json
+import os
+
+from src import datasets, ingest
+from src.io import delta_path, iter_delta_rows, load_transactions, read_delta_header
+from src.models import TransactionRecord
+from src.snapshot import fresh_snapshot, load_current
+
+
+def test_append_is_visible_without_a_reload(tx_file, tx_rows, make_rows):
+    txns, tbl = datasets.get_transactions(tx_file), datasets.get_table(tx_file)
+    tbl.cube()
+    new = make_rows(4, seed=5, start=8000)
+    assert ingest.append_transactions(new, tx_file) == 4
+    assert datasets.get_transactions(tx_file) is txns and len(txns) == len(tx_rows) + 4
+    grown = datasets.get_table(tx_file)
+    assert len(grown) == len(tx_rows) + 4 and grown.position("t-08003") == len(tx_rows) + 3
+    assert grown.cube().count(grown.cube().cells()) == len(grown)
+    assert ingest.append_transactions([], tx_file) == 0
+
+
+def test_log_survives_a_cold_start(tx_file, make_rows):
+    new = make_rows(3, seed=5, start=8000)
+    ingest.append_transactions(new, tx_file)
+    ingest.append_transactions(make_rows(2, seed=6, start=8100), tx_file)
+    with open(delta_path(tx_file), "rb") as f:
+        header = json.loads(f.readline())
+    assert header == read_delta_header(tx_file) and "log_id" in header
+    assert [r["transactionId"] for r in iter_delta_rows(tx_file)] == ["t-08000", "t-08001", "t-08002", "t-08100", "t-08101"]
+    datasets.clear()
+    assert datasets.get_table(tx_file).ids_col.tolist()[-5:] == ["t-08000", "t-08001", "t-08002", "t-08100", "t-08101"]
+
+
+def test_torn_line_is_closed_and_skipped(tx_file, make_rows):
+    ingest.append_transactions(make_rows(1, start=8000), tx_file)
+    with open(delta_path(tx_file), "ab") as f:
+        f.write(b'{"transactionId": "torn", "amo')
+    ingest.append_transactions(make_rows(1, start=8001), tx_file)
+    assert [r["transactionId"] for r in iter_delta_rows(tx_file)] == ["t-08000", "t-08001"]
+
+
+def test_rewritten_base_sets_the_old_log_aside(tx_file, tx_rows, make_rows):
+    ingest.append_transactions(make_rows(2, start=8000), tx_file)
+    with open(tx_file, "w", encoding="utf-8") as f:
+        json.dump(tx_rows[:20], f)
+    assert list(iter_delta_rows(tx_file)) == []
+    assert len(datasets.get_table(tx_file)) == 20
+    ingest.append_transactions(make_rows(1, start=8100), tx_file)
+    assert [r["transactionId"] for r in iter_delta_rows(tx_file)] == ["t-08100"]
+    assert any(n.startswith("transactions.delta.jsonl.stale-") for n in os.listdir(os.path.dirname(tx_file)))
+
+
+def test_compaction_tracks_the_log(tx_file, make_rows):
+    assert ingest.uncompacted_bytes(tx_file) == 0
+    ingest.append_transactions(make_rows(3, start=8000), tx_file)
+    assert ingest.uncompacted_bytes(tx_file) == os.path.getsize(delta_path(tx_file))
+    ingest.compact(tx_file)
+    assert fresh_snapshot(tx_file) and ingest.uncompacted_bytes(tx_file) == 0
+    ingest.append_transactions(make_rows(1, start=8100), tx_file)
+    assert 0 < ingest.uncompacted_bytes(tx_file) < os.path.getsize(delta_path(tx_file))
+    assert load_current(tx_file).ids_col.tolist()[-4:] == ["t-08000", "t-08001", "t-08002", "t-08100"]
+
+
+def test_pending_rows_drain_once(tx_file, make_rows):
+    ingest.append_transactions(make_rows(2, start=8000), tx_file)
+    assert [t.id for t in ingest.pending_embeddings(tx_file)] == ["t-08000", "t-08001"]
+    assert ingest.pending_embeddings(tx_file) == []
+
+
+def test_loader_output_can_be_appended(tx_file, tmp_path, make_rows):
+    other = tmp_path / "export.json"
+    other.write_text(json.dumps(make_rows(3, seed=9, start=8000)), encoding="utf-8")
+    loaded = load_transactions(str(other))
+    assert all(isinstance(t, TransactionRecord) for t in loaded)
+    assert ingest.append_transactions(loaded, tx_file) == 3
+    assert [r["transactionId"] for r in iter_delta_rows(tx_file)] == ["t-08000", "t-08001", "t-08002"]
+    assert datasets.get_transactions(tx_file)[-1].model_dump() == loaded[-1].model_dump()
+
+
+def test_queue_is_recovered_after_a_restart(tx_file, faiss_dir, make_rows, monkeypatch):
+    from src import bm25_index, faiss_index
+    monkeypatch.setattr(bm25_index, "INDEX_DIR", os.path.dirname(tx_file))
+    faiss_index.build_faiss_index(datasets.get_transactions(tx_file), embed_model="m")
+    ingest.append_transactions(make_rows(3, start=8000), tx_file)
+    monkeypatch.setattr(ingest, "_pending", {})      # restart: the in-memory queue is gone
+    monkeypatch.setattr(ingest, "_recovered", set())
+    ingest.append_transactions(make_rows(1, start=8100), tx_file)
+    assert [t.id for t in ingest.pending_embeddings(tx_file)] == ["t-08000", "t-08001", "t-08002", "t-08100"]
+    assert ingest.pending_embeddings(tx_file) == []
+    monkeypatch.setattr(ingest, "_recovered", set())
+    assert ingest.index_pending(tx_file) == 4
+    monkeypatch.setattr(ingest, "_recovered", set())
+    assert ingest.pending_embeddings(tx_file) == []   # nothing left once indexed
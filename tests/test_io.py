@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from src import io as tx_io
+from src.io import chunked, iter_transaction_chunks, iter_transaction_rows
+
+
+@pytest.fixture(params=[1 << 20, 7])
+def read_bytes(request, monkeypatch):
+    # a tiny read buffer cuts numbers and strings at every possible offset
+    monkeypatch.setattr(tx_io, "_READ_BYTES", request.param)
+    return request.param
+
+
+def _write(tmp_path, name, text):
+    p = tmp_path / name
+    p.write_text(text, encoding="utf-8")
+    return str(p)
+
+
+@pytest.mark.parametrize("layout", ["array", "envelope", "jsonl", "concatenated"])
+def test_layouts_stream_every_row(tmp_path, tx_rows, read_bytes, layout):
+    rows = tx_rows[:200]
+    if layout == "array":
+        p = _write(tmp_path, "tx.json", json.dumps(rows, indent=1))
+    elif layout == "envelope":
+        p = _write(tmp_path, "tx.json", json.dumps({"meta": {"n": 1.5}, "transactions": rows, "tail": [1, 22]}))
+    elif layout == "jsonl":
+        p = _write(tmp_path, "tx.jsonl", "\n".join(json.dumps(r) for r in rows) + "\n")
+    else:
+        p = _write(tmp_path, "tx.json", "\n".join(json.dumps(r) for r in rows))
+    assert list(iter_transaction_rows(p)) == rows
+
+
+def test_chunks_decode_in_bounded_batches(tmp_path, tx_rows):
+    p = _write(tmp_path, "tx.json", json.dumps(tx_rows[:250]))
+    sizes = [len(c) for c in iter_transaction_chunks(p, chunk_size=100, with_delta=False)]
+    assert sizes == [100, 100, 50]
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1}] junk', '[{"a": 1}] [{"b": 2}]',
+                                  '{"transactions": [{"a": 1}]} junk', '[{"a": 1}'])
+def test_trailing_or_truncated_content_raises(tmp_path, read_bytes, text):
+    p = _write(tmp_path, "tx.json", text)
+    with pytest.raises(ValueError):
+        list(iter_transaction_rows(p))
+
+
+def test_empty_array(tmp_path):
+    assert list(iter_transaction_rows(_write(tmp_path, "tx.json", " [ ] \n"))) == []
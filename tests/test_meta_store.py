@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.meta_store import CatColumn, StrColumn, has_meta, label_lookup, materialize, read_meta, write_meta
+
+COLUMNS = {"ids": "str", "labels": "int64", "accounts": "cat", "months": "int32"}
+
+
+@pytest.fixture
+def meta():
+    n = 300
+    return {"ids": [f"t-{i}" for i in range(n)], "labels": (np.arange(n, dtype=np.int64) * 7919) % 100003,
+            "accounts": [["acct-1", "", "ACCT-2", "café"][i % 4] for i in range(n)],
+            "months": np.arange(n, dtype=np.int32) % 12, "name": "tx", "dim": 32, "spec": {"kind": "flat"}}
+
+
+def test_round_trip(tmp_path, meta):
+    path = write_meta(str(tmp_path / "tx.meta"), meta, COLUMNS)
+    assert has_meta(path) and not has_meta(str(tmp_path / "missing.meta"))
+    view = read_meta(path)
+    assert isinstance(view["ids"], StrColumn) and isinstance(view["accounts"], CatColumn)
+    assert list(view["ids"]) == meta["ids"] and view["ids"][-1] == meta["ids"][-1] and view["ids"][2:4] == ["t-2", "t-3"]
+    assert list(view["accounts"]) == meta["accounts"]
+    assert view["labels"].tolist() == meta["labels"].tolist() and view["months"].dtype == np.int32
+    assert (view["name"], view["dim"], view["spec"]) == ("tx", 32, {"kind": "flat"})
+    plain = materialize(view)
+    assert plain["accounts"] == meta["accounts"] and plain["months"] == meta["months"].tolist()
+
+
+def test_rewrite_replaces_in_place(tmp_path, meta):
+    path = str(tmp_path / "tx.meta")
+    write_meta(path, meta, COLUMNS)
+    small = {k: v[:5] if k in COLUMNS else v for k, v in meta.items()}
+    write_meta(path, small, COLUMNS)
+    assert list(read_meta(path)["ids"]) == meta["ids"][:5]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["tx.meta"]
+
+
+def test_label_lookup_binary_and_legacy(tmp_path, meta):
+    view = read_meta(write_meta(str(tmp_path / "tx.meta"), meta, COLUMNS))
+    probe = np.asarray([meta["labels"][17], -1, meta["labels"][0], 123456789], dtype=np.int64)
+    want = [17, -1, 0, -1]
+    assert label_lookup(view)(probe).tolist() == want
+    legacy = {"ids": meta["ids"], "labels": meta["labels"].tolist()}
+    assert label_lookup(legacy)(probe).tolist() == want
+    assert label_lookup({"ids": meta["ids"]}) is None
+
+
+def test_empty_columns(tmp_path):
+    view = read_meta(write_meta(str(tmp_path / "e.meta"), {"ids": [], "labels": [], "accounts": [], "months": []}, COLUMNS))
+    assert list(view["ids"]) == [] and len(view["labels"]) == 0
+    assert view.positions(np.asarray([5])).tolist() == [-1]
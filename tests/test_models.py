@@ -0,0 +1,30 @@
+import pytest
+
+from src.io import decode_chunks
+from src.models import Transaction, TransactionRecord, decode_transaction
+
+
+def test_record_matches_validated_model(tx_rows):
+    for r in tx_rows[:200]:
+        rec, model = TransactionRecord.from_dict(r), Transaction(**r)
+        assert rec.id == model.id == r["transactionId"]
+        assert rec.model_dump() == model.model_dump()
+        assert rec.model_dump(by_alias=True, exclude_none=True) == model.model_dump(by_alias=True, exclude_none=True)
+
+
+def test_snake_case_keys_and_missing_fields():
+    rec = TransactionRecord.from_dict({"transaction_id": "a", "merchantName": "Shell", "amount": 0.0})
+    assert (rec.id, rec.merchant_name, rec.amount, rec.account_id) == ("a", "Shell", 0.0, None)
+    assert TransactionRecord().id == ""
+    assert TransactionRecord(account_id="x").account_id == "x"
+    with pytest.raises(AttributeError):
+        rec.extra = 1   # slotted
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_decode_switch(tx_rows, strict):
+    kind = Transaction if strict else TransactionRecord
+    assert isinstance(decode_transaction(tx_rows[0], strict), kind)
+    batches = list(decode_chunks(iter(tx_rows[:25]), 10, strict))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert all(isinstance(t, kind) for b in batches for t in b)
@@ -0,0 +1,101 @@
+import sys
+import types
+from collections import defaultdict
+
+import pytest
+
+from src.models import AccountSummary, Transaction
+from src.query_plan import PlanError, execute
+from src.tx_table import TransactionTable
+
+
+def test_grouped_sum_matches_reference(tx_rows):
+    tbl = TransactionTable.from_rows(tx_rows)
+    plan = {"filter": [{"field": "transactionType", "op": "eq", "value": "purchase"},
+                       {"field": "transactionDateTime", "op": "between", "value": ["2025-03-01", "2025-08-31"]}],
+            "group_by": ["merchantName"],
+            "aggregate": [{"fn": "sum", "field": "amount", "as": "total"}, {"fn": "count", "as": "n"}],
+            "order_by": [{"field": "total"}], "limit": 50}
+    res = execute(plan, tbl)
+    ref = defaultdict(lambda: [0.0, 0])
+    for r in tx_rows:
+        if r["transactionType"] == "PURCHASE" and "2025-03-01" <= r["transactionDateTime"][:10] <= "2025-08-31":
+            ref[r["merchantName"]][0] += r["amount"]
+            ref[r["merchantName"]][1] += 1
+    assert res["matched"] == sum(n for _, n in ref.values())
+    got = {row["merchantName"]: (row["total"], row["n"]) for row in res["rows"]}
+    assert got == {m: (round(t, 2), n) for m, (t, n) in ref.items()}
+    totals = [row["total"] for row in res["rows"]]
+    assert totals == sorted(totals)
+
+
+def test_row_listing_orders_and_limits(tx_rows):
+    tbl = TransactionTable.from_rows(tx_rows)
+    res = execute({"filter": {"field": "accountId", "op": "eq", "value": "acct-3"},
+                   "order_by": [{"field": "amount", "desc": True}], "limit": 5}, tbl)
+    want = sorted((r for r in tx_rows if r["accountId"] == "ACCT-3"), key=lambda r: -r["amount"])[:5]
+    assert [row["transactionId"] for row in res["rows"]] == [r["transactionId"] for r in want]
+    assert res["sources"] == [r["transactionId"] for r in want]
+
+
+def test_account_source_aggregate():
+    accts = [AccountSummary(accountId="a1", currentBalance=10.0, accountStatus="OPEN"),
+             AccountSummary(accountId="a2", currentBalance=32.5, accountStatus="PAST_DUE")]
+    res = execute({"source": "accounts", "filter": [{"field": "accountStatus", "op": "ne", "value": "open"}],
+                   "aggregate": [{"fn": "sum", "field": "currentBalance", "as": "owed"}]}, accounts=accts)
+    assert res["rows"] == [{"owed": 32.5}]
+
+
+@pytest.mark.parametrize("plan", [
+    "list everything",
+    {"filter": ["amount > 5"]},
+    {"filter": [{"field": ["amount"], "op": "gt", "value": 5}]},
+    {"filter": 7},
+    {"aggregate": ["sum"]},
+    {"aggregate": [{"fn": "sum", "field": {"x": 1}}]},
+    {"group_by": [{"field": "merchantName"}], "aggregate": [{"fn": "count"}]},
+    {"order_by": [3]},
+    {"order_by": [{"desc": True}]},
+    {"select": [{"f": 1}], "limit": "many"},
+    {"filter": [{"field": "nope", "op": "eq", "value": 1}]},
+    {"aggregate": [{"fn": "median", "field": "amount"}]},
+    {"filter": [{"field": "amount", "op": "between", "value": [1, 2, 3]}]},
+    {"limit": -2},
+])
+def test_malformed_plans_raise_plan_error(tx_rows, plan):
+    with pytest.raises(PlanError):
+        execute(plan, TransactionTable.from_rows(tx_rows))
+
+
+@pytest.fixture
+def engine_llmfirst(monkeypatch):
+    if "openai" not in sys.modules:
+        try:
+            import openai  # noqa: F401
+        except ImportError:
+            fake = types.ModuleType("openai")
+            fake.OpenAI = lambda **kw: types.SimpleNamespace()
+            monkeypatch.setitem(sys.modules, "openai", fake)
+    from src import engine_llmfirst
+    return engine_llmfirst
+
+
+@pytest.mark.parametrize("plan", [{"filter": ["bad"]}, {"aggregate": [1, 2]}, {"order_by": [None]}])
+def test_bad_plan_falls_back(engine_llmfirst, monkeypatch, tx_rows, plan):
+    monkeypatch.setattr(engine_llmfirst, "_chat_json", lambda messages: {"plan": plan})
+    txns = [Transaction(**r) for r in tx_rows[:50]]
+    assert engine_llmfirst.answer_with_plan("total spend?", txns) is None
+
+
+def test_rejected_plan_is_logged_and_executor_bugs_surface(engine_llmfirst, monkeypatch, tx_rows, caplog):
+    monkeypatch.setattr(engine_llmfirst, "_chat_json", lambda messages: {"plan": {"filter": [{"field": "nope"}]}})
+    txns = [Transaction(**r) for r in tx_rows[:50]]
+    with caplog.at_level("WARNING", logger=engine_llmfirst.__name__):
+        assert engine_llmfirst.answer_with_plan("total spend?", txns) is None
+    assert "unknown field: nope" in caplog.text and '"nope"' in caplog.text
+
+    def broken(*a, **kw):
+        raise TypeError("executor bug")
+    monkeypatch.setattr(engine_llmfirst, "execute", broken)
+    with pytest.raises(TypeError, match="executor bug"):
+        engine_llmfirst.answer_with_plan("total spend?", txns)
@@ -0,0 +1,53 @@
+import json
+import os
+
+import numpy as np
+
+from src import datasets
+from src.ingest import append_transactions
+from src.snapshot import compile_snapshot, fresh_snapshot, load_current, load_snapshot, read_manifest, write_snapshot
+from src.tx_table import TransactionTable
+
+
+def _same(a, b):
+    assert len(a) == len(b)
+    assert a.ids_col.tolist() == b.ids_col.tolist()
+    assert np.array_equal(a.amount, b.amount) and np.array_equal(a.ts, b.ts) and np.array_equal(a.dci, b.dci)
+    assert np.array_equal(a.amount_null, b.amount_null)
+    for c in b.codes:
+        assert [a.value(c, i) for i in range(len(a))] == [b.value(c, i) for i in range(len(b))]
+
+
+def test_compile_and_load_round_trip(tx_file, tx_rows):
+    d = compile_snapshot(tx_file)
+    assert fresh_snapshot(tx_file) == d
+    assert read_manifest(d)["rows"] == len(tx_rows)
+    tbl = load_snapshot(d)
+    assert isinstance(tbl.amount, np.memmap)
+    _same(tbl, TransactionTable.from_rows(tx_rows))
+    assert tbl.cube().count(tbl.cube().cells()) == len(tx_rows)
+    _same(datasets.get_table(tx_file), tbl)
+
+
+def test_rewritten_source_makes_the_snapshot_stale(tx_file, tx_rows):
+    compile_snapshot(tx_file)
+    with open(tx_file, "w", encoding="utf-8") as f:
+        json.dump(tx_rows[:10], f)
+    assert fresh_snapshot(tx_file) is None and load_current(tx_file) is None
+    assert len(datasets.get_table(tx_file)) == 10
+
+
+def test_load_current_replays_the_delta_tail(tx_file, tx_rows, make_rows):
+    first, second = make_rows(5, seed=1, start=9000), make_rows(7, seed=2, start=9100)
+    append_transactions(first, tx_file)
+    d = compile_snapshot(tx_file)   # folds the log in so far
+    assert read_manifest(d)["delta"]["bytes"] == os.path.getsize(os.path.splitext(tx_file)[0] + ".delta.jsonl")
+    append_transactions(second, tx_file)
+    _same(load_current(tx_file), TransactionTable.from_rows(tx_rows + first + second))
+
+
+def test_missing_amounts_survive_a_snapshot(tmp_path, make_rows):
+    rows = make_rows(20)
+    rows[3]["amount"] = None
+    tbl = load_snapshot(write_snapshot(TransactionTable.from_rows(rows), str(tmp_path / "snap")))
+    assert tbl.record(3)["amount"] is None and tbl.record(4)["amount"] == rows[4]["amount"]
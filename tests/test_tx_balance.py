@@ -0,0 +1,75 @@
+import pytest
+
+from src import tools
+from src.models import AccountSummary
+from src.tx_balance import account_anchors, balances, row_balances
+from src.tx_table import TransactionTable, parse_ts
+
+ACCOUNTS = ("acct-1", "acct-2", "ACCT-3")
+
+
+def _posted(rows, acct, until=None):
+    return [r for r in rows if r["accountId"] == acct and r["transactionStatus"] == "POSTED"
+            and (until is None or parse_ts(r["transactionDateTime"]) <= until)]
+
+
+@pytest.fixture
+def tables(make_rows):
+    rows = make_rows(3000)
+    base = TransactionTable.from_rows(rows[:2000])
+    base.running_balance()   # carried through extend()
+    grown = base.extend(rows[2000:2600]).extend(rows[2600:])
+    return rows, [TransactionTable.from_rows(rows), grown]
+
+
+@pytest.mark.parametrize("when", [None, "2024-06-30T23:59:59Z", "2025-01-01T00:00:00Z", "2023-01-01T00:00:00Z"])
+def test_balances_match_brute_force(tables, when):
+    rows, tbls = tables
+    until = None if when is None else parse_ts(when)
+    want = {}
+    for acct in ACCOUNTS:
+        sel = _posted(rows, acct, until)
+        if sel:
+            last = max(sel, key=lambda r: parse_ts(r["transactionDateTime"]))
+            want[acct] = (round(sum(r["amount"] for r in sel), 2), last["transactionId"])
+    for tbl in tbls:
+        got = {b["accountId"]: (b["balance"], b["sourceId"]) for b in balances(tbl, until)}
+        assert got.keys() == want.keys()
+        assert all(got[a][0] == pytest.approx(want[a][0], abs=0.01) and got[a][1] == want[a][1] for a in want)
+        assert all(not b["anchored"] for b in balances(tbl, until))
+
+
+def test_anchor_shifts_to_reported_balance(tables):
+    rows, tbls = tables
+    as_of = "2025-06-15T00:00:00Z"
+    accts = [AccountSummary(accountId="acct-2", currentBalance=100.0, lastUpdatedDate="2024-01-01T00:00:00Z"),
+             AccountSummary(accountId="acct-2", currentBalance=1000.0, lastUpdatedDate=as_of),
+             AccountSummary(accountId="acct-9", currentBalance=None)]
+    anchors = account_anchors(accts)
+    assert anchors == {"acct-2": (1000.0, parse_ts(as_of))}
+    at_anchor = sum(r["amount"] for r in _posted(rows, "acct-2", parse_ts(as_of)))
+    now = sum(r["amount"] for r in _posted(rows, "acct-2"))
+    for tbl in tbls:
+        got = tools.account_balance(tbl, "ACCT-2", accounts=accts)
+        assert len(got) == 1 and got[0]["anchored"]
+        assert got[0]["balance"] == pytest.approx(1000.0 + now - at_anchor, abs=0.01)
+        dec = tools.account_balance(tbl, "acct-2", month="2024-12", accounts=accts)[0]
+        upto = sum(r["amount"] for r in _posted(rows, "acct-2", parse_ts("2024-12-31T23:59:59Z")))
+        assert dec["balance"] == pytest.approx(1000.0 + upto - at_anchor, abs=0.01)
+        assert tools.account_balance(tbl, month="bogus") == []
+
+
+def test_row_balances_follow_each_account(tables):
+    rows, tbls = tables
+    anchors = {"acct-1": (50.0, parse_ts("2024-03-01T00:00:00Z"))}
+    shift = 50.0 - sum(r["amount"] for r in _posted(rows, "acct-1", anchors["acct-1"][1]))
+    picks = list(range(0, len(rows), 97))
+    for tbl in tbls:
+        for i, (bal, anchored) in zip(picks, row_balances(tbl, picks, anchors)):
+            r = rows[i]
+            if r["transactionStatus"] != "POSTED":
+                assert (bal, anchored) == (None, False)
+                continue
+            want = sum(x["amount"] for x in _posted(rows, r["accountId"], parse_ts(r["transactionDateTime"])))
+            assert anchored == (r["accountId"] == "acct-1")
+            assert bal == pytest.approx(want + (shift if anchored else 0.0), abs=0.01)
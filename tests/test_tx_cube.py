@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+import pytest
+
+from src import tools
+from src.engine import _statement_summary_last_n_months, _sum_interest_last_n_months
+from src.tx_cube import month_range
+from src.tx_table import TransactionTable
+
+PERIODS = [{}, {"month": "2025-03"}, {"year": "2024"}, {"month": "2023-01"}, {"month": "bogus"}]
+
+
+def _in(r, month=None, year=None):
+    prefix = month or year
+    return prefix is None or r["transactionDateTime"].startswith(prefix)
+
+
+@pytest.fixture
+def tables(make_rows):
+    rows = make_rows(3000)
+    base = TransactionTable.from_rows(rows[:2000])
+    base.cube()   # folded forward by extend()
+    return rows, [TransactionTable.from_rows(rows), base.extend(rows[2000:])]
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_posted_totals_match_list_reference(tables, period):
+    rows, tbls = tables
+    posted = [r for r in rows if r["transactionStatus"] == "POSTED" and _in(r, **period)]
+    if period.get("month") == "bogus":
+        posted = []
+    credits = sum(r["amount"] for r in posted if r["debitCreditIndicator"] == -1)
+    debits = sum(abs(r["amount"]) for r in posted if r["debitCreditIndicator"] == 1)
+    payments = sum(r["amount"] for r in posted if r["transactionType"] == "PAYMENT")
+    for tbl in tbls:
+        assert tools.sum_credits(tbl, **period) == pytest.approx(credits)
+        assert tools.sum_debits(tbl, **period) == pytest.approx(debits)
+        assert tools.sum_payments(tbl, **period) == pytest.approx(payments)
+
+
+def test_cells_and_rollups_match_list_reference(tables):
+    rows, tbls = tables
+    sel = [r for r in rows if r["transactionDateTime"].startswith("2024") and r["accountId"] == "ACCT-3"
+           and r["transactionType"] == "FEE"]
+    for tbl in tbls:
+        cube = tbl.cube()
+        cells = cube.cells(*month_range(year="2024"), account="acct-3", txn_type="fee")
+        assert cube.count(cells) == len(sel)
+        assert cube.total(cells) == pytest.approx(sum(r["amount"] for r in sel))
+        assert cube.extremes(cells) == (min(r["amount"] for r in sel), max(r["amount"] for r in sel))
+        assert cube.extremes(cells[:0]) == (None, None)
+        keys, sums, _, counts = cube.by(cube.cells(), "transaction_type")
+        ref = defaultdict(lambda: [0.0, 0])
+        for r in rows:
+            ref[r["transactionType"]][0] += r["amount"]
+            ref[r["transactionType"]][1] += 1
+        got = {tbl.vocab["transaction_type"][k]: (s, n) for k, s, n in zip(keys.tolist(), sums.tolist(), counts.tolist())}
+        assert set(got) == set(ref)
+        assert all(got[t][0] == pytest.approx(ref[t][0]) and got[t][1] == ref[t][1] for t in ref)
+
+
+def test_extended_cube_has_the_same_cells(tables):
+    _, (full, grown) = tables
+    a, b = full.cube(), grown.cube()
+    assert len(a) == len(b)
+    for d in a.keys:
+        assert a.keys[d].tolist() == b.keys[d].tolist()
+    assert a.agg["count"].tolist() == b.agg["count"].tolist()
+    assert a.agg["sum"] == pytest.approx(b.agg["sum"])
+
+
+def test_last_n_month_helpers_match_list_reference(tables):
+    rows, tbls = tables
+    last3 = ("2025-10", "2025-11", "2025-12")   # the fixture's newest month is 2025-12
+    sel = [r for r in rows if r["transactionDateTime"][:7] in last3]
+    interest = [r for r in sel if r["transactionType"] == "INTEREST"]
+    for tbl in tbls:
+        total, per_account, ids = _sum_interest_last_n_months(tbl, 3)
+        assert total == pytest.approx(sum(r["amount"] for r in interest), abs=0.01)
+        assert sum(per_account.values()) == pytest.approx(total, abs=0.01)
+        assert sorted(ids) == sorted(r["transactionId"] for r in interest)
+        summary, ids = _statement_summary_last_n_months(tbl, 3)
+        assert list(summary) == list(reversed(last3))
+        for mk, s in summary.items():
+            amts = [r["amount"] for r in sel if r["transactionDateTime"].startswith(mk)]
+            assert s["count"] == len(amts)
+            assert s["net"] == pytest.approx(sum(amts), abs=0.01)
+            assert s["inflow"] == pytest.approx(sum(a for a in amts if a > 0), abs=0.01)
+        assert sorted(ids) == sorted(r["transactionId"] for r in sel)
@@ -0,0 +1,80 @@
+from collections import Counter, defaultdict
+
+import pytest
+
+from src import tools
+from src.engine import _call_tool
+from src.tx_table import TransactionTable, parse_ts
+
+FILTERS = [{}, {"month": "2025-03"}, {"year": "2024"}, {"account_id": "acct-1"},
+           {"transaction_type": "FEE", "status": "POSTED"}, {"account_id": "acct-2", "month": "2024-07"}]
+
+
+def _match(r, month=None, year=None, account_id=None, transaction_type=None, status=None):
+    d = r["transactionDateTime"]
+    return ((not month or d.startswith(month)) and (not year or d.startswith(year))
+            and (not account_id or r["accountId"].casefold() == account_id.casefold())
+            and (not transaction_type or r["transactionType"] == transaction_type)
+            and (not status or r["transactionStatus"] == status))
+
+
+@pytest.fixture
+def tables(make_rows):
+    rows = make_rows(4000)
+    base = TransactionTable.from_rows(rows[:2500])
+    base.amount_order(), base.merchants(), base.rows_between(0, 1)   # built before the append
+    return rows, [TransactionTable.from_rows(rows), base.extend(rows[2500:])]
+
+
+@pytest.mark.parametrize("flt", FILTERS)
+@pytest.mark.parametrize("side", ["out", "in", "any"])
+def test_top_transactions_match_sort(tables, flt, side):
+    rows, tbls = tables
+    sel = [r for r in rows if _match(r, **flt) and r["amount"] != 0]
+    sel = [r for r in sel if side == "any" or (r["amount"] < 0) == (side == "out")]
+    key = {"out": lambda r: r["amount"], "in": lambda r: -r["amount"], "any": lambda r: -abs(r["amount"])}[side]
+    want = [r["amount"] for r in sorted(sel, key=key)[:7]]
+    for tbl in tbls:
+        assert [x["amount"] for x in tools.top_transactions(tbl, 7, side, **flt)] == want
+
+
+@pytest.mark.parametrize("flt", FILTERS)
+def test_latest_transactions_newest_first(tables, flt):
+    rows, tbls = tables
+    want = sorted((parse_ts(r["transactionDateTime"]) for r in rows if _match(r, **flt)), reverse=True)[:6]
+    for tbl in tbls:
+        got = tools.latest_transactions(tbl, 6, **flt)
+        assert [parse_ts(x["date"]) for x in got] == want
+
+
+@pytest.mark.parametrize("period", [{}, {"month": "2025-03"}, {"year": "2024"}])
+@pytest.mark.parametrize("pending", [False, True])
+def test_merchant_ranking_matches_counter(tables, period, pending):
+    rows, tbls = tables
+    sel = [r for r in rows if _match(r, **period) and r["merchantName"] and (pending or r["transactionStatus"] == "POSTED")]
+    visits = Counter(r["merchantName"] for r in sel)
+    spend = defaultdict(float)
+    for r in sel:
+        spend[r["merchantName"]] += max(-r["amount"], 0.0)
+    threshold = sorted(visits.values())[len(visits) // 2]
+    for tbl in tbls:
+        top = tools.merchant_ranking(tbl, "spend", 3, include_pending=pending, **period)
+        assert [m["merchant"] for m in top] == sorted(spend, key=lambda m: (-spend[m], m))[:3]
+        assert all(m["spend"] == pytest.approx(spend[m["merchant"]], abs=0.01) for m in top)
+        frequent = tools.merchant_ranking(tbl, "count", 100, min_count=threshold, include_pending=pending, **period)
+        assert {m["merchant"]: m["count"] for m in frequent} == {m: n for m, n in visits.items() if n >= threshold}
+
+
+@pytest.mark.parametrize("name,args", [
+    ("top_transactions", {"k": None, "side": None}),
+    ("latest_transactions", {"k": None}),
+    ("merchant_ranking", {"k": None, "min_count": None, "by": None}),
+    ("merchant_ranking", {"k": "lots"}),
+    ("top_transactions", {"month": 202503}),
+])
+def test_tool_calls_tolerate_null_and_bad_args(tables, name, args):
+    _, (tbl, _) = tables
+    out = _call_tool(name, args, {"transactions": tbl, "query": ""})
+    assert isinstance(out, list)
+    if args.get("k", 0) is None:
+        assert len(out) == 5
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from src import tools
+from src.engine import _count_purchases_over, _sum_interest
+from src.models import TransactionRecord
+from src.tx_table import NAT, TransactionTable, as_table, parse_ts
+
+
+def test_columns_match_rows(tx_rows):
+    tbl = TransactionTable.from_rows(tx_rows)
+    assert len(tbl) == len(tx_rows)
+    assert tbl.ids_col.tolist() == [r["transactionId"] for r in tx_rows]
+    assert tbl.amount.tolist() == [r["amount"] for r in tx_rows]
+    assert tbl.ts.tolist() == [parse_ts(r["transactionDateTime"]) for r in tx_rows]
+    assert tbl.record(5) == {"transactionId": tx_rows[5]["transactionId"], "amount": tx_rows[5]["amount"],
+                             "type": tx_rows[5]["transactionType"], "date": tx_rows[5]["transactionDateTime"],
+                             "status": tx_rows[5]["transactionStatus"], "currency": "USD",
+                             "merchant": tx_rows[5]["merchantName"]}
+
+
+def test_accepts_dicts_records_and_models(tx_rows):
+    from src.models import Transaction
+    a = TransactionTable.from_rows(tx_rows[:50])
+    b = TransactionTable.from_rows([TransactionRecord.from_dict(r) for r in tx_rows[:50]])
+    c = TransactionTable.from_rows([Transaction(**r) for r in tx_rows[:50]])
+    for t in (b, c):
+        assert t.ids_col.tolist() == a.ids_col.tolist() and np.array_equal(t.amount, a.amount)
+        assert [t.value("merchant_name", i) for i in range(50)] == [a.value("merchant_name", i) for i in range(50)]
+
+
+def test_missing_and_bad_values():
+    tbl = TransactionTable.from_rows([{"transactionId": "x", "amount": "n/a", "transactionDateTime": "someday"}, {},
+                                      {"transactionId": "z", "amount": 0}])
+    assert tbl.amount.tolist() == [0.0, 0.0, 0.0]   # totals count a missing amount as zero ...
+    assert tbl.record(0)["amount"] is None and tbl.record(1)["amount"] is None   # ... records report it as missing
+    assert tbl.record(2)["amount"] == 0.0
+    assert tbl.ts.tolist() == [NAT, NAT, NAT]
+    assert tbl.value("merchant_name", 0) is None
+
+
+def test_lenient_months_and_unparsed_date_prefixes(tx_rows):
+    rows = tx_rows[:300] + [
+        {"transactionId": "bare-month", "transactionDateTime": "2025-07", "transactionType": "PAYMENT",
+         "transactionStatus": "POSTED", "amount": 12.5, "debitCreditIndicator": -1},
+        {"transactionId": "bad-time", "transactionDateTime": "2025-07-09T25:61:00", "amount": -1.0},
+        {"transactionId": "no-date", "transactionDateTime": "someday", "amount": -2.0}]
+    tbl = TransactionTable.from_rows(rows)
+    july = [r["transactionId"] for r in rows if (r.get("transactionDateTime") or "").startswith("2025-07")]
+    assert "bare-month" in july and "bad-time" in july
+    for month in ("2025-07", "2025-7"):   # single-digit months are accepted, as in the row-wise tools
+        assert sorted(tbl.ids(tbl.in_period(month))) == sorted(july)
+        assert sorted(tbl.period(month).ids_col.tolist()) == sorted(july)
+    assert "bare-month" in tbl.ids(tbl.in_period(year="2025")) and "no-date" not in tbl.ids(tbl.in_period(year="2025"))
+    want = sum(r["amount"] for r in rows if r["transactionId"] in july and r.get("transactionType") == "PAYMENT"
+               and r.get("transactionStatus") == "POSTED")
+    assert tools.sum_payments(tbl, month="2025-7") == pytest.approx(want)
+    assert tbl.record(tbl.position("bare-month"))["date"] == "2025-07"
+
+
+def test_masks_match_list_reference(tx_rows):
+    tbl = TransactionTable.from_rows(tx_rows)
+    m = tbl.eq("transaction_type", "purchase") & tbl.posted() & tbl.debit()
+    want = [r["transactionId"] for r in tx_rows
+            if r["transactionType"] == "PURCHASE" and r["transactionStatus"] == "POSTED" and r["debitCreditIndicator"] == 1]
+    assert tbl.ids(m) == want
+    assert tbl.total(m) == pytest.approx(sum(r["amount"] for r in tx_rows if r["transactionId"] in set(want)))
+    assert tbl.total(tbl.credit(), absolute=True) == pytest.approx(
+        sum(abs(r["amount"]) for r in tx_rows if r["debitCreditIndicator"] == -1))
+
+
+def test_extend_matches_full_build(tx_rows):
+    base = TransactionTable.from_rows(tx_rows[:500])
+    base.position("t-00001")
+    grown = base.extend(tx_rows[500:1000]).extend(tx_rows[1000:])
+    full = TransactionTable.from_rows(tx_rows)
+    assert grown.ids_col.tolist() == full.ids_col.tolist()
+    assert np.array_equal(grown.amount, full.amount) and np.array_equal(grown.ts, full.ts)
+    for c in full.codes:
+        assert [grown.value(c, i) for i in range(len(full))] == [full.value(c, i) for i in range(len(full))]
+    assert grown.position(tx_rows[-1]["transactionId"]) == len(tx_rows) - 1
+    assert len(base) == 500   # the old table is left untouched
+
+
+def test_extend_shares_caches_without_leaking_rows(tx_rows):
+    a = TransactionTable.from_rows(tx_rows[:500])
+    a.position("t-00001"), a.month
+    vocab_a = {c: list(v) for c, v in a.vocab.items()}
+    b = a.extend(tx_rows[500:1000])
+    extra = [{"transactionId": "new", "merchantName": "Brand New Shop"}]
+    c = b.extend(tx_rows[1000:] + extra)
+    full = TransactionTable.from_rows(tx_rows + extra)
+    assert np.array_equal(c.month, full.month) and np.array_equal(b.month, full.month[:1000])
+    assert c._pos is b._pos                          # appends grow one shared id map
+    assert b.position("new") is None and c.position("new") == len(tx_rows)
+    assert a.position("t-00700") is None and b.position("t-00700") == 700
+    assert {k: list(v) for k, v in a.vocab.items()} == vocab_a and "Brand New Shop" not in b.vocab["merchant_name"]
+    d = b.extend([dict(tx_rows[3], amount=1.0)])      # re-used id: b and c keep their positions
+    assert d.position("t-00003") == 1000 and b.position("t-00003") == c.position("t-00003") == 3
+    assert c.position("new") == len(tx_rows) and d.position("new") is None
+
+
+def test_tools_match_list_reference(tx_rows):
+    tbl = as_table(tx_rows)
+    got = tools.filter_transactions(tbl, min_amount=-500, max_amount=-100, transaction_type="PURCHASE", status="POSTED")
+    want = [r["transactionId"] for r in tx_rows if r["transactionType"] == "PURCHASE"
+            and r["transactionStatus"] == "POSTED" and -500 <= r["amount"] <= -100]
+    assert [g["transactionId"] for g in got] == want
+    assert tools.get_transaction_by_id(tbl, "t-00042")["amount"] == tx_rows[42]["amount"]
+    assert tools.get_transaction_by_id(tbl, "nope") is None
+    assert tools.sum_amounts([{"amount": 1.5}, {"amount": None}, {}]) == 1.5
+
+
+def test_engine_helpers_match_list_reference(tx_rows):
+    tbl = as_table(tx_rows)
+    count, ids = _count_purchases_over(tbl, 1000, "2025-04")
+    want = [r for r in tx_rows if r["transactionType"] == "PURCHASE"
+            and abs(r["amount"]) > 1000 and r["transactionDateTime"].startswith("2025-04")]
+    # a month slice comes back in time order
+    want = [r["transactionId"] for r in sorted(want, key=lambda r: parse_ts(r["transactionDateTime"]))]
+    assert (count, ids) == (len(want), want)
+    total, ids = _sum_interest(tbl, None)
+    interest = [r for r in tx_rows if r["transactionType"] == "INTEREST"]
+    assert total == pytest.approx(round(sum(r["amount"] for r in interest), 2))
+    assert sorted(ids) == sorted(r["transactionId"] for r in interest)
+
+
+@pytest.fixture
+def time_tables(make_rows):
+    rows = make_rows(3000) + [{"transactionId": "undated", "accountId": "acct-1", "amount": -5.0}]
+    base = TransactionTable.from_rows(rows[:1800])
+    base.rows_between(0, 1), base.rows_between(0, 1, account="acct-1")   # indexes built before the append
+    return rows, [TransactionTable.from_rows(rows), base.extend(rows[1800:])]
+
+
+@pytest.mark.parametrize("month,year,account", [
+    ("2025-02", None, None), (None, "2024", None), ("2024-12", None, "acct-3"),
+    (None, "2025", "ACCT-1"), (None, None, "acct-2"), ("2023-01", None, None), ("garbage", None, None),
+])
+def test_period_matches_scan(time_tables, month, year, account):
+    rows, tbls = time_tables
+    prefix = month or year
+    want = [r for r in rows if r.get("transactionDateTime")
+            and (prefix is None or r["transactionDateTime"].startswith(prefix))
+            and (account is None or r["accountId"].casefold() == account.casefold())]
+    if month == "garbage":
+        want = []
+    for tbl in tbls:
+        sub = tbl.period(month, year, account)
+        ts = sub.ts.tolist()
+        assert ts == sorted(ts)   # oldest first
+        assert sorted(sub.ids_col.tolist()) == sorted(r["transactionId"] for r in want)
+        if account is None:
+            assert int(tbl.in_period(month, year).sum()) == len(want)
+
+
+def test_rows_between_and_latest(time_tables):
+    rows, tbls = time_tables
+    lo, hi = parse_ts("2024-06-10T00:00:00Z"), parse_ts("2024-09-03T12:00:00Z")
+    want = {r["transactionId"] for r in rows if r.get("transactionDateTime") and lo <= parse_ts(r["transactionDateTime"]) < hi}
+    newest = max(parse_ts(r["transactionDateTime"]) for r in rows if r.get("transactionDateTime"))
+    for tbl in tbls:
+        assert set(tbl.ids(tbl.between(lo, hi))) == want
+        assert set(tbl.ids_col[tbl.rows_between(lo, hi)].tolist()) == want
+        assert tbl.latest_ts() == newest
+    assert TransactionTable.from_rows([{"transactionId": "x"}]).latest_ts() is None
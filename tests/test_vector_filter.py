@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from src import faiss_index
+from src.models import TransactionRecord
+from src.tx_table import month_index
+from src.vector_filter import infer_filter, row_matches
+
+FILTERS = [{"account_id": "ACCT-2"}, {"statuses": ["PENDING"]}, {"types": ["FEE", "REFUND"]},
+           {"account_id": "acct-1", "month_from": month_index("2025-03"), "month_to": month_index("2025-05")},
+           {"month_to": month_index("2024-02")}, {"account_id": "nobody"}]
+
+
+@pytest.fixture
+def records(make_rows):
+    rows = make_rows(800)
+    rows[5]["transactionDateTime"] = None   # undated rows never pass a month bound
+    return [TransactionRecord.from_dict(r) for r in rows]
+
+
+def _exact(embed, records, q, flt, k):
+    keep = [t for t in records if row_matches(flt, t)]
+    if not keep:
+        return []
+    V = embed([faiss_index._pack_text(t) for t in keep])
+    return [keep[i].id for i in np.argsort(-(V @ q), kind="stable")[:k]]
+
+
+@pytest.mark.parametrize("flt", FILTERS)
+def test_flat_filtered_search_is_exact(faiss_dir, records, flt):
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix", index_spec="flat")
+    for t in records[::97]:
+        q = faiss_dir([faiss_index._pack_text(t)])[0]
+        got = faiss_index.search_vector(q, 8, "ix", filters=flt)
+        assert [d["id"] for d in got] == _exact(faiss_dir, records, q, flt, 8)
+
+
+@pytest.mark.parametrize("spec", ["ivf_flat:nlist=16,nprobe=1", "hnsw:M=8,efSearch=8"])
+def test_approximate_indexes_fill_k_with_matching_rows(faiss_dir, records, spec):
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix", index_spec=spec)
+    by_id = {t.id: t for t in records}
+    flt = FILTERS[3]
+    n_allowed = sum(row_matches(flt, t) for t in records)
+    q = faiss_dir([faiss_index._pack_text(records[0])])[0]
+    got = faiss_index.search_vector(q, 10, "ix", filters=flt)
+    assert len(got) == min(10, n_allowed)
+    assert all(row_matches(flt, by_id[d["id"]]) for d in got)
+
+
+def test_mask_agrees_with_row_matches(faiss_dir, records):
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix")
+    _, meta, _, fcols, _ = faiss_index._resident_index("ix")
+    by_id = {t.id: t for t in records}
+    for flt in FILTERS:
+        want = [row_matches(flt, by_id[i]) for i in meta["ids"]]
+        assert fcols.mask(flt).tolist() == want
+        rows = np.arange(0, len(want), 3)
+        assert fcols.mask(flt, rows=rows).tolist() == [want[i] for i in rows]
+
+
+def test_infer_filter(faiss_dir, records):
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix")
+    flt = faiss_index.infer_search_filter("pending fees on acct-2 in march 2025", "ix")
+    assert flt.pop("account_id").casefold() == "acct-2"
+    assert flt == {"types": ["FEE"], "statuses": ["PENDING"],
+                   "month_from": month_index("2025-03"), "month_to": month_index("2025-03")}
+    assert infer_filter("spend in 2024") == {"month_from": month_index("2024-01"), "month_to": month_index("2024-12")}
+    assert infer_filter("what did I buy in may") == {}
+    # several types, a comparison or a negation only describe the question: no hard type/status filter
+    for q in ("did my payment reduce interest?", "fees vs refunds", "fees compared to last year",
+              "not pending purchases", "everything except fees"):
+        assert faiss_index.infer_search_filter(q, "ix") == {}, q
+    assert faiss_index.infer_search_filter("my refunds that are not pending", "ix") == {"types": ["REFUND"]}
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from src import faiss_index
+from src.index_spec import recall_at_k
+from src.models import TransactionRecord
+from src.vector_store import VectorFile, read_vectors, rescore, vectors_path
+
+
+def _unit(n, d, seed=0):
+    X = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def test_rescore_reranks_exactly():
+    X, q = _unit(50, 8), _unit(2, 8, seed=1)
+    cand = np.asarray([[4, -1, 17, 3, 40], [-1, -1, -1, -1, -1]])
+    D, I = rescore(q, cand, X, 3)
+    s = X[[4, 17, 3, 40]] @ q[0]
+    assert I[0].tolist() == [[4, 17, 3, 40][i] for i in np.argsort(-s)[:3]]
+    assert D[0] == pytest.approx(np.sort(s)[::-1][:3])
+    assert I[1].tolist() == [-1, -1, -1] and np.isneginf(D[1]).all()
+
+
+@pytest.mark.parametrize("storage,ratio", [("sq8", 4), ("fp16", 2)])
+def test_quantized_storage_is_smaller_and_rescoring_restores_recall(storage, ratio):
+    X = _unit(3000, 64)
+    plain = recall_at_k(X, f"flat:storage={storage}", k=10, n_queries=100)
+    rescored = recall_at_k(X, f"flat:storage={storage},rescore=4", k=10, n_queries=100)
+    labels = 8 * len(X)   # IndexIDMap2 keeps an int64 label per row
+    assert plain["index_bytes"] <= (plain["f32_bytes"] / ratio + labels) * 1.05
+    assert rescored["recall@10"] >= plain["recall@10"] and rescored["recall@10"] >= 0.99
+
+
+def test_side_file_scores_are_float32_exact(faiss_dir, make_rows):
+    records = [TransactionRecord.from_dict(r) for r in make_rows(500)]
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix", index_spec="flat:storage=sq8,rescore=4")
+    V = read_vectors(vectors_path(faiss_index._paths("ix")[0]))
+    texts = [faiss_index._pack_text(t) for t in records]
+    assert V.shape == (500, 32) and np.allclose(V, faiss_dir(texts), atol=1e-6)
+    q = faiss_dir([texts[7]])[0]
+    got = faiss_index.search_vector(q, 5, "ix")
+    assert got[0]["id"] == records[7].id
+    exact = faiss_dir(texts) @ q
+    assert [d["score"] for d in got] == pytest.approx(np.sort(exact)[::-1][:5], abs=1e-5)
+    # switching back to plain f32 drops the side file
+    faiss_index.build_faiss_index(records, embed_model="m", name="ix", index_spec="flat")
+    assert not os.path.exists(vectors_path(faiss_index._paths("ix")[0]))
+
+
+def test_vector_file_reuses_previous_rows(tmp_path):
+    path = str(tmp_path / "ix.index.f32.npy")
+    X = _unit(6, 4)
+    f = VectorFile(path, 3)
+    f.put([0, 1, 2], X[:3])
+    f.close()
+    calls = []
+    g = VectorFile(path, 3)
+    g.put([2], X[5:6])
+    g.complete(["b", "x", "c"], ["tb", "tx", "tc"], ["a", "b", "c"], lambda ts: calls.append(ts) or X[3:4])
+    assert calls == [["tx"]]
+    assert np.array_equal(read_vectors(path), np.stack([X[1], X[3], X[5]]))